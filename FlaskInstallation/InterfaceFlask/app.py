@@ -8,23 +8,47 @@ Cette application Flask permet de:
 - Gérer des fonctions système (redémarrage, mise à jour, changement de hostname)
 """
 
-import cups
+import atexit
+import contextlib
+import io
 import json
 import os
-import psutil
 import re
 import socket
-import subprocess
+import threading
+import time
+from cups_client import FORMAT_AUTO, FORMAT_RAW, CupsClient
+from job_tracker import JobTracker
+from metrics_history import METRICS, MetricsHistory
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, session, jsonify
+from hotplug import HotplugMonitor
+from instrumentation import REGISTRY, SamplingProfiler, instrument_app, report_error, run_command
+from print_journal import DuplicateTicket, JournalUnavailable, KEY_PATTERN, PrintJournal, tag_title
+from printer_pool import NoPrinterAvailable, PrinterPool, parse_pools
+from privileged import run_privileged
+from probes import ProbeRunner
+from raster_cache import RasterCache
+from serving import StartupTimer, StaticAssets, lazy_import, sd_notify, serve, systemd_listen_socket
+from star_line import StarLineRenderer, TicketBatchStream, TicketError, parse_batch
+from tasks import TaskAlreadyRunning, TaskFailed, TaskRunner
+from telemetry import Telemetry
+from ticket_spooler import TicketSpooler
+from wifi_scan import WifiScanCache, split_terse_line
 from typing import Dict, List, Tuple, Optional, Any, Union
 
+# psutil n'est chargé qu'au premier échantillon (après l'ouverture du port)
+psutil = lazy_import("psutil")
+
+# Jalons du démarrage (mesurés depuis le démarrage du système)
+startup = StartupTimer()
+
 # Configuration de l'application
 app = Flask(__name__)
 app.secret_key = "supersecretkey"  # Clé secrète pour les sessions
 
-# Chargement des variables d'environnement depuis un fichier .env
-load_dotenv()
+# Chargement des variables d'environnement depuis le fichier .env de l'application
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env"))
 
 # Récupération des identifiants depuis les variables d'environnement avec des valeurs par défaut en cas d'absence
 ADMIN_USERNAME = os.environ.get("ADMIN_USERNAME", "admin")
@@ -32,6 +56,167 @@ ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", "default_password")
 CLIENT_USERNAME = os.environ.get("CLIENT_USERNAME", "client")
 CLIENT_PASSWORD = os.environ.get("CLIENT_PASSWORD", "client_password")
 
+# Mode debug (serveur de développement Werkzeug) : uniquement sur demande
+DEBUG = os.environ.get("DEBUG", "0") == "1"
+
+# Serveur de production : adresse, port, nombre de workers et délai de keep-alive
+SERVER_HOST = os.environ.get("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", "5000"))
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "16"))
+SERVER_KEEPALIVE_TIMEOUT = float(os.environ.get("SERVER_KEEPALIVE_TIMEOUT", "10"))
+# Attente maximale (en secondes) des services interrogeant CUPS avant de signaler
+# la disponibilité à systemd (un cupsd qui ne répond pas ne bloque pas le démarrage)
+STARTUP_READY_TIMEOUT = float(os.environ.get("STARTUP_READY_TIMEOUT", "30"))
+
+# Fichiers statiques servis depuis la mémoire (ETag, cache longue durée, gzip)
+static_assets = StaticAssets(app)
+
+# Chronométrage des routes (exporté par /metrics)
+instrument_app(app)
+
+# Jeton d'accès à /metrics pour un collecteur Prometheus (vide : session requise)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Profileur par échantillonnage (/debug/profile, administrateur uniquement)
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "0") == "1"
+PROFILER_MAX_SECONDS = 60
+profiler = SamplingProfiler()
+
+# Intervalle (en secondes) entre deux échantillons des ressources système
+STATS_SAMPLE_INTERVAL = float(os.environ.get("STATS_SAMPLE_INTERVAL", "1"))
+
+# Intervalle (en secondes) de lecture des notifications CUPS
+CUPS_EVENT_INTERVAL = float(os.environ.get("CUPS_EVENT_INTERVAL", "0.5"))
+
+# Connexion CUPS partagée et cache d'état des imprimantes
+cups_client = CupsClient(poll_interval=CUPS_EVENT_INTERVAL)
+
+# Options d'impression des tickets (identiques à scriptImpression.sh)
+DEFAULT_PRINT_OPTIONS = {"media": "Custom.80x120mm", "Density": "5"}
+
+# Document utilisé pour le test d'impression
+TEST_PRINT_FILE = os.environ.get("TEST_PRINT_FILE", "/opt/TBERRYPRINT/FlaskInstallation/testImpressionInterface.pdf")
+
+# Types de documents transmis tels quels à CUPS (les autres sont détectés par cupsd)
+PRINT_DOCUMENT_FORMATS = ("application/pdf", "application/postscript", "application/vnd.cups-raw", "text/plain")
+
+# Fenêtre (en secondes) des statistiques de latence des tâches d'impression
+JOB_STATS_WINDOW = float(os.environ.get("JOB_STATS_WINDOW", "900"))
+
+# Suivi des tâches CUPS (états, horodatages, latences)
+job_tracker = JobTracker(cups_client, window=JOB_STATS_WINDOW)
+
+# Groupes d'imprimantes : "nom:membre1,membre2;nom2:..." (chaque tâche part vers le membre le moins chargé)
+PRINTER_POOLS = parse_pools(os.environ.get("PRINTER_POOLS", ""))
+# Groupe automatique contenant toutes les imprimantes USB (vide pour le désactiver)
+PRINTER_POOL_AUTO = os.environ.get("PRINTER_POOL_AUTO", "usb")
+
+# Cache des documents déjà convertis pour l'imprimante (envoyés ensuite en tâche brute)
+RASTER_CACHE_ENABLED = os.environ.get("RASTER_CACHE_ENABLED", "1") == "1"
+RASTER_CACHE_DIR = os.environ.get(
+    "RASTER_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "raster_cache")
+)
+RASTER_CACHE_MAX_MB = float(os.environ.get("RASTER_CACHE_MAX_MB", "64"))
+# Taille maximale (Ko) d'un document reçu par /api/print gardé en mémoire pour le
+# journal et le cache raster ; au-delà, il est transmis à CUPS au fil de l'eau
+PRINT_BUFFER_MAX_KB = float(os.environ.get("PRINT_BUFFER_MAX_KB", "256"))
+# Répertoire des fichiers temporaires de conversion (tmpfs pour épargner la carte SD)
+RASTER_CACHE_TMP = os.environ.get("RASTER_CACHE_TMP", "/dev/shm" if os.path.isdir("/dev/shm") else None)
+
+raster_cache = RasterCache(
+    RASTER_CACHE_DIR,
+    max_bytes=int(RASTER_CACHE_MAX_MB * 1024 * 1024),
+    ppd_for=cups_client.ppd,
+    temp_dir=RASTER_CACHE_TMP
+)
+
+# Rendu direct des tickets structurés en Star Line Mode (sans passer par un PDF)
+TICKET_LOGO_DIR = os.environ.get(
+    "TICKET_LOGO_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "logos")
+)
+ticket_renderer = StarLineRenderer(TICKET_LOGO_DIR)
+
+# Lots de tickets (/api/print/batch) : nombre maximal de tickets par requête
+BATCH_MAX_TICKETS = int(os.environ.get("BATCH_MAX_TICKETS", "500"))
+# Type des lots enregistrés dans le journal (tickets JSON, traduits au moment de l'envoi)
+TICKET_BATCH_FORMAT = "application/vnd.tberryprint.tickets+json"
+
+# Journal des tickets reçus par l'API (rejoués au démarrage s'ils n'ont pas été imprimés)
+JOURNAL_ENABLED = os.environ.get("JOURNAL_ENABLED", "1") == "1"
+JOURNAL_PATH = os.environ.get(
+    "JOURNAL_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "print_journal.wal")
+)
+# Délai (en secondes) de regroupement des écritures avant un fdatasync
+JOURNAL_FLUSH_DELAY = float(os.environ.get("JOURNAL_FLUSH_DELAY", "0.01"))
+# Taille du journal déclenchant son compactage
+JOURNAL_COMPACT_MB = float(os.environ.get("JOURNAL_COMPACT_MB", "4"))
+# Nombre de tickets terminés dont la clé reste connue (requêtes rejouées par les clients)
+JOURNAL_MAX_FINISHED = int(os.environ.get("JOURNAL_MAX_FINISHED", "1000"))
+
+print_journal = PrintJournal(
+    JOURNAL_PATH,
+    flush_delay=JOURNAL_FLUSH_DELAY,
+    compact_bytes=int(JOURNAL_COMPACT_MB * 1024 * 1024),
+    max_finished=JOURNAL_MAX_FINISHED
+)
+
+# Spouleur des billets déposés par TBerryPrint.exe dans le répertoire partagé avec wine
+SPOOLER_ENABLED = os.environ.get("SPOOLER_ENABLED", "0") == "1"
+SPOOLER_DIR = os.environ.get("SPOOLER_DIR", "/opt/TBERRYPRINT/ImpressionInstallation/wine/billets")
+SPOOLER_PRINTER = os.environ.get("SPOOLER_PRINTER", "")
+SPOOLER_MAX_PENDING = int(os.environ.get("SPOOLER_MAX_PENDING", "500"))
+SPOOLER_MAX_BATCH = int(os.environ.get("SPOOLER_MAX_BATCH", "50"))
+SPOOLER_BATCH_WINDOW = float(os.environ.get("SPOOLER_BATCH_WINDOW", "0.1"))
+
+# Durée de validité (en secondes) d'un scan Wi-Fi et délai maximal d'un scan
+WIFI_SCAN_TTL = float(os.environ.get("WIFI_SCAN_TTL", "30"))
+WIFI_SCAN_TIMEOUT = float(os.environ.get("WIFI_SCAN_TIMEOUT", "20"))
+
+# Interface Wi-Fi (identique à fonctions.sh)
+WIFI_INTERFACE = os.environ.get("WIFI_INTERFACE", "wlan0")
+
+# Lectures matérielles directes (sysfs, procfs, ioctl) : températures, bridage, CPU, réseau
+telemetry = Telemetry()
+
+# Délai (en secondes) avant un redémarrage déclenché à la fin d'une tâche,
+# le temps que le navigateur récupère le résultat de la tâche
+TASK_FOLLOWUP_DELAY = float(os.environ.get("TASK_FOLLOWUP_DELAY", "3"))
+
+# Tâches de maintenance (mise à jour, Wi-Fi, redémarrage) exécutées hors des requêtes
+task_runner = TaskRunner()
+
+# Répertoire des connexions enregistrées par NetworkManager
+NM_CONNECTIONS_DIR = os.environ.get("NM_CONNECTIONS_DIR", "/etc/NetworkManager/system-connections")
+
+# Fichier de l'historique des métriques (taille fixe, projeté en mémoire)
+HISTORY_PATH = os.environ.get(
+    "HISTORY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "metrics_history.bin")
+)
+
+# Plages acceptées par /api/history (suffixe -> secondes)
+HISTORY_RANGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Délais maximaux (en secondes) des sondes des pages : au-delà, la page est
+# rendue avec une valeur d'attente, complétée ensuite par le navigateur
+PAGE_PROBE_TIMEOUT = float(os.environ.get("PAGE_PROBE_TIMEOUT", "1.5"))
+WIFI_STATUS_TIMEOUT = float(os.environ.get("WIFI_STATUS_TIMEOUT", "3"))
+
+# Valeur affichée pour une donnée encore en cours de collecte
+PROBE_PLACEHOLDER = "…"
+
+# Collecte parallèle des données des pages
+page_probes = ProbeRunner()
+
+# Intervalle (en secondes) des commentaires de maintien de connexion du flux SSE
+SSE_KEEPALIVE_INTERVAL = float(os.environ.get("SSE_KEEPALIVE_INTERVAL", "15"))
+# Clients simultanés du flux SSE au plus : chacun occupe un worker du serveur tant
+# qu'il reste connecté, les autres workers restent libres pour les autres routes
+SSE_MAX_SUBSCRIBERS = int(os.environ.get("SSE_MAX_SUBSCRIBERS", str(max(1, SERVER_THREADS // 2))))
+
 
 # ===== FONCTIONS UTILITAIRES =====
 
@@ -42,6 +227,11 @@ def get_ip() -> str:
     Returns:
         str: L'adresse IP locale ou 127.0.0.1 en cas d'échec
     """
+    # Adresse de l'interface de la route par défaut (ioctl, sans trafic réseau)
+    ip_address = telemetry.primary_ip()
+    if ip_address:
+        return ip_address
+    
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     s.settimeout(0)
     try:
@@ -68,11 +258,18 @@ def get_temperature() -> str:
     Récupère la température du processeur du Raspberry Pi.
     
     Returns:
-        str: La température formatée (ex: "45.6°C") ou "Indisponible" en cas d'échec
+        str: La température formatée (ex: "45.6'C") ou "Indisponible" en cas d'échec
     """
+    # Zone thermique du SoC (sysfs) ; vcgencmd en repli si elle n'existe pas
+    temperature = telemetry.temperature()
+    if temperature is not None:
+        return f"{temperature:.1f}'C"
+    
     try:
-        temp = os.popen("vcgencmd measure_temp").readline()
-        return temp.replace("temp=", "").strip()
+        result = run_command(["vcgencmd", "measure_temp"], capture_output=True, text=True, timeout=5)
+        if result.returncode != 0:
+            return "Indisponible"
+        return result.stdout.replace("temp=", "").strip()
     except Exception:
         return "Indisponible"
 
@@ -107,27 +304,53 @@ def format_percent(value: float) -> str:
     return f"{round(value, 1)}%"
 
 
+def parse_temperature(temperature: str) -> Optional[float]:
+    """
+    Extrait la valeur numérique d'une température formatée.
+    
+    Args:
+        temperature: Température renvoyée par get_temperature() (ex: "45.6'C")
+        
+    Returns:
+        Optional[float]: Température en degrés, ou None si indisponible
+    """
+    match = re.search(r"-?\d+(\.\d+)?", temperature or "")
+    return float(match.group(0)) if match else None
+
+def parse_range(value: str) -> Optional[int]:
+    """
+    Convertit une plage de temps ("15m", "1h", "7d" ou un nombre de secondes) en secondes.
+    
+    Args:
+        value: Plage de temps
+        
+    Returns:
+        Optional[int]: Durée en secondes, ou None si la plage est invalide
+    """
+    value = (value or "").strip().lower()
+    if value.isdigit():
+        return int(value)
+    if value[:-1].isdigit() and value[-1:] in HISTORY_RANGE_UNITS:
+        return int(value[:-1]) * HISTORY_RANGE_UNITS[value[-1]]
+    return None
+
 # ===== FONCTIONS POUR LES IMPRIMANTES =====
 
 def get_usb_printers() -> List[Tuple[str, int]]:
     """
-    Récupère la liste des imprimantes USB via CUPS.
+    Récupère la liste des imprimantes USB depuis le cache CUPS.
+    
+    Le cache est tenu à jour par les notifications de CUPS : aucun appel
+    à getPrinters() n'est fait ici.
     
     Returns:
         List[Tuple[str, int]]: Liste de tuples (nom_imprimante, statut)
     """
-    printers = []
     try:
-        conn = cups.Connection()
-        printers_list = conn.getPrinters()
-        for printer, attributes in printers_list.items():
-            device_uri = attributes.get("device-uri", "").lower()
-            if device_uri.startswith("usb:"):
-                status = attributes.get("printer-state", 0)
-                printers.append((printer, status))
+        return cups_client.usb_printers()
     except Exception as e:
-        print(f"Erreur CUPS : {e}")
-    return printers
+        report_error("cups", f"Erreur CUPS : {e}")
+        return []
 
 def get_printer_status_text(status: int) -> str:
     """
@@ -168,23 +391,808 @@ def get_printer_status_icon(status: int) -> Dict[str, str]:
     default_icon = {"class": "fas fa-question-circle", "color": "#95a5a6"}
     return status_icons.get(status, default_icon)
 
-# ===== FONCTIONS POUR LE WI-FI =====
+def submit_print_job(
+    printer_name: str,
+    title: str,
+    documents: List[Tuple[str, Union[str, bytes]]],
+    options: Dict[str, str],
+    document_format: str = FORMAT_AUTO
+) -> int:
+    """
+    Soumet des documents à CUPS en passant par le cache raster.
+    
+    Si tous les documents sont déjà convertis, la tâche est envoyée brute,
+    sans filtre ; sinon elle suit la chaîne de filtres habituelle de CUPS
+    (les documents qui reviennent sont convertis en arrière-plan pour les
+    impressions suivantes).
+    
+    Args:
+        printer_name: Nom de l'imprimante
+        title: Titre de la tâche
+        documents: Liste de tuples (nom_document, chemin ou contenu)
+        options: Options d'impression
+        document_format: Type MIME des documents
+        
+    Returns:
+        int: Identifiant de la tâche CUPS
+    """
+    # Le nombre de copies ne change pas la conversion : CUPS le gère aussi pour une tâche brute
+    render_options = {name: value for name, value in options.items() if name != "copies"}
+    raw_options = {name: value for name, value in options.items() if name == "copies"}
+    
+    with contextlib.ExitStack() as stack:
+        if RASTER_CACHE_ENABLED and cups_client.printers().get(printer_name) is not None:
+            # Chaque document est consulté : les absents sont ainsi comptés comme déjà vus
+            cached = []
+            for name, source in documents:
+                entry = raster_cache.lookup(printer_name, source, render_options, document_format)
+                if entry is not None:
+                    cached.append((name, stack.enter_context(entry)))
+            if len(cached) == len(documents):
+                return cups_client.submit_documents(printer_name, title, cached, raw_options, FORMAT_RAW)
+        
+        streams = [
+            (name, io.BytesIO(source) if isinstance(source, bytes) else stack.enter_context(open(source, "rb")))
+            for name, source in documents
+        ]
+        return cups_client.submit_documents(printer_name, title, streams, options, document_format)
+
+# Suivi des branchements USB (événements du noyau) : état "débranchée" et reprise des files
+HOTPLUG_ENABLED = os.environ.get("HOTPLUG_ENABLED", "1") == "1"
+# Réactivation automatique (cupsenable, cupsaccept) d'une file arrêtée quand son imprimante est rebranchée
+HOTPLUG_AUTO_RESUME = os.environ.get("HOTPLUG_AUTO_RESUME", "1") == "1"
+
+hotplug = HotplugMonitor(cups_client.printers)
+
+def get_printer_connected(printer_name: str, printers: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[bool]:
+    """
+    Indique si une imprimante USB est branchée.
+    
+    Args:
+        printer_name: Nom de la file CUPS
+        printers: Attributs des files CUPS (relus dans le cache sinon)
+        
+    Returns:
+        Optional[bool]: None si inconnu (file non USB, suivi désactivé ou indisponible)
+    """
+    if not HOTPLUG_ENABLED:
+        return None
+    return hotplug.connected(printer_name, printers)
+
+printer_pool = PrinterPool(
+    cups_client,
+    PRINTER_POOLS,
+    auto_pool=PRINTER_POOL_AUTO or None,
+    usb_printers=get_usb_printers,
+    connected=get_printer_connected
+)
+
+def submit_document_data(
+    printer_name: str,
+    title: str,
+    documents: List[Tuple[str, bytes]],
+    options: Dict[str, str],
+    document_format: str,
+    results: Optional[List[Dict[str, Any]]] = None
+) -> Tuple[int, str]:
+    """
+    Soumet des documents reçus en mémoire (API ou reprise du journal).
+    
+    Args:
+        printer_name: Nom de l'imprimante ou d'un groupe d'imprimantes
+        title: Titre de la tâche
+        documents: Liste de tuples (nom_document, contenu)
+        options: Options d'impression
+        document_format: Type MIME des documents (TICKET_BATCH_FORMAT : lot de tickets JSON)
+        results: Liste complétée avec le résultat de chaque ticket d'un lot
+        
+    Returns:
+        Tuple[int, str]: Identifiant de la tâche CUPS et imprimante choisie
+    """
+    if document_format == TICKET_BATCH_FORMAT:
+        tickets, cut = parse_batch(json.loads(documents[0][1]), BATCH_MAX_TICKETS)
+        batch = TicketBatchStream(ticket_renderer, tickets, cut)
+        try:
+            # Premier ticket valide rendu avant de choisir l'imprimante et de créer la tâche
+            batch.prime()
+            printer_name = printer_pool.resolve(printer_name)
+            # Une seule tâche brute : les tickets sont traduits pendant l'envoi à cupsd
+            return cups_client.submit_stream(printer_name, title, batch, options, FORMAT_RAW), printer_name
+        finally:
+            if results is not None:
+                results.extend(batch.results)
+    
+    printer_name = printer_pool.resolve(printer_name)
+    if document_format == FORMAT_RAW:
+        # Déjà au format de l'imprimante (tickets Star Line) : pas de passage par le cache raster
+        streams = [(name, io.BytesIO(data)) for name, data in documents]
+        return cups_client.submit_documents(printer_name, title, streams, options, FORMAT_RAW), printer_name
+    return submit_print_job(printer_name, title, documents, options, document_format), printer_name
+
+def print_documents(
+    printer_name: str,
+    title: str,
+    documents: List[Tuple[str, bytes]],
+    options: Dict[str, str],
+    document_format: str,
+    key: Optional[str] = None,
+    results: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Enregistre des documents dans le journal des tickets, puis les soumet à CUPS.
+    
+    Sans journal (désactivé, ou indisponible après un échec de l'ouverture),
+    les documents sont soumis directement : pas de reprise au démarrage ni
+    d'idempotence, la clé renvoyée est None.
+    
+    Args:
+        printer_name: Nom de l'imprimante ou d'un groupe d'imprimantes
+        title: Titre de la tâche
+        documents: Liste de tuples (nom_document, contenu)
+        options: Options d'impression
+        document_format: Type MIME des documents
+        key: Clé d'idempotence fournie par le client
+        results: Voir submit_document_data
+        
+    Returns:
+        Dict: job_id, printer et key (None sans journal)
+        
+    Raises:
+        DuplicateTicket: Un ticket avec cette clé a déjà été reçu
+    """
+    entry = None
+    if JOURNAL_ENABLED:
+        try:
+            entry = print_journal.accept(printer_name, title, documents, options, document_format, key)
+        except JournalUnavailable as e:
+            report_error("journal", f"Journal des tickets indisponible, impression sans journal : {e}")
+    if entry is None:
+        job_id, printer_name = submit_document_data(printer_name, title, documents, options, document_format, results)
+        return {"job_id": job_id, "printer": printer_name, "key": None}
+    
+    key = entry["key"]
+    try:
+        job_id, printer_name = submit_document_data(
+            printer_name, tag_title(title, key), documents, options, document_format, results
+        )
+    except Exception as e:
+        # L'erreur est renvoyée au client : le ticket ne doit pas être rejoué au démarrage
+        print_journal.finished(key, "abandoned", str(e))
+        raise
+    print_journal.submitted(key, job_id, printer_name)
+    return {"job_id": job_id, "printer": printer_name, "key": key}
+
+def get_idempotency_key() -> Optional[str]:
+    """
+    Lit la clé d'idempotence de la requête (en-tête Idempotency-Key).
+    
+    Returns:
+        Optional[str]: Clé fournie par le client, None si absente
+        
+    Raises:
+        ValueError: Clé invalide
+    """
+    key = request.headers.get("Idempotency-Key", "").strip()
+    if not key:
+        return None
+    if not KEY_PATTERN.match(key):
+        raise ValueError("Idempotency-Key invalide (1 à 64 caractères parmi A-Z, a-z, 0-9, _ et -)")
+    return key
+
+def duplicate_ticket_response(entry: Dict[str, Any]):
+    """
+    Réponse à un ticket déjà reçu : la tâche existante, sans nouvelle impression.
+    
+    Args:
+        entry: Entrée du journal du ticket d'origine
+        
+    Returns:
+        Réponse JSON (409 si le ticket d'origine a échoué)
+    """
+    if entry.get("result") == "abandoned":
+        return jsonify({
+            "success": False,
+            "message": f"Ce ticket a déjà été refusé : {entry.get('message', 'erreur inconnue')}",
+            "key": entry["key"]
+        }), 409
+    return jsonify({
+        "success": True,
+        "message": "Ticket déjà reçu, pas de nouvelle impression",
+        "duplicate": True,
+        "key": entry["key"],
+        "job_id": entry.get("job_id"),
+        "printer": entry.get("job_printer"),
+        "state": entry.get("result", entry["state"])
+    })
+
+# ===== ÉCHANTILLONNAGE DES RESSOURCES SYSTÈME =====
+
+# Délai du premier échantillon (mesure CPU sur une fenêtre courte, mais disponible au démarrage)
+SAMPLER_FIRST_SAMPLE_DELAY = 0.1
 
-def has_connected_to_wifi(ssid: str) -> bool:
+SAMPLER_PROBE_DURATION = REGISTRY.histogram(
+    "tberryprint_sampler_probe_duration_seconds",
+    "Durée de chaque sonde de l'échantillonneur système",
+    ("probe",)
+)
+
+class SystemSampler:
+    """
+    Collecte en tâche de fond les ressources système et l'état des imprimantes.
+
+    Un thread unique mesure CPU, RAM, température et imprimantes à intervalle
+    fixe et conserve le dernier échantillon : les routes le lisent sans attendre
+    au lieu d'appeler psutil.cpu_percent(interval=1) à chaque requête.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = max(0.2, interval)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._printers: Optional[List[Tuple[str, int]]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Any] = []
+
+    def add_listener(self, callback: Any) -> None:
+        """
+        Enregistre une fonction appelée à chaque nouvel échantillon.
+
+        Args:
+            callback: Fonction recevant l'échantillon publié
+        """
+        self._listeners.append(callback)
+
+    def start(self) -> None:
+        """Démarre le thread d'échantillonnage s'il ne tourne pas déjà."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            # Premiers appels non bloquants : initialisent les références de /proc/stat et de psutil
+            telemetry.cpu_percent_per_core()
+            psutil.cpu_percent(interval=None)
+            self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+            self._thread.start()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Renvoie le dernier échantillon disponible.
+
+        Au tout premier appel, attend au plus deux intervalles que le thread
+        ait produit une mesure, puis échantillonne directement en dernier recours.
+
+        Returns:
+            Dict: Dernier échantillon (cpu_percent, memory, temperature, printers, monotonic)
+        """
+        self.start()
+        self._ready.wait(self.interval * 2)
+        with self._lock:
+            snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._store(self._sample())
+        return snapshot
+
+    def _sample(self) -> Dict[str, Any]:
+        """Mesure les ressources système et l'état des imprimantes (chaque sonde est chronométrée)."""
+        with SAMPLER_PROBE_DURATION.time(probe="cpu"):
+            # Utilisation par cœur (différences de /proc/stat), psutil en repli
+            cpu_cores = telemetry.cpu_percent_per_core() or {}
+            cpu_percent = cpu_cores.pop("cpu") if "cpu" in cpu_cores else psutil.cpu_percent(interval=None)
+        with SAMPLER_PROBE_DURATION.time(probe="memory"):
+            memory = psutil.virtual_memory()
+        with SAMPLER_PROBE_DURATION.time(probe="temperature"):
+            temperature = get_temperature()
+        with SAMPLER_PROBE_DURATION.time(probe="throttled"):
+            throttled = telemetry.throttled_flags()
+        # Imprimantes : relues uniquement sur événement (CUPS, branchement USB), voir refresh_printers()
+        with self._lock:
+            printers = self._printers
+        if printers is None:
+            with SAMPLER_PROBE_DURATION.time(probe="printers"):
+                printers = get_usb_printers()
+        return {
+            "cpu_percent": cpu_percent,
+            "cpu_cores": [cpu_cores[name] for name in sorted(cpu_cores, key=lambda name: int(name[3:]))],
+            "memory": memory,
+            "temperature": temperature,
+            "throttled": throttled,
+            "printers": printers,
+            "timestamp": time.time(),
+            "monotonic": time.monotonic()
+        }
+
+    def refresh_printers(self) -> None:
+        """Relit l'état des imprimantes et republie le dernier échantillon avec cet état."""
+        printers = get_usb_printers()
+        with self._lock:
+            self._printers = printers
+            if self._snapshot is None:
+                return
+            snapshot = dict(self._snapshot)
+        snapshot["printers"] = printers
+        self._store(snapshot)
+
+    def _store(self, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+        """Publie un nouvel échantillon comme dernier échantillon disponible."""
+        with self._lock:
+            self._snapshot = snapshot
+        self._ready.set()
+        for callback in list(self._listeners):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                report_error("sampler", f"Erreur lors de la publication d'un échantillon : {e}")
+        return snapshot
+
+    def _run(self) -> None:
+        """Boucle d'échantillonnage à cadence fixe (sans dérive)."""
+        # Premier échantillon rapproché : le premier tableau de bord n'attend pas un intervalle entier
+        next_tick = time.monotonic() + min(self.interval, SAMPLER_FIRST_SAMPLE_DELAY)
+        while True:
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+            try:
+                self._store(self._sample())
+            except Exception as e:
+                report_error("sampler", f"Erreur lors de l'échantillonnage système : {e}")
+            next_tick += self.interval
+            # En cas de retard important (système surchargé), on se recale
+            if next_tick < time.monotonic():
+                next_tick = time.monotonic() + self.interval
+
+def get_sample_age(snapshot: Dict[str, Any]) -> float:
+    """
+    Calcule l'âge d'un échantillon.
+
+    Args:
+        snapshot: Échantillon renvoyé par SystemSampler.snapshot()
+
+    Returns:
+        float: Âge de l'échantillon en secondes
+    """
+    return round(time.monotonic() - snapshot["monotonic"], 3)
+
+def build_stats_payload(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Construit les statistiques renvoyées par /stats à partir d'un échantillon.
+    
+    Args:
+        snapshot: Échantillon renvoyé par SystemSampler.snapshot()
+        
+    Returns:
+        Dict: Statistiques formatées pour le tableau de bord
+    """
+    memory = snapshot["memory"]
+    cpu_percent_value = snapshot["cpu_percent"]
+    
+    job_stats = job_tracker.stats()
+    cups_printers = cups_client.printers() if HOTPLUG_ENABLED else None
+    printers_data = []
+    for printer_name, status_code in snapshot["printers"]:
+        connected = get_printer_connected(printer_name, cups_printers)
+        printers_data.append({
+            "name": printer_name,
+            "status": status_code,
+            "status_text": get_printer_status_text(status_code)
+            if connected is not False else "L'imprimante est débranchée (câble USB).",
+            "status_icon": get_printer_status_icon(status_code)
+            if connected is not False else {"class": "fas fa-plug", "color": "#e74c3c"},
+            # None si le branchement n'est pas suivi (file non USB, suivi désactivé)
+            "connected": connected,
+            "jobs": job_stats.get(printer_name)
+        })
+    
+    return {
+        # Nom du boîtier (repris par l'agrégateur de flotte)
+        "hostname": get_hostname(),
+        "cpu_percent": format_percent(cpu_percent_value),
+        "raw_cpu_percent": cpu_percent_value,
+        "temperature": snapshot["temperature"],
+        "ram_used": format_memory(memory.used),
+        "ram_percent": format_percent(memory.percent),
+        "raw_ram_percent": memory.percent,
+        "cpu_cores": snapshot.get("cpu_cores", []),
+        # Indicateurs actifs de get_throttled (ex: under_voltage), None si indisponible
+        "throttled": [flag for flag, active in snapshot["throttled"].items() if active]
+        if snapshot.get("throttled") is not None else None,
+        "printers": printers_data,
+        "sample_age": get_sample_age(snapshot)
+    }
+
+class StatsSubscriber:
+    """File d'attente d'un client du flux SSE : les changements non lus sont fusionnés."""
+
+    def __init__(self) -> None:
+        self.pending: Dict[str, Any] = {}
+        self.event = threading.Event()
+
+class StatsBroadcaster:
+    """
+    Diffuse les changements de statistiques à tous les clients du flux SSE.
+
+    Un seul producteur (l'échantillonneur) calcule les champs modifiés ;
+    chaque client ne fait qu'attendre, le coût serveur reste donc constant
+    quel que soit le nombre d'onglets ouverts. Un client lent ne reçoit
+    que la fusion des changements qu'il n'a pas encore lus.
+    """
+
+    # Champs qui changent à chaque échantillon sans intérêt pour l'affichage
+    IGNORED_FIELDS = ("sample_age",)
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._last: Dict[str, Any] = {}
+        self._subscribers: List[StatsSubscriber] = []
+
+    def publish(self, payload: Dict[str, Any]) -> None:
+        """
+        Calcule les champs modifiés depuis la dernière publication et les diffuse.
+        
+        Args:
+            payload: Statistiques complètes (voir build_stats_payload)
+        """
+        with self._lock:
+            changes = {
+                key: value for key, value in payload.items()
+                if key not in self.IGNORED_FIELDS and self._last.get(key) != value
+            }
+            self._last = payload
+            if not changes:
+                return
+            for subscriber in self._subscribers:
+                subscriber.pending.update(changes)
+                subscriber.event.set()
+
+    def subscribe(self, limit: Optional[int] = None) -> Optional[StatsSubscriber]:
+        """
+        Inscrit un nouveau client du flux.
+        
+        Args:
+            limit: Nombre maximal de clients inscrits
+            
+        Returns:
+            Optional[StatsSubscriber]: Client inscrit, ou None si la limite est atteinte
+        """
+        subscriber = StatsSubscriber()
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def count(self) -> int:
+        """Nombre de clients inscrits."""
+        with self._lock:
+            return len(self._subscribers)
+
+    def unsubscribe(self, subscriber: StatsSubscriber) -> None:
+        """Désinscrit un client du flux."""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def wait(self, subscriber: StatsSubscriber, timeout: float) -> Optional[Dict[str, Any]]:
+        """
+        Attend les prochains changements destinés à un client.
+        
+        Args:
+            subscriber: Client inscrit via subscribe()
+            timeout: Délai maximal d'attente en secondes
+            
+        Returns:
+            Optional[Dict]: Champs modifiés, ou None si le délai est écoulé
+        """
+        if not subscriber.event.wait(timeout):
+            return None
+        with self._lock:
+            changes = subscriber.pending
+            subscriber.pending = {}
+            subscriber.event.clear()
+        return changes
+
+def record_history(snapshot: Dict[str, Any]) -> None:
+    """
+    Enregistre un échantillon et les transitions d'imprimantes dans l'historique.
+    
+    Args:
+        snapshot: Échantillon renvoyé par SystemSampler.snapshot()
+    """
+    timestamp = snapshot["timestamp"]
+    history.record(timestamp, {
+        "cpu": snapshot["cpu_percent"],
+        "ram": snapshot["memory"].percent,
+        "temperature": parse_temperature(snapshot["temperature"])
+    })
+    for printer_name, status in snapshot["printers"]:
+        history.record_printer_state(timestamp, printer_name, status)
+
+sampler = SystemSampler(STATS_SAMPLE_INTERVAL)
+broadcaster = StatsBroadcaster()
+REGISTRY.gauge(
+    "tberryprint_sse_subscribers",
+    "Clients connectés au flux SSE des statistiques",
+    broadcaster.count
+)
+history = MetricsHistory(HISTORY_PATH)
+atexit.register(history.flush)
+
+# Chaque échantillon alimente le flux SSE ; un changement d'imprimante signalé
+# par CUPS est republié immédiatement sans attendre le prochain échantillon
+sampler.add_listener(lambda snapshot: broadcaster.publish(build_stats_payload(snapshot)))
+sampler.add_listener(record_history)
+cups_client.add_listener(lambda event, printer_name: sampler.refresh_printers())
+
+def on_usb_hotplug(action: str, device: Dict[str, Any], queues: List[str]) -> None:
+    """
+    Répercute un branchement ou un débranchement d'imprimante USB.
+    
+    Le flux de statistiques est mis à jour immédiatement ; au rebranchement,
+    les files associées arrêtées par CUPS (échec d'envoi pendant le
+    débranchement) sont réactivées.
+    
+    Args:
+        action: "add", "remove" ou "refresh" (événements perdus)
+        device: Attributs USB du périphérique
+        queues: Files CUPS associées au périphérique
+    """
+    if action != "refresh":
+        label = " ".join(filter(None, (device.get("manufacturer"), device.get("product")))) or device.get("devpath")
+        print(f"Imprimante USB {'branchée' if action == 'add' else 'débranchée'} : {label} (files : {', '.join(queues) or 'aucune'})")
+    sampler.refresh_printers()
+    if action != "add" or not HOTPLUG_AUTO_RESUME:
+        return
+    printers = cups_client.printers()
+    stopped = [queue for queue in queues if printers.get(queue, {}).get("printer-state") == 5]
+    if stopped:
+        # Hors du thread de lecture des événements : la réactivation passe par le service privilégié
+        threading.Thread(target=resume_printers, args=(stopped,), name="printer-resume", daemon=True).start()
+
+def resume_printers(printer_names: List[str]) -> None:
+    """Réactive des files CUPS (cupsenable, cupsaccept) après le rebranchement de leur imprimante."""
+    for printer_name in printer_names:
+        result = run_privileged("printer_resume", printer_name)
+        if result.returncode == 0:
+            print(f"File {printer_name} réactivée après rebranchement")
+        else:
+            report_error("hotplug", f"Réactivation de {printer_name} impossible : {result.stderr or result.stdout}")
+
+hotplug.add_listener(on_usb_hotplug)
+
+# ===== SPOULEUR DES BILLETS =====
+
+def get_spooler_printer() -> Optional[str]:
+    """
+    Détermine l'imprimante qui reçoit les billets du spouleur.
+    
+    Returns:
+        Optional[str]: SPOOLER_PRINTER si défini, sinon le groupe automatique des
+        imprimantes USB (ou la première imprimante USB non arrêtée s'il est désactivé)
+    """
+    if SPOOLER_PRINTER:
+        return SPOOLER_PRINTER
+    for printer_name, status in get_usb_printers():
+        if status != 5:
+            return PRINTER_POOL_AUTO or printer_name
+    return None
+
+def submit_tickets(printer_name: str, paths: List[str]) -> int:
+    """
+    Envoie un lot de billets à CUPS dans une seule tâche.
+    
+    Args:
+        printer_name: Nom de l'imprimante ou d'un groupe d'imprimantes
+        paths: Chemins des fichiers de billets
+        
+    Returns:
+        int: Identifiant de la tâche CUPS
+    """
+    documents = [(os.path.basename(path), path) for path in paths]
+    return submit_print_job(printer_pool.resolve(printer_name), f"Billets ({len(paths)})", documents, DEFAULT_PRINT_OPTIONS)
+
+spooler = TicketSpooler(
+    SPOOLER_DIR,
+    submit=submit_tickets,
+    resolve_printer=get_spooler_printer,
+    max_pending=SPOOLER_MAX_PENDING,
+    max_batch=SPOOLER_MAX_BATCH,
+    batch_window=SPOOLER_BATCH_WINDOW
+)
+
+REGISTRY.gauge(
+    "tberryprint_spooler_queue_depth",
+    "Billets en attente dans le spouleur",
+    lambda: spooler.status()["queue_depth"] if SPOOLER_ENABLED else None
+)
+REGISTRY.gauge(
+    "tberryprint_print_jobs_active",
+    "Tâches d'impression non terminées par imprimante",
+    lambda: {printer: stats["active"] for printer, stats in job_tracker.stats().items()},
+    ("printer",)
+)
+REGISTRY.gauge(
+    "tberryprint_print_journal",
+    "Journal des tickets (taille, écritures, durée de la dernière reprise)",
+    lambda: {
+        name: value for name, value in print_journal.status().items()
+        if name in ("size_bytes", "records", "batches", "fsync_seconds", "compactions", "duplicates")
+    } | {
+        name: value for name, value in print_journal.recovery.items()
+        if name in ("duration", "since_start", "unfinished", "resubmitted")
+    } if JOURNAL_ENABLED else None,
+    ("value",)
+)
+REGISTRY.gauge(
+    "tberryprint_raster_cache",
+    "État du cache raster (succès, échecs, évictions, taille)",
+    lambda: {
+        name: value for name, value in raster_cache.stats().items()
+        if name in ("hits", "misses", "bypassed", "evictions", "entries", "size_bytes", "cpu_saved_seconds")
+    },
+    ("value",)
+)
+
+def start_background_services() -> None:
+    """Démarre les services locaux qui doivent être prêts avant la première requête."""
+    if JOURNAL_ENABLED:
+        try:
+            print_journal.open()
+            cups_client.add_job_listener(print_journal.handle_job_event)
+            # Reprise en arrière-plan : n'attend pas cupsd
+            print_journal.start_recovery(cups_client, submit_document_data, started_at=startup.started_at)
+        except Exception as e:
+            report_error("journal", f"Erreur lors de l'ouverture du journal des tickets : {e}")
+    if SPOOLER_ENABLED:
+        try:
+            spooler.start()
+        except Exception as e:
+            report_error("spooler", f"Erreur lors du démarrage du spouleur : {e}")
+
+def start_deferred_services() -> None:
     """
-    Vérifie si un réseau Wi-Fi identifié par son SSID a déjà été connecté,
-    en vérifiant l'existence du fichier de configuration correspondant dans
-    /etc/NetworkManager/system-connections/<SSID>.nmconnection.
+    Démarre les services qui interrogent CUPS et le système.
+    
+    Lancés une fois le port ouvert : un cupsd encore en démarrage ne retarde
+    plus la première page, et le premier échantillon système est prêt quand
+    elle est demandée.
+    """
+    sampler.start()
+    cups_client.start()
+    job_tracker.start()
+    if HOTPLUG_ENABLED:
+        try:
+            hotplug.start()
+        except OSError as e:
+            report_error("hotplug", f"Suivi des branchements USB indisponible : {e}")
+    if PRINTER_POOLS or PRINTER_POOL_AUTO:
+        printer_pool.start()
+
+def on_server_listening() -> None:
+    """Le port accepte les requêtes : démarrage des services différés, puis signal de disponibilité."""
+    startup.mark("serving")
+    sd_notify("STATUS=Démarrage des services (CUPS, imprimantes)")
+    threading.Thread(target=finish_startup, name="startup", daemon=True).start()
+
+def finish_startup() -> None:
+    """Attend les services différés (au plus STARTUP_READY_TIMEOUT) et signale la disponibilité."""
+    done = threading.Event()
+    
+    def run() -> None:
+        try:
+            start_deferred_services()
+        except Exception as e:
+            report_error("startup", f"Erreur lors du démarrage des services : {e}")
+        finally:
+            done.set()
+    
+    threading.Thread(target=run, name="deferred-services", daemon=True).start()
+    if not done.wait(STARTUP_READY_TIMEOUT):
+        report_error("startup", f"Services toujours en cours de démarrage après {STARTUP_READY_TIMEOUT:g} s")
+    startup.mark("ready")
+    health = get_health()
+    sd_notify("READY=1", f"STATUS={format_health(health)}")
+    phases = startup.report()["since_boot"]
+    print(f"Interface prête {phases['ready']:.2f} s après le démarrage du système "
+          f"(processus lancé à {phases['process_start']:.2f} s, requêtes servies dès {phases['serving']:.2f} s) : "
+          f"{format_health(health)}")
+
+# ===== ÉTAT DE SANTÉ =====
+
+def get_health() -> Dict[str, Any]:
+    """
+    Relève l'état du service et de ses sous-systèmes, sans appel à cupsd ni commande.
+    
+    Returns:
+        Dict: status ("starting", "ok" ou "degraded"), jalons du démarrage et
+        état de CUPS, des imprimantes USB, du réseau et du journal des tickets
+    """
+    cups_status = cups_client.status()
+    # Le cache CUPS n'est lu qu'une fois le suivi démarré (sinon lecture bloquante de cupsd)
+    printers = cups_client.printers() if cups_status["started"] else {}
+    usb = [
+        name for name, attributes in printers.items()
+        if attributes.get("device-uri", "").lower().startswith("usb:")
+    ]
+    stopped = [name for name in usb if printers[name].get("printer-state") == 5]
+    unplugged = [name for name in usb if get_printer_connected(name, printers) is False]
+    ip_address = telemetry.primary_ip()
+    ssid = telemetry.wifi_ssid(WIFI_INTERFACE)
+    
+    subsystems = {
+        "cups": {"ok": cups_status["connected"], "queues": cups_status["printers"]},
+        "printers": {
+            "ok": bool(usb) and not stopped and not unplugged,
+            "usb": len(usb),
+            "stopped": len(stopped),
+            "unplugged": len(unplugged)
+        },
+        "network": {
+            "ok": ip_address is not None,
+            "ip_address": ip_address,
+            "wifi_connected": bool(ssid) if ssid is not None else None
+        },
+        # Journal indisponible : les tickets sont imprimés sans reprise ni idempotence
+        "journal": {
+            "ok": not JOURNAL_ENABLED or print_journal.available,
+            "enabled": JOURNAL_ENABLED,
+            "error": print_journal.error if JOURNAL_ENABLED else None
+        }
+    }
+    if not startup.reached("ready"):
+        status = "starting"
+    else:
+        status = "ok" if all(subsystem["ok"] for subsystem in subsystems.values()) else "degraded"
+    return {
+        "status": status,
+        "uptime": round(time.time() - startup.started_at, 3),
+        "startup": startup.report(),
+        **subsystems
+    }
 
+def format_health(health: Dict[str, Any]) -> str:
+    """
+    Résume l'état de santé en une ligne (statut systemd, journal).
+    
     Args:
-        ssid (str): Le SSID du réseau Wi-Fi. Peut contenir des espaces (ex: "iPhone Hugo").
+        health: État renvoyé par get_health()
+        
+    Returns:
+        str: Résumé lisible
+    """
+    cups = "CUPS joignable" if health["cups"]["ok"] else "CUPS injoignable"
+    printers = health["printers"]
+    printers_text = f"{printers['usb']} imprimante(s) USB"
+    if printers["stopped"] or printers["unplugged"]:
+        printers_text += f" ({printers['stopped']} arrêtée(s), {printers['unplugged']} débranchée(s))"
+    network = f"réseau {health['network']['ip_address']}" if health["network"]["ok"] else "réseau indisponible"
+    journal = "" if health["journal"]["ok"] else ", journal des tickets indisponible"
+    return f"{cups}, {printers_text}, {network}{journal}"
+
+REGISTRY.gauge(
+    "tberryprint_startup_seconds",
+    "Jalons du démarrage du service (secondes depuis le démarrage du système)",
+    startup.phases,
+    ("phase",)
+)
+
+# ===== FONCTIONS POUR LE WI-FI =====
+
+def get_known_wifi_connections() -> set:
+    """
+    Liste les réseaux Wi-Fi déjà connectés, d'après les fichiers de configuration
+    NM_CONNECTIONS_DIR/<SSID>.nmconnection.
+    
+    Le répertoire est lu une seule fois par scan, au lieu d'un test de fichier par SSID.
 
     Returns:
-        bool: True si le fichier existe (le réseau a déjà été connecté), False sinon.
+        set: SSID des réseaux déjà connectés (peuvent contenir des espaces, ex: "iPhone Hugo")
     """
-    # Construit le chemin du fichier, en tenant compte des espaces dans le nom
-    file_path = os.path.join("/etc/NetworkManager/system-connections", f"{ssid}.nmconnection")
-    return os.path.isfile(file_path)
+    try:
+        return {
+            name[:-len(".nmconnection")]
+            for name in os.listdir(NM_CONNECTIONS_DIR)
+            if name.endswith(".nmconnection")
+        }
+    except OSError:
+        return set()
 
 def get_wifi_status() -> Dict[str, Any]:
     """
@@ -193,13 +1201,14 @@ def get_wifi_status() -> Dict[str, Any]:
     Returns:
         Dict: Informations sur la connexion Wi-Fi (connected, ssid, ip_address)
     """
+    # Lecture directe (ioctl SIOCGIWESSID et SIOCGIFADDR), sans lancer iwconfig
+    status = telemetry.wifi_status(WIFI_INTERFACE)
+    if status is not None:
+        return status
+    
     try:
         # Vérifier si le Wi-Fi est connecté
-        iwconfig_output = subprocess.run(
-            ["sudo", "/opt/TBERRYPRINT/fonctions.sh", "wifi_iwconfig"], 
-            capture_output=True, 
-            text=True
-        ).stdout
+        iwconfig_output = run_privileged("wifi_iwconfig").stdout
         
         # Chercher le SSID si connecté
         ssid_match = re.search(r'ESSID:"([^"]*)"', iwconfig_output)
@@ -211,11 +1220,7 @@ def get_wifi_status() -> Dict[str, Any]:
         # Obtenir l'adresse IP si connecté
         ip_address = None
         if is_connected:
-            ip_output = subprocess.run(
-                ["sudo", "/opt/TBERRYPRINT/fonctions.sh", "ip_info"],
-                capture_output=True,
-                text=True
-            ).stdout
+            ip_output = run_privileged("ip_info").stdout
             ip_match = re.search(r'inet (\d+\.\d+\.\d+\.\d+)', ip_output)
             ip_address = ip_match.group(1) if ip_match else None
         
@@ -225,57 +1230,143 @@ def get_wifi_status() -> Dict[str, Any]:
             "ip_address": ip_address
         }
     except Exception as e:
-        print(f"Erreur lors de la récupération du statut Wi-Fi: {e}")
+        report_error("wifi", f"Erreur lors de la récupération du statut Wi-Fi: {e}")
         return {"connected": False, "ssid": None, "ip_address": None}
 
-def get_available_wifi_networks() -> List[Dict[str, Any]]:
+def scan_wifi_networks() -> List[Dict[str, Any]]:
     """
-    Récupère la liste des réseaux Wi-Fi disponibles.
+    Lance un scan Wi-Fi via NetworkManager et analyse sa sortie structurée.
     
     Returns:
         List[Dict]: Liste des réseaux Wi-Fi avec leurs informations
     """
-    try:
-        # Lancer un scan avec iwlist
-        scan_output = subprocess.run(
-            ["sudo", "/opt/TBERRYPRINT/fonctions.sh", "wifi_scan_iwlist"],
-            capture_output=True,
-            text=True
-        ).stdout
-        
-        # Extraire les SSID et le niveau de signal
-        networks = []
-        cells = scan_output.split("Cell ")
-        
-        for cell in cells[1:]:  # Ignorer la première partie qui ne contient pas de réseau
-            ssid_match = re.search(r'ESSID:"([^"]*)"', cell)
-            signal_match = re.search(r'Signal level=(-\d+) dBm', cell)
-            encryption_match = re.search(r'Encryption key:(\w+)', cell)
-            
-            if ssid_match and signal_match:
-                ssid = ssid_match.group(1)
-                signal_level = int(signal_match.group(1))
-                encrypted = encryption_match.group(1) == "on" if encryption_match else True
-                hasConnected = has_connected_to_wifi(ssid)
-                
-                # Convertir le niveau de signal en pourcentage (approximatif)
-                # -30 dBm est excellent (100%), -90 dBm est faible (0%)
-                signal_percent = max(0, min(100, 2 * (signal_level + 100)))
-                
-                networks.append({
-                    "ssid": ssid,
-                    "signal_level": signal_level,
-                    "signal_percent": signal_percent,
-                    "encrypted": encrypted,
-                    "hasConnected": hasConnected
-                })
+    # Sortie terse de nmcli : IN-USE:SSID:SIGNAL:SECURITY (une ligne par point d'accès)
+    scan_output = run_privileged("wifi_scan_nmcli", timeout=WIFI_SCAN_TIMEOUT).stdout
+    known_connections = get_known_wifi_connections()
+    
+    # Un même SSID peut être diffusé par plusieurs points d'accès : on garde le plus fort
+    networks: Dict[str, Dict[str, Any]] = {}
+    for line in scan_output.splitlines():
+        fields = split_terse_line(line)
+        if len(fields) < 4 or not fields[1] or not fields[2].isdigit():
+            continue
+        ssid, signal_percent, security = fields[1], int(fields[2]), fields[3]
+        if ssid in networks and networks[ssid]["signal_percent"] >= signal_percent:
+            continue
         
-        # Trier par niveau de signal (du plus fort au plus faible)
-        return sorted(networks, key=lambda x: x["signal_level"], reverse=True)
+        networks[ssid] = {
+            "ssid": ssid,
+            # nmcli donne un pourcentage : conversion inverse de l'échelle -100 dBm (0%) à -50 dBm (100%)
+            "signal_level": signal_percent // 2 - 100,
+            "signal_percent": signal_percent,
+            "encrypted": security not in ("", "--"),
+            "hasConnected": ssid in known_connections
+        }
+    
+    # Trier par niveau de signal (du plus fort au plus faible)
+    return sorted(networks.values(), key=lambda x: x["signal_level"], reverse=True)
+
+def get_available_wifi_networks(force: bool = False) -> List[Dict[str, Any]]:
+    """
+    Récupère la liste des réseaux Wi-Fi disponibles depuis le cache des scans.
+    
+    Args:
+        force: Attendre un nouveau scan au lieu de servir le dernier résultat
+    
+    Returns:
+        List[Dict]: Liste des réseaux Wi-Fi avec leurs informations
+    """
+    try:
+        return wifi_scans.get(force=force)
     except Exception as e:
-        print(f"Erreur lors de la récupération des réseaux Wi-Fi: {e}")
+        report_error("wifi", f"Erreur lors de la récupération des réseaux Wi-Fi: {e}")
         return []
 
+wifi_scans = WifiScanCache(scan_wifi_networks, ttl=WIFI_SCAN_TTL, timeout=WIFI_SCAN_TIMEOUT)
+
+
+# ===== TÂCHES DE MAINTENANCE =====
+
+def schedule_privileged(op: str, delay: float = TASK_FOLLOWUP_DELAY) -> None:
+    """
+    Exécute une opération privilégiée après un délai (ex: redémarrage en fin de tâche).
+    
+    Args:
+        op: Nom de l'opération de fonctions.sh
+        delay: Délai en secondes
+    """
+    timer = threading.Timer(delay, run_privileged, (op,))
+    timer.daemon = True
+    timer.start()
+
+def update_system_task(task) -> Dict[str, Any]:
+    """Tâche de mise à jour : apt update, apt upgrade puis redémarrage."""
+    for op in ("apt_update", "apt_upgrade"):
+        task.log(f"==> {op}")
+        result = run_privileged(op, on_line=task.log)
+        if result.returncode != 0:
+            raise TaskFailed(f"Échec de {op} (code {result.returncode})")
+    task.log("==> Redémarrage du système")
+    schedule_privileged("reboot_system")
+    return {"message": "Mise à jour terminée, redémarrage en cours", "rebooting": True}
+
+def reboot_task(task) -> Dict[str, Any]:
+    """Tâche de redémarrage (la connexion peut être coupée avant la fin)."""
+    task.log("==> Redémarrage du système")
+    schedule_privileged("reboot_system", delay=0)
+    return {"message": "Redémarrage en cours", "rebooting": True}
+
+def change_hostname_task(task, hostname: str) -> Dict[str, Any]:
+    """Tâche de changement du nom d'hôte, suivi d'un redémarrage."""
+    result = run_privileged("set_hostname", hostname, on_line=task.log)
+    if result.returncode != 0:
+        raise TaskFailed(f"Échec du changement de hostname : {result.stderr or result.stdout}")
+    task.log("==> Redémarrage du système")
+    schedule_privileged("reboot_system")
+    return {"message": f"Hostname changé en {hostname}, redémarrage en cours", "rebooting": True}
+
+def wifi_connect_task(task, op: str, *args: str) -> Dict[str, Any]:
+    """
+    Tâche de connexion Wi-Fi (wifi_connect ou wifi_up), suivie du redémarrage du service d'impression.
+    
+    Args:
+        task: Tâche en cours
+        op: "wifi_connect" (ssid, mot de passe) ou "wifi_up" (ssid)
+        args: Arguments de l'opération
+    """
+    task.log(f"==> Connexion au réseau {args[0]}")
+    result = run_privileged(op, *args, on_line=task.log)
+    if result.returncode == 1:
+        raise TaskFailed("Échec de connexion: le mot de passe semble incorrect")
+    if result.returncode != 0:
+        raise TaskFailed(f"Erreur lors de la configuration Wi-Fi: {result.stderr or result.stdout}")
+    
+    # Redémarrage du service d'impression après le changement de connexion
+    task.log("==> Redémarrage du service d'impression")
+    schedule_privileged("TBerryPrint_restart")
+    return {"message": "Connexion Wi-Fi configurée avec succès", "requires_reboot": True}
+
+def start_task(kind: str, target, *args: Any, group: Optional[str] = None):
+    """
+    Lance une tâche de maintenance et prépare la réponse HTTP.
+    
+    Returns:
+        Tuple: Réponse JSON (202 avec l'identifiant, ou 409 si une tâche du même groupe tourne déjà)
+    """
+    try:
+        task = task_runner.submit(kind, target, *args, group=group)
+    except TaskAlreadyRunning as e:
+        return jsonify({"success": False, "message": str(e), "task_id": e.task.id}), 409
+    return jsonify({
+        "success": True,
+        "task_id": task.id,
+        "status_url": url_for("get_task", task_id=task.id)
+    }), 202
+
+def wants_json() -> bool:
+    """Vrai si le client attend une réponse JSON (appel fetch) plutôt qu'une redirection."""
+    return request.accept_mimetypes.best == "application/json"
+
 
 # ===== FONCTIONS D'AUTHENTIFICATION =====
 
@@ -306,33 +1397,41 @@ def dashboard():
     if not check_auth():
         return redirect(url_for("login"))
     
-    # Récupération des informations système
-    cpu_percent = psutil.cpu_percent(interval=1)
-    memory = psutil.virtual_memory()
-    
-    # Formatage des informations de RAM
-    ram_total = format_memory(memory.total)
-    ram_used = format_memory(memory.used)
-    ram_percent = format_percent(memory.percent)
+    # Collecte parallèle : une sonde lente n'affiche qu'une valeur d'attente
+    data = page_probes.gather("dashboard", {
+        "snapshot": (sampler.snapshot, PAGE_PROBE_TIMEOUT, None),
+        "printers": (get_usb_printers, PAGE_PROBE_TIMEOUT, []),
+        "ip_address": (get_ip, PAGE_PROBE_TIMEOUT, PROBE_PLACEHOLDER),
+        "hostname": (get_hostname, PAGE_PROBE_TIMEOUT, PROBE_PLACEHOLDER)
+    })
+    snapshot = data["snapshot"]
     
-    # Récupération des autres informations
-    ip_address = get_ip()
-    hostname = get_hostname()
-    usb_printers = get_usb_printers()
-    temperature = get_temperature()
+    # Formatage des informations système (complétées par /stats si l'échantillon est en retard)
+    if snapshot is not None:
+        memory = snapshot["memory"]
+        system = {
+            "cpu_percent": format_percent(snapshot["cpu_percent"]),
+            "temperature": snapshot["temperature"],
+            "ram_total": format_memory(memory.total),
+            "ram_used": format_memory(memory.used),
+            "ram_percent": format_percent(memory.percent)
+        }
+    else:
+        system = dict.fromkeys(("cpu_percent", "temperature", "ram_used", "ram_percent"), PROBE_PLACEHOLDER)
+        # La RAM totale ne change pas et n'est pas envoyée par /stats : lecture directe de /proc/meminfo
+        system["ram_total"] = format_memory(psutil.virtual_memory().total)
     
-    return render_template(
+    page = render_template(
         "index.html",
-        cpu_percent=format_percent(cpu_percent),
-        ip_address=ip_address,
-        hostname=hostname,
-        usb_printers=usb_printers,
-        temperature=temperature,
-        ram_total=ram_total,
-        ram_used=ram_used,
-        ram_percent=ram_percent,
-        session=session
+        ip_address=data["ip_address"],
+        hostname=data["hostname"],
+        usb_printers=data["printers"],
+        session=session,
+        **system
     )
+    if startup.mark("first_dashboard"):
+        print(f"Premier tableau de bord servi {startup.phases()['first_dashboard']:.2f} s après le démarrage du système")
+    return page
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
@@ -365,50 +1464,253 @@ def wifi_setup():
     if not check_auth():
         return redirect(url_for("login"))
     
-    current_status = get_wifi_status()
-    return render_template(
-        "wifi_setup.html", 
-        current_status=current_status,
-        hostname=get_hostname(),
-        ip_address=get_ip()
-    )
+    # Collecte parallèle : le statut Wi-Fi en retard est complété par /api/wifi_networks
+    data = page_probes.gather("wifi_setup", {
+        "current_status": (get_wifi_status, WIFI_STATUS_TIMEOUT, {"connected": False, "ssid": None, "ip_address": None, "pending": True}),
+        "hostname": (get_hostname, PAGE_PROBE_TIMEOUT, PROBE_PLACEHOLDER),
+        "ip_address": (get_ip, PAGE_PROBE_TIMEOUT, PROBE_PLACEHOLDER)
+    })
+    return render_template("wifi_setup.html", **data)
 
 
 # ===== ROUTES DE L'API =====
 
+@app.route("/healthz")
+def healthz():
+    """
+    API d'état de santé, sans authentification (systemd, agrégateur de flotte, supervision).
+    
+    Répond 503 tant que le démarrage n'est pas terminé, puis 200 ; le champ
+    "status" vaut alors "ok", ou "degraded" si CUPS, les imprimantes USB, le
+    réseau ou le journal des tickets sont en défaut (détail par sous-système).
+    """
+    health = get_health()
+    return jsonify(health), 503 if health["status"] == "starting" else 200
+
 @app.route("/stats")
 def get_stats():
     """API pour récupérer les statistiques système en temps réel."""
     if not check_auth():
         return jsonify({"error": "Unauthorized"}), 401
     
-    # Récupération des informations système
-    memory = psutil.virtual_memory()
-    cpu_percent_value = psutil.cpu_percent(interval=1)
+    # Construction de la réponse à partir du dernier échantillon (non bloquant)
+    data = build_stats_payload(sampler.snapshot())
     
-    # Récupération des imprimantes
-    usb_printers = get_usb_printers()
-    printers_data = []
-    for printer_name, status_code in usb_printers:
-        printers_data.append({
-            "name": printer_name,
-            "status": status_code,
-            "status_text": get_printer_status_text(status_code),
-            "status_icon": get_printer_status_icon(status_code)
-        })
+    return jsonify(data)
+
+@app.route("/stats/stream")
+def stats_stream():
+    """
+    Flux SSE des statistiques : état complet à la connexion, puis uniquement les champs modifiés.
     
-    # Construction de la réponse
-    data = {
-        "cpu_percent": format_percent(cpu_percent_value),
-        "raw_cpu_percent": cpu_percent_value,
-        "temperature": get_temperature(),
-        "ram_used": format_memory(memory.used),
-        "ram_percent": format_percent(memory.percent),
-        "raw_ram_percent": memory.percent,
-        "printers": printers_data
-    }
+    Au-delà de SSE_MAX_SUBSCRIBERS clients, répond 503 : le client se replie
+    sur l'interrogation de /stats.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
     
-    return jsonify(data)
+    subscriber = broadcaster.subscribe(SSE_MAX_SUBSCRIBERS)
+    if subscriber is None:
+        return jsonify({"error": "Trop de clients du flux, utiliser /stats"}), 503, {"Retry-After": "30"}
+    initial = build_stats_payload(sampler.snapshot())
+    
+    def generate():
+        try:
+            yield f"retry: 3000\ndata: {json.dumps(initial)}\n\n"
+            while True:
+                changes = broadcaster.wait(subscriber, SSE_KEEPALIVE_INTERVAL)
+                if changes is None:
+                    # Commentaire SSE pour maintenir la connexion ouverte
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"data: {json.dumps(changes)}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+    
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route("/api/history")
+def get_history():
+    """
+    API pour récupérer l'historique d'une métrique.
+    
+    Paramètres: metric (cpu, ram, temperature ou printers), range (ex: 15m, 1h, 7d)
+    et points (nombre maximal de points, 120 par défaut).
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    metric = request.args.get("metric", "cpu")
+    range_seconds = parse_range(request.args.get("range", "1h"))
+    points = request.args.get("points", "120")
+    if range_seconds is None or range_seconds <= 0 or not points.isdigit():
+        return jsonify({"error": "Paramètres invalides"}), 400
+    
+    if metric == "printers":
+        return jsonify({"metric": metric, "range": range_seconds, "events": history.printer_events(range_seconds)})
+    if metric not in METRICS:
+        return jsonify({"error": f"Métrique inconnue : {metric}"}), 400
+    
+    # Chaque point : [horodatage, min, moyenne, max]
+    series = history.query(metric, range_seconds, min(int(points), 1000))
+    return jsonify({"metric": metric, "range": range_seconds, "series": series})
+
+@app.route("/api/spooler/status")
+def spooler_status():
+    """API pour consulter l'état du spouleur de billets (profondeur de file, compteurs)."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    status = spooler.status()
+    status["enabled"] = SPOOLER_ENABLED
+    status["printer"] = get_spooler_printer()
+    return jsonify(status)
+
+@app.route("/api/jobs")
+def list_jobs():
+    """
+    API pour lister les tâches d'impression.
+    
+    Paramètres : "printer" (une imprimante), "which" (active, completed ou all).
+    La réponse contient aussi les statistiques par imprimante.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    which = request.args.get("which", "all")
+    if which not in ("active", "completed", "all"):
+        return jsonify({"success": False, "message": "Paramètre which invalide"}), 400
+    
+    job_tracker.start()
+    return jsonify({
+        "jobs": job_tracker.jobs(request.args.get("printer"), which),
+        "stats": job_tracker.stats(),
+        "window": JOB_STATS_WINDOW
+    })
+
+@app.route("/api/jobs/<int:job_id>")
+def get_job(job_id):
+    """API pour suivre une tâche d'impression (ex: après un test d'impression)."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    job_tracker.start()
+    job = job_tracker.job(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Tâche inconnue"}), 404
+    return jsonify(job)
+
+@app.route("/api/pools")
+def pools_status():
+    """API pour consulter les groupes d'imprimantes (membres, état, longueur de file)."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        return jsonify(printer_pool.status())
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route("/api/usb/status")
+def usb_status():
+    """API pour consulter les imprimantes USB branchées et leurs files CUPS."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    if not HOTPLUG_ENABLED:
+        return jsonify({"enabled": False})
+    status = hotplug.status()
+    status["enabled"] = True
+    return jsonify(status)
+
+@app.route("/api/raster_cache/status")
+def raster_cache_status():
+    """API pour consulter le cache raster (succès, échecs, temps CPU économisé)."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    status = raster_cache.stats()
+    status["enabled"] = RASTER_CACHE_ENABLED
+    return jsonify(status)
+
+@app.route("/api/journal/status")
+def journal_status():
+    """API pour consulter le journal des tickets (tickets en cours, écritures, bilan de la reprise)."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    if not JOURNAL_ENABLED:
+        return jsonify({"enabled": False, "available": False})
+    status = print_journal.status()
+    status["enabled"] = True
+    return jsonify(status)
+
+@app.route("/api/journal/<key>")
+def get_journal_entry(key):
+    """API pour suivre un ticket par sa clé d'idempotence."""
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    entry = print_journal.get(key) if JOURNAL_ENABLED else None
+    if entry is None:
+        return jsonify({"success": False, "message": "Ticket inconnu"}), 404
+    return jsonify(entry)
+
+@app.route("/metrics")
+def metrics():
+    """
+    Métriques au format texte de Prometheus (latence des routes, commandes
+    externes, appels CUPS, erreurs).
+
+    Accessible avec une session, ou avec l'en-tête "Authorization: Bearer <METRICS_TOKEN>".
+    """
+    token = request.headers.get("Authorization", "")
+    if not check_auth() and not (METRICS_TOKEN and token == f"Bearer {METRICS_TOKEN}"):
+        return Response("Unauthorized\n", status=401, mimetype="text/plain")
+    return Response(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.route("/debug/profile")
+def debug_profile():
+    """
+    Profile tous les threads pendant une fenêtre de temps.
+
+    Paramètres : "seconds" (défaut 10) et "interval" (défaut 0.005).
+    La réponse contient les piles repliées (flamegraph.pl, speedscope).
+    """
+    if not PROFILER_ENABLED:
+        return jsonify({"success": False, "message": "Profileur désactivé (PROFILER_ENABLED=0)"}), 404
+    if not check_auth() or not is_admin():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    try:
+        seconds = min(float(request.args.get("seconds", "10")), PROFILER_MAX_SECONDS)
+        interval = max(float(request.args.get("interval", "0.005")), 0.001)
+    except ValueError:
+        return jsonify({"success": False, "message": "Paramètres invalides"}), 400
+    
+    profile = profiler.profile(seconds, interval)
+    if profile is None:
+        return jsonify({"success": False, "message": "Un profilage est déjà en cours"}), 409
+    return Response(profile, mimetype="text/plain")
+
+@app.route("/api/tasks/<task_id>")
+def get_task(task_id):
+    """
+    API pour suivre une tâche de maintenance.
+    
+    Paramètre "since" : rang de la première ligne de journal voulue (valeur
+    "next" de la réponse précédente), pour ne recevoir que les nouvelles lignes.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    task = task_runner.get(task_id)
+    if task is None:
+        return jsonify({"success": False, "message": "Tâche inconnue"}), 404
+    return jsonify(task.to_dict(since=request.args.get("since", 0, type=int)))
 
 @app.route("/api/wifi_networks")
 def get_wifi_networks():
@@ -416,7 +1718,8 @@ def get_wifi_networks():
     if not check_auth():
         return jsonify({"error": "Unauthorized"}), 401
     
-    networks = get_available_wifi_networks()
+    # ?refresh=1 : attendre un nouveau scan (partagé avec les autres requêtes en cours)
+    networks = get_available_wifi_networks(force=request.args.get("refresh") == "1")
     return jsonify({
         "networks": networks,
         "current_status": get_wifi_status()
@@ -429,10 +1732,7 @@ def delete_printer(printer_name):
         return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        subprocess.run(
-            ["sudo", "/opt/TBERRYPRINT/fonctions.sh", "printer_remove", printer_name],
-            check=True
-        )
+        run_privileged("printer_remove", printer_name, check=True)
         return jsonify({"success": True, "message": "Imprimante supprimée avec succès"})
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
@@ -444,15 +1744,178 @@ def test_print(printer_name):
         return jsonify({"error": "Unauthorized"}), 401
     
     try:
-        subprocess.run([
-            "sudo",
-            "/opt/TBERRYPRINT/fonctions.sh",
-            "impression_test",
-            "/opt/TBERRYPRINT/FlaskInstallation/testImpressionInterface.pdf", 
-            printer_name
-        ], check=True)
-        return jsonify({"success": True, "message": "Test d'impression lancé avec succès"})
+        job_id = submit_print_job(
+            printer_name, "Test d'impression", [("Test d'impression", TEST_PRINT_FILE)], DEFAULT_PRINT_OPTIONS
+        )
+        return jsonify({"success": True, "message": "Test d'impression lancé avec succès", "job_id": job_id})
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route("/api/print", methods=["POST"])
+def api_print():
+    """
+    API pour soumettre un document directement à CUPS.
+    
+    Le document est envoyé dans le corps de la requête (ou dans le champ
+    "file" d'un formulaire multipart) et transmis à CUPS bloc par bloc,
+    avec les options d'impression des tickets. Le paramètre "printer"
+    désigne une imprimante ou un groupe d'imprimantes.
+    
+    Les documents jusqu'à PRINT_BUFFER_MAX_KB sont gardés en mémoire pour le
+    journal des tickets et le cache raster (s'ils sont activés) ; un client
+    peut fournir l'en-tête Idempotency-Key pour renvoyer sa requête sans
+    risque de double impression.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    printer_name = request.args.get("printer")
+    if not printer_name:
+        return jsonify({"success": False, "message": "Imprimante requise"}), 400
+    
+    # Corps brut (transmis sans fichier temporaire) ou fichier de formulaire
+    upload = request.files.get("file") if request.mimetype == "multipart/form-data" else None
+    if upload is not None:
+        stream, mimetype, title = upload.stream, upload.mimetype, upload.filename
+    else:
+        stream, mimetype, title = request.stream, request.mimetype, None
+    title = request.args.get("title") or title or "TBerryPrint"
+    document_format = mimetype if mimetype in PRINT_DOCUMENT_FORMATS else FORMAT_AUTO
+    
+    options = dict(DEFAULT_PRINT_OPTIONS)
+    copies = request.args.get("copies", "")
+    if copies.isdigit() and int(copies) > 1:
+        options["copies"] = copies
+    
+    try:
+        key = get_idempotency_key()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    try:
+        # Les petits documents sont journalisés et passent par le cache raster ;
+        # les gros, ou tous sans journal ni cache, sont transmis au fil de l'eau
+        buffered = (
+            (JOURNAL_ENABLED or RASTER_CACHE_ENABLED)
+            and request.content_length
+            and request.content_length <= PRINT_BUFFER_MAX_KB * 1024
+        )
+        if buffered:
+            result = print_documents(printer_name, title, [(title, stream.read())], options, document_format, key)
+        else:
+            printer_name = printer_pool.resolve(printer_name)
+            job_id = cups_client.submit_stream(printer_name, title, stream, options, document_format)
+            result = {"job_id": job_id, "printer": printer_name, "key": None}
+        return jsonify({"success": True, "message": "Document envoyé à l'imprimante", **result})
+    except DuplicateTicket as e:
+        return duplicate_ticket_response(e.entry)
+    except NoPrinterAvailable as e:
+        return jsonify({"success": False, "message": str(e)}), 503
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route("/api/print/ticket", methods=["POST"])
+def api_print_ticket():
+    """
+    API pour imprimer un ticket structuré.
+    
+    Le ticket (JSON, voir star_line.py) est traduit directement en commandes
+    Star Line Mode et envoyé à CUPS comme tâche brute : aucune rastérisation
+    n'est nécessaire. Le paramètre "printer" désigne une imprimante ou un
+    groupe d'imprimantes.
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    printer_name = request.args.get("printer")
+    if not printer_name:
+        return jsonify({"success": False, "message": "Imprimante requise"}), 400
+    
+    ticket = request.get_json(silent=True)
+    try:
+        data = ticket_renderer.render(ticket)
+    except TicketError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    title = request.args.get("title") or "Ticket TBerryPrint"
+    try:
+        key = get_idempotency_key()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    try:
+        result = print_documents(printer_name, title, [(title, data)], {}, FORMAT_RAW, key)
+        return jsonify({
+            "success": True,
+            "message": "Ticket envoyé à l'imprimante",
+            **result,
+            "bytes": len(data)
+        })
+    except DuplicateTicket as e:
+        return duplicate_ticket_response(e.entry)
+    except NoPrinterAvailable as e:
+        return jsonify({"success": False, "message": str(e)}), 503
+    except Exception as e:
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@app.route("/api/print/batch", methods=["POST"])
+def api_print_batch():
+    """
+    API pour imprimer un lot de tickets structurés dans une seule tâche CUPS.
+    
+    Le lot est envoyé en JSON ({"cut": "partial", "tickets": [...]} ou une
+    liste de tickets), ou en multipart (un ticket JSON, ou une liste, par
+    fichier, dans l'ordre des fichiers). L'imprimante n'est initialisée
+    qu'une fois ; chaque ticket garde sa coupe ("cut" : none, partial, full),
+    celle du lot par défaut. Les tickets invalides sont ignorés et signalés
+    dans "results".
+    """
+    if not check_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+    
+    printer_name = request.args.get("printer")
+    if not printer_name:
+        return jsonify({"success": False, "message": "Imprimante requise"}), 400
+    
+    if request.mimetype == "multipart/form-data":
+        tickets = []
+        try:
+            for _, upload in request.files.items(multi=True):
+                content = json.loads(upload.read())
+                tickets.extend(content if isinstance(content, list) else [content])
+        except ValueError as e:
+            return jsonify({"success": False, "message": f"Fichier JSON invalide : {e}"}), 400
+        batch = {"cut": request.form.get("cut", request.args.get("cut", "partial")), "tickets": tickets}
+    else:
+        batch = request.get_json(silent=True)
+    try:
+        tickets, cut = parse_batch(batch, BATCH_MAX_TICKETS)
+        key = get_idempotency_key()
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    title = request.args.get("title") or f"Tickets TBerryPrint ({len(tickets)})"
+    data = json.dumps({"cut": cut, "tickets": tickets}, separators=(",", ":")).encode()
+    results: List[Dict[str, Any]] = []
+    try:
+        result = print_documents(printer_name, title, [("tickets", data)], {}, TICKET_BATCH_FORMAT, key, results)
+        printed = sum(1 for ticket in results if ticket["success"])
+        return jsonify({
+            "success": True,
+            "message": f"{printed} ticket(s) sur {len(tickets)} envoyés à l'imprimante",
+            **result,
+            "printed": printed,
+            "failed": len(tickets) - printed,
+            "results": results
+        })
+    except DuplicateTicket as e:
+        return duplicate_ticket_response(e.entry)
+    except TicketError as e:
+        return jsonify({"success": False, "message": str(e), "results": results}), 400
+    except NoPrinterAvailable as e:
+        return jsonify({"success": False, "message": str(e)}), 503
     except Exception as e:
+        # Envoi interrompu : la tâche est annulée, aucun ticket du lot n'est imprimé
         return jsonify({"success": False, "message": str(e)}), 500
 
 @app.route("/setup_wifi", methods=["POST"])
@@ -469,41 +1932,12 @@ def setup_wifi():
     
     try:
         # Vérifier si le fichier de configuration existe déjà
-        connection_file = f"/etc/NetworkManager/system-connections/{ssid}.nmconnection"
+        connection_file = os.path.join(NM_CONNECTIONS_DIR, f"{ssid}.nmconnection")
         if os.path.isfile(connection_file):
             return redirect(url_for('wifi_setup'))
 
-        # Exécuter le script et capturer le code de retour
-        result = subprocess.run(
-            ["sudo", "/opt/TBERRYPRINT/fonctions.sh", "wifi_connect", ssid, password], 
-            capture_output=True,
-            text=True,
-            check=False
-        )
-        
-        if result.returncode == 0:
-            subprocess.run(
-                ["sudo", "/opt/TBERRYPRINT/fonctions.sh", "TBerryPrint_restart"], 
-                capture_output=True,
-                text=True,
-                check=False
-            )
-
-            return jsonify({
-                "success": True, 
-                "message": "Connexion Wi-Fi configurée avec succès",
-                "requires_reboot": True
-            })
-        elif result.returncode == 1:
-            return jsonify({
-                "success": False, 
-                "message": "Échec de connexion: le mot de passe semble incorrect"
-            }), 400
-        else:
-            return jsonify({
-                "success": False, 
-                "message": f"Erreur lors de la configuration Wi-Fi: {result.stderr}"
-            }), 500
+        # Connexion en arrière-plan : le résultat est suivi via /api/tasks/<id>
+        return start_task("wifi", wifi_connect_task, "wifi_connect", ssid, password)
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
@@ -520,65 +1954,36 @@ def setup_wifi_connected():
     
     try:
         # Vérifier si le fichier de configuration existe déjà
-        connection_file = f"/etc/NetworkManager/system-connections/{ssid}.nmconnection"
+        connection_file = os.path.join(NM_CONNECTIONS_DIR, f"{ssid}.nmconnection")
         if os.path.isfile(connection_file):
             return redirect(url_for('wifi_setup'))
         
-        # Exécuter le script et capturer le code de retour
-        result = subprocess.run(
-            ["sudo", "/opt/TBERRYPRINT/fonctions.sh", "wifi_up", ssid], 
-            capture_output=True,
-            text=True,
-            check=False  # Ne pas lever d'exception en cas d'échec
-        )
-        
-        # Vérifier le code de retour
-        if result.returncode == 0:
-            # Connexion réussie
-
-            # Redéarrage du service d'impression après le changement de connexion
-            subprocess.run(
-                ["sudo", "/opt/TBERRYPRINT/fonctions.sh", "TBerryPrint_restart"], 
-                capture_output=True,
-                text=True,
-                check=False  # Ne pas lever d'exception en cas d'échec
-            )
-
-            return jsonify({
-                "success": True, 
-                "message": "Connexion Wi-Fi configurée avec succès",
-                "requires_reboot": True
-            })
-        elif result.returncode == 1:
-            # Erreur d'authentification (mot de passe incorrect)
-            return jsonify({
-                "success": False, 
-                "message": "Échec de connexion: le mot de passe semble incorrect"
-            }), 400
-        else:
-            # Autre erreur
-            return jsonify({
-                "success": False, 
-                "message": f"Erreur lors de la configuration Wi-Fi: {result.stderr}"
-            }), 500
+        # Connexion en arrière-plan : le résultat est suivi via /api/tasks/<id>
+        return start_task("wifi", wifi_connect_task, "wifi_up", ssid)
     except Exception as e:
         return jsonify({"success": False, "message": str(e)}), 500
 
 @app.route("/reboot", methods=["POST"])
 def reboot():
-    """Route pour redémarrer le Raspberry Pi."""
+    """Route pour redémarrer le Raspberry Pi (refusé pendant une mise à jour)."""
     if check_auth():
-        # Utiliser check=False pour éviter l'erreur si le redémarrage est réussi
-        subprocess.run(["sudo", "/opt/TBERRYPRINT/fonctions.sh", "reboot_system"], check=False)
+        response = start_task("reboot", reboot_task, group="system")
+        if wants_json():
+            return response
     return redirect(url_for("dashboard"))
 
 @app.route("/update", methods=["POST"])
 def update():
-    """Route pour mettre à jour le système."""
+    """
+    Route pour mettre à jour le système.
+    
+    La mise à jour tourne en arrière-plan ; un appel fetch reçoit l'identifiant
+    de la tâche pour suivre sa progression via /api/tasks/<id>.
+    """
     if check_auth():
-        subprocess.run(["sudo", "/opt/TBERRYPRINT/fonctions.sh", "apt_update"], capture_output=True, text=True)
-        subprocess.run(["sudo", "/opt/TBERRYPRINT/fonctions.sh", "apt_upgrade"], capture_output=True, text=True)
-        subprocess.run(["sudo", "/opt/TBERRYPRINT/fonctions.sh", "reboot_system"], check=False)
+        response = start_task("update", update_system_task, group="system")
+        if wants_json():
+            return response
     return redirect(url_for("dashboard"))
 
 @app.route("/change_hostname", methods=["POST"])
@@ -589,12 +1994,32 @@ def change_hostname():
             return redirect(url_for("dashboard"))
         new_hostname = request.form.get("hostname")
         if new_hostname and new_hostname.isalnum():
-            subprocess.run(["sudo", "/opt/TBERRYPRINT/fonctions.sh", "set_hostname", new_hostname], capture_output=True, text=True)
-            subprocess.run(["sudo", "/opt/TBERRYPRINT/fonctions.sh", "reboot_system"], check=False)
+            start_task("hostname", change_hostname_task, new_hostname, group="system")
     return redirect(url_for("dashboard"))
 
 
 # ===== POINT D'ENTRÉE DE L'APPLICATION =====
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    if DEBUG:
+        # Avec le rechargeur de Werkzeug, seul le processus enfant démarre les services
+        if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            start_background_services()
+            on_server_listening()
+        app.run(host=SERVER_HOST, port=SERVER_PORT, debug=True, threaded=True)
+    else:
+        # Socket ouverte par systemd (InterfaceFlask.socket) : les connexions arrivées
+        # pendant le démarrage attendent dans sa file au lieu d'être refusées
+        listen_socket = systemd_listen_socket()
+        if listen_socket is not None and listen_socket.getsockname()[:2] != (SERVER_HOST, SERVER_PORT):
+            bound_host, bound_port = listen_socket.getsockname()[:2]
+            report_error(
+                "server",
+                f"La socket de systemd écoute sur {bound_host}:{bound_port} et non sur SERVER_HOST:SERVER_PORT "
+                f"({SERVER_HOST}:{SERVER_PORT}) : relancer install-InterfaceFlask.sh après avoir modifié .env"
+            )
+        start_background_services()
+        serve(
+            app, SERVER_HOST, SERVER_PORT, SERVER_THREADS, SERVER_KEEPALIVE_TIMEOUT,
+            listen_socket=listen_socket, on_ready=on_server_listening
+        )
\ No newline at end of file
@@ -0,0 +1,427 @@
+"""
+TBerryPrint - Connexion CUPS persistante et cache d'état des imprimantes
+
+Ce module maintient:
+- Une connexion CUPS unique, partagée et rétablie automatiquement en cas d'échec
+- Un cache en mémoire des imprimantes (device-uri, état, message d'état)
+- Un abonnement aux événements CUPS (ippget) qui garde le cache à jour sans
+  réénumérer toutes les imprimantes à chaque requête
+- La soumission directe de documents à CUPS, sans passer par lp
+"""
+
+import contextlib
+import os
+import threading
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+
+from instrumentation import CUPS_CALL_DURATION, CUPS_CALL_ERRORS, report_error
+from serving import lazy_import
+
+# pycups (et libcups) n'est chargé qu'au premier appel à cupsd, après l'ouverture du port
+cups = lazy_import("cups")
+
+# Événements CUPS suivis par l'abonnement
+SUBSCRIBED_EVENTS = [
+    "printer-state-changed",
+    "printer-added",
+    "printer-deleted",
+    "printer-modified",
+    "job-state-changed"
+]
+
+# Attributs conservés pour chaque imprimante
+PRINTER_ATTRIBUTES = ["device-uri", "printer-state", "printer-state-message", "printer-state-reasons"]
+
+# Code IPP renvoyé quand l'abonnement n'existe plus (ex: redémarrage de cupsd)
+IPP_NOT_FOUND = 0x0406
+
+# Statut HTTP attendu pendant l'envoi d'un document
+HTTP_CONTINUE = 100
+
+# Format laissant cupsd détecter le type du document
+FORMAT_AUTO = "application/octet-stream"
+
+# Format transmis sans aucun filtre (données déjà au langage de l'imprimante)
+FORMAT_RAW = "application/vnd.cups-raw"
+
+# Taille des blocs envoyés à CUPS lors de la soumission d'un document
+PRINT_CHUNK_SIZE = 64 * 1024
+
+
+@contextlib.contextmanager
+def _timed(method: str) -> Iterator[None]:
+    """Chronomètre un appel à cupsd et compte ses échecs."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        CUPS_CALL_ERRORS.inc(method=method)
+        raise
+    finally:
+        CUPS_CALL_DURATION.observe(time.perf_counter() - start, method=method)
+
+
+class CupsClient:
+    """
+    Connexion CUPS longue durée avec cache d'état des imprimantes.
+
+    Les appels CUPS passent tous par call(), qui sérialise l'accès à la connexion
+    (pycups n'est pas thread-safe) et la recrée si cupsd a redémarré. Un thread
+    lit les notifications de l'abonnement et met à jour le cache au fil de l'eau.
+    """
+
+    def __init__(self, poll_interval: float = 0.5, lease_duration: int = 3600) -> None:
+        self.poll_interval = poll_interval
+        self.lease_duration = lease_duration
+        self._connection: Optional[cups.Connection] = None
+        self._connection_lock = threading.Lock()
+        self._print_connection: Optional[cups.Connection] = None
+        self._print_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._printers: Dict[str, Dict[str, Any]] = {}
+        self._ppds: Dict[str, Optional[bytes]] = {}
+        self._listeners: List[Callable[[str, Optional[str]], None]] = []
+        self._job_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._subscription_id: Optional[int] = None
+        self._sequence = 0
+        self._renew_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    # ----- Connexion -----
+
+    def call(self, method: str, *args: Any, **kwargs: Any) -> Any:
+        """
+        Exécute une méthode de cups.Connection sur la connexion partagée.
+
+        La connexion est recréée une fois si l'appel échoue pour une raison
+        de transport ; les erreurs IPP (réponse de cupsd) sont propagées telles quelles.
+
+        Args:
+            method: Nom de la méthode pycups (ex: "getPrinters")
+
+        Returns:
+            Any: Résultat de la méthode pycups
+        """
+        with _timed(method), self._connection_lock:
+            for attempt in range(2):
+                if self._connection is None:
+                    self._connection = cups.Connection()
+                try:
+                    return getattr(self._connection, method)(*args, **kwargs)
+                except cups.IPPError:
+                    raise
+                except (RuntimeError, cups.HTTPError):
+                    self._connection = None
+                    if attempt == 1:
+                        raise
+
+    # ----- Soumission de documents -----
+
+    def print_file(self, printer: str, filename: str, title: str, options: Dict[str, str]) -> int:
+        """
+        Imprime un fichier local via la connexion partagée.
+
+        Args:
+            printer: Nom de la file CUPS
+            filename: Chemin du fichier à imprimer
+            title: Titre de la tâche
+            options: Options CUPS (ex: {"media": "Custom.80x120mm"})
+
+        Returns:
+            int: Identifiant de la tâche CUPS
+        """
+        return self.call("printFile", printer, filename, title, options)
+
+    def submit_stream(
+        self,
+        printer: str,
+        title: str,
+        stream: BinaryIO,
+        options: Dict[str, str],
+        document_format: str = FORMAT_AUTO
+    ) -> int:
+        """
+        Soumet un document à CUPS en le lisant bloc par bloc, sans fichier temporaire.
+
+        Les soumissions utilisent une connexion dédiée : un client lent
+        n'immobilise pas la connexion partagée du cache.
+
+        Args:
+            printer: Nom de la file CUPS
+            title: Titre de la tâche
+            stream: Flux binaire du document (ex: corps de la requête HTTP)
+            options: Options CUPS
+            document_format: Type MIME du document
+
+        Returns:
+            int: Identifiant de la tâche CUPS
+        """
+        return self.submit_documents(printer, title, [(title, stream)], options, document_format)
+
+    def submit_documents(
+        self,
+        printer: str,
+        title: str,
+        documents: List[Tuple[str, BinaryIO]],
+        options: Dict[str, str],
+        document_format: str = FORMAT_AUTO
+    ) -> int:
+        """
+        Soumet plusieurs documents dans une seule tâche CUPS.
+
+        Args:
+            printer: Nom de la file CUPS
+            title: Titre de la tâche
+            documents: Liste de tuples (nom_document, flux_binaire)
+            options: Options CUPS
+            document_format: Type MIME des documents
+
+        Returns:
+            int: Identifiant de la tâche CUPS
+        """
+        with _timed("submitDocuments"), self._print_lock:
+            if self._print_connection is None:
+                self._print_connection = cups.Connection()
+            connection = self._print_connection
+            try:
+                job_id = connection.createJob(printer, title, options)
+            except (RuntimeError, cups.HTTPError):
+                # Connexion perdue (ex: redémarrage de cupsd) : une seule nouvelle tentative
+                self._print_connection = connection = cups.Connection()
+                job_id = connection.createJob(printer, title, options)
+
+            try:
+                for index, (name, stream) in enumerate(documents):
+                    last_document = 1 if index == len(documents) - 1 else 0
+                    status = connection.startDocument(printer, job_id, name, document_format, last_document)
+                    if status != HTTP_CONTINUE:
+                        raise RuntimeError(f"Envoi du document refusé par CUPS (HTTP {status})")
+                    while True:
+                        chunk = stream.read(PRINT_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        status = connection.writeRequestData(chunk, len(chunk))
+                        if status != HTTP_CONTINUE:
+                            raise RuntimeError(f"Envoi du document interrompu par CUPS (HTTP {status})")
+                    connection.finishDocument(printer)
+            except Exception:
+                self._print_connection = None
+                try:
+                    self.call("cancelJob", job_id)
+                except Exception:
+                    pass
+                raise
+            return job_id
+
+    # ----- Cache des imprimantes -----
+
+    def start(self) -> None:
+        """Charge l'état initial des imprimantes et démarre le suivi des événements."""
+        with self._cache_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._watch, name="cups-events", daemon=True)
+        try:
+            self._refresh_all()
+        except Exception as e:
+            report_error("cups", f"Erreur CUPS : {e}")
+        self._thread.start()
+
+    def add_listener(self, callback: Callable[[str, Optional[str]], None]) -> None:
+        """
+        Enregistre une fonction appelée à chaque changement du cache.
+
+        Args:
+            callback: Fonction recevant (événement, nom_imprimante)
+        """
+        self._listeners.append(callback)
+
+    def add_job_listener(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        """
+        Enregistre une fonction appelée à chaque notification de tâche (job-state-changed).
+
+        Args:
+            callback: Fonction recevant la notification CUPS complète
+        """
+        self._job_listeners.append(callback)
+
+    def printers(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Renvoie une copie de l'état connu de toutes les imprimantes.
+
+        Returns:
+            Dict: Attributs des imprimantes indexés par nom
+        """
+        self.start()
+        with self._cache_lock:
+            return {name: dict(attributes) for name, attributes in self._printers.items()}
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Renvoie l'état de la connexion à cupsd, sans requête ni démarrage du suivi (pour /healthz).
+
+        Returns:
+            Dict: started (suivi démarré), connected (abonnement aux événements actif),
+            printers (nombre de files connues)
+        """
+        with self._cache_lock:
+            return {
+                "started": self._thread is not None,
+                "connected": self._subscription_id is not None,
+                "printers": len(self._printers)
+            }
+
+    def usb_printers(self) -> List[Tuple[str, int]]:
+        """
+        Renvoie les imprimantes USB connues, sans requête vers cupsd.
+
+        Returns:
+            List[Tuple[str, int]]: Liste de tuples (nom_imprimante, statut)
+        """
+        return [
+            (name, attributes.get("printer-state", 0))
+            for name, attributes in self.printers().items()
+            if attributes.get("device-uri", "").lower().startswith("usb:")
+        ]
+
+    def ppd(self, printer: str) -> Optional[bytes]:
+        """
+        Renvoie le contenu du PPD d'une imprimante (mis en cache jusqu'à sa modification).
+
+        Args:
+            printer: Nom de la file CUPS
+
+        Returns:
+            Optional[bytes]: Contenu du PPD, ou None pour une file sans PPD (file brute)
+        """
+        with self._cache_lock:
+            if printer in self._ppds:
+                return self._ppds[printer]
+        try:
+            filename = self.call("getPPD", printer)
+        except cups.IPPError:
+            content = None
+        else:
+            try:
+                with open(filename, "rb") as f:
+                    content = f.read()
+            finally:
+                os.unlink(filename)
+        with self._cache_lock:
+            self._ppds[printer] = content
+        return content
+
+    def _refresh_all(self) -> None:
+        """Réénumère toutes les imprimantes (démarrage ou perte d'événements)."""
+        printers_list = self.call("getPrinters")
+        with self._cache_lock:
+            self._printers = {
+                name: {key: attributes.get(key) for key in PRINTER_ATTRIBUTES if key in attributes}
+                for name, attributes in printers_list.items()
+            }
+            self._ppds = {}
+        self._notify("refresh", None)
+
+    def _refresh_printer(self, name: str) -> None:
+        """Recharge les attributs d'une seule imprimante."""
+        attributes = self.call("getPrinterAttributes", name, requested_attributes=PRINTER_ATTRIBUTES)
+        with self._cache_lock:
+            self._printers[name] = {key: attributes.get(key) for key in PRINTER_ATTRIBUTES if key in attributes}
+
+    def _notify(self, event: str, printer_name: Optional[str]) -> None:
+        """Prévient les fonctions enregistrées d'un changement du cache."""
+        for callback in list(self._listeners):
+            try:
+                callback(event, printer_name)
+            except Exception as e:
+                report_error("cups", f"Erreur dans un écouteur CUPS : {e}")
+
+    # ----- Abonnement aux événements -----
+
+    def _subscribe(self) -> None:
+        """Crée l'abonnement ippget aux événements des imprimantes et des tâches."""
+        self._subscription_id = self.call(
+            "createSubscription", "/",
+            events=SUBSCRIBED_EVENTS,
+            lease_duration=self.lease_duration
+        )
+        self._sequence = 0
+        self._renew_at = time.monotonic() + self.lease_duration / 2
+
+    def _apply_event(self, event: Dict[str, Any]) -> None:
+        """Répercute une notification CUPS dans le cache."""
+        kind = event.get("notify-subscribed-event", "")
+        name = event.get("printer-name")
+        if kind.startswith("job-"):
+            for callback in list(self._job_listeners):
+                try:
+                    callback(event)
+                except Exception as e:
+                    report_error("cups", f"Erreur dans un écouteur de tâches CUPS : {e}")
+        if not name:
+            return
+
+        if kind in ("printer-added", "printer-modified", "printer-deleted"):
+            # Le PPD a pu changer (lpadmin) : il sera relu à la prochaine demande
+            with self._cache_lock:
+                self._ppds.pop(name, None)
+
+        if kind == "printer-deleted":
+            with self._cache_lock:
+                self._printers.pop(name, None)
+        elif kind in ("printer-added", "printer-modified") or name not in self._printers:
+            self._refresh_printer(name)
+        else:
+            # Les notifications d'imprimante et de tâche portent l'état courant de l'imprimante
+            with self._cache_lock:
+                attributes = self._printers[name]
+                for key in ("printer-state", "printer-state-message", "printer-state-reasons"):
+                    if key in event:
+                        attributes[key] = event[key]
+        self._notify(kind, name)
+
+    def _poll_events(self) -> None:
+        """Lit les nouvelles notifications et renouvelle l'abonnement si nécessaire."""
+        if self._subscription_id is None:
+            self._refresh_all()
+            self._subscribe()
+
+        notifications = self.call("getNotifications", [self._subscription_id], [self._sequence + 1])
+        for event in notifications.get("events", []):
+            sequence = event.get("notify-sequence-number", self._sequence + 1)
+            if sequence > self._sequence + 1 and self._sequence > 0:
+                # Des événements ont été perdus : on repart d'un état complet
+                self._refresh_all()
+            self._sequence = max(self._sequence, sequence)
+            self._apply_event(event)
+
+        if time.monotonic() >= self._renew_at:
+            self.call("renewSubscription", self._subscription_id, lease_duration=self.lease_duration)
+            self._renew_at = time.monotonic() + self.lease_duration / 2
+
+    def _watch(self) -> None:
+        """Boucle de suivi des événements CUPS, avec reprise après erreur."""
+        backoff = self.poll_interval
+        while True:
+            try:
+                self._poll_events()
+                backoff = self.poll_interval
+            except cups.IPPError as e:
+                if e.args and e.args[0] == IPP_NOT_FOUND:
+                    # Abonnement expiré ou cupsd redémarré : on se réabonne
+                    self._subscription_id = None
+                    continue
+                report_error("cups", f"Erreur CUPS : {e}")
+                self._subscription_id = None
+                backoff = min(backoff * 2, 30.0)
+            except Exception as e:
+                report_error("cups", f"Erreur CUPS : {e}")
+                self._subscription_id = None
+                with self._cache_lock:
+                    had_printers = bool(self._printers)
+                    self._printers = {}
+                if had_printers:
+                    self._notify("refresh", None)
+                backoff = min(backoff * 2, 30.0)
+            time.sleep(backoff)
@@ -0,0 +1,314 @@
+"""
+TBerryPrint - Détection du branchement des imprimantes USB
+
+Une imprimante branchée ou débranchée n'apparaissait qu'au prochain
+échantillon, et un câble défectueux ne se voyait que par l'état générique
+"arrêtée" (5) de CUPS, après l'échec d'une tâche. Ce module écoute les
+événements du noyau (uevents, socket netlink) et suit les interfaces USB
+de classe imprimante (7):
+- Les branchements et débranchements sont connus en quelques millisecondes,
+  sans énumération périodique (une seule lecture de sysfs au démarrage)
+- Chaque périphérique est associé aux files CUPS par leur device-uri
+  (numéro de série, sinon fabricant et modèle) ; une file n'est déclarée
+  débranchée qu'après le retrait du périphérique qui lui a été associé
+- Les fonctions enregistrées sont prévenues à chaque événement (mise à jour
+  du flux de statistiques, reprise des files)
+"""
+
+import errno
+import os
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from instrumentation import REGISTRY, report_error
+
+# Famille netlink des événements du noyau et groupe des événements bruts
+NETLINK_KOBJECT_UEVENT = 15
+UEVENT_KERNEL_GROUP = 1
+
+# Taille du tampon de réception (rafales d'événements au branchement d'un concentrateur)
+UEVENT_BUFFER_SIZE = 256 * 1024
+
+# Classe USB des imprimantes
+USB_CLASS_PRINTER = 7
+
+# Attributs sysfs lus sur le périphérique parent de l'interface
+DEVICE_ATTRIBUTES = ("idVendor", "idProduct", "manufacturer", "product", "serial")
+
+HOTPLUG_EVENTS = REGISTRY.counter(
+    "tberryprint_usb_hotplug_events_total",
+    "Branchements et débranchements d'imprimantes USB",
+    ("action",)
+)
+HOTPLUG_DISPATCH_DURATION = REGISTRY.histogram(
+    "tberryprint_usb_hotplug_dispatch_seconds",
+    "Durée entre la réception d'un événement USB et la fin de sa diffusion"
+)
+
+
+def parse_uevent(message: bytes) -> Optional[Dict[str, str]]:
+    """
+    Lit un événement du noyau ("action@devpath", puis des lignes CLÉ=VALEUR séparées par des octets nuls).
+
+    Args:
+        message: Datagramme netlink
+
+    Returns:
+        Optional[Dict[str, str]]: Variables de l'événement, None si le format est inconnu
+    """
+    fields = message.split(b"\0")
+    if b"@" not in fields[0]:
+        # Messages de udev (en-tête "libudev") : non utilisés
+        return None
+    event = {}
+    for field in fields[1:]:
+        key, separator, value = field.partition(b"=")
+        if separator:
+            event[key.decode("ascii", "replace")] = value.decode("utf-8", "replace")
+    return event
+
+def is_printer_interface(event: Dict[str, str]) -> bool:
+    """Vrai pour une interface USB de classe imprimante (INTERFACE=7/sous-classe/protocole)."""
+    if event.get("SUBSYSTEM") != "usb" or event.get("DEVTYPE") != "usb_interface":
+        return False
+    try:
+        return int(event.get("INTERFACE", "").split("/")[0]) == USB_CLASS_PRINTER
+    except ValueError:
+        return False
+
+def parse_device_uri(uri: str) -> Optional[Dict[str, str]]:
+    """
+    Décompose un device-uri USB de CUPS (ex: "usb://Star/TSP743II%20(STR_T-001)?serial=123").
+
+    Args:
+        uri: device-uri de la file CUPS
+
+    Returns:
+        Optional[Dict[str, str]]: make, model et serial (vide si absent), None si ce n'est pas une file USB
+    """
+    parts = urlsplit(uri or "")
+    if parts.scheme.lower() != "usb":
+        return None
+    query = parse_qs(parts.query)
+    return {
+        "make": unquote(parts.netloc),
+        "model": unquote(parts.path.lstrip("/")),
+        "serial": (query.get("serial") or [""])[0]
+    }
+
+def _normalize(value: str) -> str:
+    return "".join(character for character in value.lower() if character.isalnum())
+
+def device_matches(device: Dict[str, Any], uri: Dict[str, str]) -> bool:
+    """
+    Indique si un périphérique USB correspond au device-uri d'une file CUPS.
+
+    Le numéro de série fait foi quand les deux en ont un ; sinon le fabricant
+    et le modèle (chaînes USB ou identifiant IEEE 1284, comparés sans
+    ponctuation ni casse) doivent se recouper.
+    """
+    if uri["serial"] and device.get("serial"):
+        return uri["serial"] == device["serial"]
+    make, model = _normalize(uri["make"]), _normalize(uri["model"])
+    manufacturer = _normalize(device.get("manufacturer") or "")
+    product = _normalize(device.get("product") or "")
+    if not make or not manufacturer or not (make.startswith(manufacturer) or manufacturer.startswith(make)):
+        return False
+    return not model or not product or model in product or product in model
+
+
+class HotplugMonitor:
+    """
+    Suivi des imprimantes USB branchées, à partir des événements du noyau.
+
+    Un thread lit la socket netlink ; l'état (périphériques branchés,
+    indexés par chemin sysfs) est gardé en mémoire et consulté sans appel
+    système par connected().
+    """
+
+    def __init__(self, printers: Callable[[], Dict[str, Dict[str, Any]]], sysfs_root: str = "/sys") -> None:
+        """
+        Args:
+            printers: Fonction renvoyant les files CUPS et leurs attributs (CupsClient.printers)
+            sysfs_root: Racine de sysfs
+        """
+        self._printers = printers
+        self.sysfs_root = sysfs_root
+        self._lock = threading.Lock()
+        self._devices: Dict[str, Dict[str, Any]] = {}
+        # File CUPS -> chemin sysfs du dernier périphérique associé (conservé après le débranchement)
+        self._associations: Dict[str, str] = {}
+        self._listeners: List[Callable[[str, Dict[str, Any], List[str]], None]] = []
+        self._socket: Optional[socket.socket] = None
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"add": 0, "remove": 0, "overruns": 0}
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any], List[str]], None]) -> None:
+        """
+        Enregistre une fonction appelée à chaque branchement ou débranchement.
+
+        Args:
+            callback: Fonction recevant (action "add"/"remove", périphérique, files CUPS associées)
+        """
+        self._listeners.append(callback)
+
+    def start(self) -> None:
+        """Relève les imprimantes déjà branchées et démarre l'écoute des événements."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC, NETLINK_KOBJECT_UEVENT)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UEVENT_BUFFER_SIZE)
+            sock.bind((0, UEVENT_KERNEL_GROUP))
+            self._socket = sock
+            self._thread = threading.Thread(target=self._run, name="usb-hotplug", daemon=True)
+        # Socket ouverte avant l'énumération : aucun événement n'est perdu entre les deux
+        self._enumerate()
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # ----- État -----
+
+    def devices(self) -> List[Dict[str, Any]]:
+        """Imprimantes USB branchées (attributs sysfs et files CUPS associées)."""
+        printers = self._printers()
+        with self._lock:
+            devices = [dict(device) for device in self._devices.values()]
+        for device in devices:
+            device["queues"] = self._queues_for(device, printers)
+        return devices
+
+    def connected(self, queue: str, printers: Optional[Dict[str, Dict[str, Any]]] = None) -> Optional[bool]:
+        """
+        Indique si l'imprimante d'une file CUPS USB est branchée.
+
+        Args:
+            queue: Nom de la file CUPS
+            printers: Attributs des files (évite une copie du cache CUPS par appel)
+
+        Returns:
+            Optional[bool]: None si inconnu (file non USB, jamais associée à un
+            périphérique branché, ou suivi arrêté)
+        """
+        if not self.running:
+            return None
+        with self._lock:
+            devpath = self._associations.get(queue)
+            if devpath is not None and devpath in self._devices:
+                return True
+        printers = printers if printers is not None else self._printers()
+        uri = parse_device_uri((printers.get(queue) or {}).get("device-uri", ""))
+        if uri is None:
+            return None
+        with self._lock:
+            for device in self._devices.values():
+                if device_matches(device, uri):
+                    self._associations[queue] = device["devpath"]
+                    return True
+            # Débranchée seulement si un périphérique lui a déjà été associé
+            return False if queue in self._associations else None
+
+    def status(self) -> Dict[str, Any]:
+        """État du suivi : périphériques branchés et compteurs d'événements."""
+        return {"running": self.running, "devices": self.devices(), **self.counters}
+
+    @staticmethod
+    def _queues_for(device: Dict[str, Any], printers: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Files CUPS dont le device-uri désigne le périphérique."""
+        queues = []
+        for name, attributes in printers.items():
+            uri = parse_device_uri(attributes.get("device-uri", ""))
+            if uri is not None and device_matches(device, uri):
+                queues.append(name)
+        return queues
+
+    # ----- Lecture de sysfs et des événements -----
+
+    def _read_device(self, devpath: str) -> Dict[str, Any]:
+        """Lit les attributs du périphérique USB parent d'une interface."""
+        device = {"devpath": devpath}
+        directory = os.path.join(self.sysfs_root, devpath.lstrip("/"), "..")
+        for name in DEVICE_ATTRIBUTES:
+            try:
+                with open(os.path.join(directory, name), encoding="utf-8", errors="replace") as f:
+                    device[name] = f.read().strip()
+            except OSError:
+                device[name] = None
+        return device
+
+    def _enumerate(self) -> None:
+        """Relève les interfaces USB de classe imprimante présentes (démarrage, événements perdus)."""
+        base = os.path.join(self.sysfs_root, "bus", "usb", "devices")
+        devices = {}
+        try:
+            entries = os.listdir(base)
+        except OSError:
+            entries = []
+        for entry in entries:
+            if ":" not in entry:
+                continue
+            try:
+                with open(os.path.join(base, entry, "bInterfaceClass")) as f:
+                    if int(f.read().strip(), 16) != USB_CLASS_PRINTER:
+                        continue
+            except (OSError, ValueError):
+                continue
+            devpath = os.path.realpath(os.path.join(base, entry))[len(os.path.realpath(self.sysfs_root)):]
+            devices[devpath] = self._read_device(devpath)
+        with self._lock:
+            self._devices = devices
+
+    def _run(self) -> None:
+        """Boucle de lecture des événements du noyau."""
+        while True:
+            try:
+                message = self._socket.recv(UEVENT_BUFFER_SIZE)
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # Tampon plein : des événements ont été perdus, on repart de sysfs
+                    self.counters["overruns"] += 1
+                    self._enumerate()
+                    self._dispatch("refresh", {}, time.perf_counter())
+                    continue
+                report_error("hotplug", f"Erreur de lecture des événements USB : {e}")
+                time.sleep(1)
+                continue
+            received = time.perf_counter()
+            event = parse_uevent(message)
+            if event is None or not is_printer_interface(event):
+                continue
+            action = event.get("ACTION")
+            devpath = event.get("DEVPATH", "")
+            if action == "add":
+                device = self._read_device(devpath)
+                with self._lock:
+                    self._devices[devpath] = device
+            elif action == "remove":
+                with self._lock:
+                    # Après le débranchement, sysfs n'a plus rien : on garde les attributs lus au branchement
+                    device = self._devices.pop(devpath, {"devpath": devpath})
+            else:
+                continue
+            self.counters[action] += 1
+            HOTPLUG_EVENTS.inc(action=action)
+            self._dispatch(action, device, received)
+
+    def _dispatch(self, action: str, device: Dict[str, Any], received: float) -> None:
+        """Prévient les fonctions enregistrées d'un branchement ou d'un débranchement."""
+        queues = self._queues_for(device, self._printers()) if device else []
+        if action == "add":
+            with self._lock:
+                for queue in queues:
+                    self._associations[queue] = device["devpath"]
+        for callback in list(self._listeners):
+            try:
+                callback(action, device, queues)
+            except Exception as e:
+                report_error("hotplug", f"Erreur dans un écouteur USB : {e}")
+        HOTPLUG_DISPATCH_DURATION.observe(time.perf_counter() - received)
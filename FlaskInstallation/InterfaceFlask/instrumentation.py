@@ -0,0 +1,356 @@
+"""
+TBerryPrint - Instrumentation et profilage
+
+Ce module fournit:
+- Des compteurs et histogrammes en mémoire, exportés au format texte de
+  Prometheus (/metrics)
+- Le chronométrage des routes Flask, des commandes externes et des appels CUPS
+- Un compteur des erreurs jusque-là seulement affichées par print()
+- Un profileur par échantillonnage (à activer explicitement) qui produit des
+  piles « repliées », directement utilisables par flamegraph.pl ou speedscope
+"""
+
+import contextlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from flask import Flask, g, request
+
+# Limites des histogrammes de durée (secondes)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """Échappe une valeur d'étiquette Prometheus."""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+# ===== MÉTRIQUES =====
+
+class Counter:
+    """Compteur monotone, éventuellement étiqueté."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """Incrémente le compteur pour une combinaison d'étiquettes."""
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {value:g}" for key, value in values]
+
+
+class Histogram:
+    """Histogramme cumulatif (compteurs par limite, somme et nombre d'observations)."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # Par combinaison d'étiquettes : [compteurs par limite..., somme, nombre]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """Enregistre une observation (ex: une durée en secondes)."""
+        key = tuple(str(labels.get(name, "")) for name in self.labels)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    data[index] += 1
+            data[-2] += value
+            data[-1] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """Chronomètre un bloc de code."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, list(data)) for key, data in self._values.items())
+        lines = []
+        for key, data in values:
+            for bound, count in zip(self.buckets, data):
+                bucket_labels = _format_labels(self.labels, key, 'le="%g"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {count:g}")
+            bucket_labels = _format_labels(self.labels, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {data[-1]:g}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {data[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {data[-1]:g}")
+        return lines
+
+
+class Gauge:
+    """Valeur instantanée lue au moment de l'export (fonction de collecte)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, collect: Callable[[], Any], labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._collect = collect
+
+    def render(self) -> List[str]:
+        """
+        La fonction de collecte renvoie une valeur, ou un dictionnaire
+        {tuple d'étiquettes: valeur} pour une jauge étiquetée.
+        """
+        value = self._collect()
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            return [f"{self.name} {float(value):g}"]
+        return [
+            f"{self.name}{_format_labels(self.labels, key if isinstance(key, tuple) else (key,))} {float(item):g}"
+            for key, item in sorted(value.items()) if item is not None
+        ]
+
+
+class Registry:
+    """Ensemble des métriques exportées par /metrics."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+
+    def _register(self, metric: Any) -> Any:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(self, name: str, help_text: str, collect: Callable[[], Any], labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, collect, labels))
+
+    def render(self) -> str:
+        """
+        Exporte toutes les métriques au format texte de Prometheus.
+
+        Returns:
+            str: Exposition Prometheus (version 0.0.4)
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.render()
+            except Exception as e:
+                ERRORS.inc(component="metrics")
+                print(f"Erreur lors de l'export de la métrique {metric.name} : {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.histogram(
+    "tberryprint_http_request_duration_seconds",
+    "Durée de traitement des requêtes HTTP par route",
+    ("endpoint", "method", "status")
+)
+COMMAND_DURATION = REGISTRY.histogram(
+    "tberryprint_command_duration_seconds",
+    "Durée des commandes externes (vcgencmd, cupsfilter, opérations privilégiées...)",
+    ("command",)
+)
+COMMAND_EXITS = REGISTRY.counter(
+    "tberryprint_command_exit_total",
+    "Codes de retour des commandes externes",
+    ("command", "code")
+)
+CUPS_CALL_DURATION = REGISTRY.histogram(
+    "tberryprint_cups_call_duration_seconds",
+    "Durée des appels à cupsd",
+    ("method",)
+)
+CUPS_CALL_ERRORS = REGISTRY.counter(
+    "tberryprint_cups_call_errors_total",
+    "Appels à cupsd en échec",
+    ("method",)
+)
+ERRORS = REGISTRY.counter(
+    "tberryprint_errors_total",
+    "Erreurs signalées par les composants de l'application",
+    ("component",)
+)
+START_TIME = time.time()
+REGISTRY.gauge("tberryprint_process_start_time_seconds", "Heure de démarrage du service", lambda: START_TIME)
+
+
+# ===== AIDES D'INSTRUMENTATION =====
+
+def report_error(component: str, message: str) -> None:
+    """
+    Compte une erreur et l'affiche dans le journal du service.
+
+    Args:
+        component: Composant concerné (ex: "cups", "wifi", "spooler")
+        message: Message affiché (comme auparavant avec print)
+    """
+    ERRORS.inc(component=component)
+    print(message)
+
+def record_command(command: str, duration: float, returncode: Optional[int]) -> None:
+    """
+    Enregistre la durée et le code de retour d'une commande externe.
+
+    Args:
+        command: Nom court de la commande (ex: "vcgencmd", "helper:wifi_scan_nmcli")
+        duration: Durée en secondes
+        returncode: Code de retour (None si la commande n'a pas pu aboutir)
+    """
+    COMMAND_DURATION.observe(duration, command=command)
+    COMMAND_EXITS.inc(command=command, code="error" if returncode is None else returncode)
+
+def run_command(args: List[str], name: Optional[str] = None, **kwargs: Any) -> subprocess.CompletedProcess:
+    """
+    subprocess.run chronométré.
+
+    Args:
+        args: Commande et arguments
+        name: Nom court de la commande dans les métriques (défaut : nom du programme)
+        kwargs: Arguments de subprocess.run
+
+    Returns:
+        subprocess.CompletedProcess: Résultat de la commande
+    """
+    name = name or os.path.basename(args[0])
+    start = time.perf_counter()
+    returncode = None
+    try:
+        result = subprocess.run(args, **kwargs)
+        returncode = result.returncode
+        return result
+    finally:
+        record_command(name, time.perf_counter() - start, returncode)
+
+def instrument_app(app: Flask) -> None:
+    """
+    Chronomètre toutes les routes d'une application Flask.
+
+    Pour les réponses en flux (SSE), seule la préparation de la réponse est mesurée.
+    """
+
+    @app.before_request
+    def start_timer() -> None:
+        g.instrumentation_start = time.perf_counter()
+
+    @app.after_request
+    def stop_timer(response):
+        start = g.pop("instrumentation_start", None)
+        if start is not None:
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                endpoint=request.endpoint or "inconnu",
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+
+# ===== PROFILEUR PAR ÉCHANTILLONNAGE =====
+
+class SamplingProfiler:
+    """
+    Profileur par échantillonnage de tous les threads Python.
+
+    À intervalle régulier, la pile de chaque thread est relevée via
+    sys._current_frames(). Le résultat est au format « replié » : une ligne
+    par pile distincte, "thread;fichier:fonction;... nombre".
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def profile(self, duration: float, interval: float = 0.005) -> Optional[str]:
+        """
+        Échantillonne les piles pendant une durée donnée.
+
+        Args:
+            duration: Durée de la fenêtre d'échantillonnage (secondes)
+            interval: Intervalle entre deux échantillons (secondes)
+
+        Returns:
+            Optional[str]: Piles repliées, ou None si un profilage est déjà en cours
+        """
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            stacks: StackCounter = StackCounter()
+            current = threading.get_ident()
+            end = time.monotonic() + duration
+            while time.monotonic() < end:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == current:
+                        continue
+                    stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _collapse(thread_name: str, frame: Any) -> str:
+        """Pile d'un thread, de la racine vers la fonction en cours."""
+        functions = []
+        while frame is not None:
+            code = frame.f_code
+            functions.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        functions.append(thread_name.replace(";", ":").replace(" ", "_"))
+        return ";".join(reversed(functions))
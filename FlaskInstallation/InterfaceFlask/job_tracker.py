@@ -0,0 +1,255 @@
+"""
+TBerryPrint - Suivi des tâches d'impression
+
+Ce module suit les tâches CUPS à partir des notifications job-state-changed
+de l'abonnement de CupsClient:
+- Tâches actives et terminées, par imprimante
+- Horodatages soumission -> traitement -> fin (attributs time-at-* de CUPS)
+- Latences de bout en bout (p50/p95/p99) et tâches par minute sur une
+  fenêtre glissante, gardées en mémoire
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from instrumentation import report_error
+
+# États de tâche CUPS
+JOB_STATES = {
+    3: "pending",
+    4: "held",
+    5: "processing",
+    6: "stopped",
+    7: "canceled",
+    8: "aborted",
+    9: "completed"
+}
+JOB_FINISHED = 7
+
+# Attributs demandés à CUPS pour chaque tâche
+JOB_ATTRIBUTES = [
+    "job-id", "job-name", "job-printer-uri", "job-state", "job-state-reasons",
+    "job-originating-user-name", "time-at-creation", "time-at-processing", "time-at-completed"
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values: List[float], rank: int) -> Optional[float]:
+    """
+    Percentile (méthode du rang le plus proche) d'une liste triée.
+
+    Args:
+        sorted_values: Valeurs triées par ordre croissant
+        rank: Percentile demandé (ex: 95)
+
+    Returns:
+        Optional[float]: Valeur du percentile, ou None si la liste est vide
+    """
+    if not sorted_values:
+        return None
+    index = max(0, math.ceil(rank / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class JobTracker:
+    """
+    Suivi des tâches CUPS et statistiques de latence.
+
+    Les notifications donnent l'état des tâches au fil de l'eau ; à la fin
+    d'une tâche, ses horodatages sont relus une fois auprès de cupsd. Les
+    tâches terminées sont conservées dans une liste bornée, et leurs latences
+    dans une fenêtre glissante.
+    """
+
+    def __init__(self, cups_client: Any, window: float = 900, max_finished: int = 200) -> None:
+        self.cups_client = cups_client
+        self.window = window
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._active: Dict[int, Dict[str, Any]] = {}
+        self._finished: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        # (fin, imprimante, latence totale, attente en file), dans l'ordre de fin
+        self._latencies: Deque[Tuple[float, str, float, Optional[float]]] = deque()
+        self._started = False
+
+    def start(self) -> None:
+        """Charge les tâches existantes et s'abonne aux notifications de tâches."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self.cups_client.add_job_listener(self.handle_event)
+        try:
+            for which in ("not-completed", "completed"):
+                jobs = self.cups_client.call(
+                    "getJobs",
+                    which_jobs=which,
+                    limit=self.max_finished if which == "completed" else -1,
+                    requested_attributes=JOB_ATTRIBUTES
+                )
+                for job_id, attributes in sorted(jobs.items()):
+                    self._update(job_id, attributes)
+        except Exception as e:
+            report_error("jobs", f"Erreur lors du chargement des tâches CUPS : {e}")
+
+    # ----- Mise à jour -----
+
+    def handle_event(self, event: Dict[str, Any]) -> None:
+        """
+        Répercute une notification de tâche (appelée par CupsClient).
+
+        Args:
+            event: Notification CUPS (notify-job-id, job-state, printer-name...)
+        """
+        job_id = event.get("notify-job-id")
+        if job_id is None:
+            return
+        attributes = {
+            "job-state": event.get("job-state"),
+            "job-name": event.get("job-name"),
+            "job-state-reasons": event.get("job-state-reasons")
+        }
+        if event.get("printer-name"):
+            attributes["printer-name"] = event["printer-name"]
+
+        if (attributes["job-state"] or 0) >= JOB_FINISHED or job_id not in self._active:
+            # Nouvelle tâche ou tâche terminée : on relit ses horodatages
+            try:
+                attributes.update(self.cups_client.call(
+                    "getJobAttributes", job_id, requested_attributes=JOB_ATTRIBUTES
+                ))
+            except Exception as e:
+                report_error("jobs", f"Erreur lors de la lecture de la tâche {job_id} : {e}")
+        self._update(job_id, {name: value for name, value in attributes.items() if value is not None})
+
+    def _update(self, job_id: int, attributes: Dict[str, Any]) -> None:
+        """Met à jour une tâche à partir de ses attributs CUPS."""
+        with self._lock:
+            job = self._active.get(job_id) or self._finished.get(job_id) or {"id": job_id}
+            printer = attributes.get("printer-name") or attributes.get("job-printer-uri", "").rsplit("/", 1)[-1]
+            if printer:
+                job["printer"] = printer
+            if "job-name" in attributes:
+                job["title"] = attributes["job-name"]
+            if "job-originating-user-name" in attributes:
+                job["user"] = attributes["job-originating-user-name"]
+            if "job-state-reasons" in attributes:
+                reasons = attributes["job-state-reasons"]
+                job["reasons"] = reasons if isinstance(reasons, list) else [reasons]
+            for name, key in (("time-at-creation", "submitted_at"),
+                              ("time-at-processing", "processing_at"),
+                              ("time-at-completed", "completed_at")):
+                # CUPS renvoie 0 (ou rien) tant que l'étape n'est pas atteinte
+                if attributes.get(name):
+                    job[key] = float(attributes[name])
+            state = attributes.get("job-state", job.get("state_code", 3))
+            job["state_code"] = state
+            job["state"] = JOB_STATES.get(state, "unknown")
+
+            if state < JOB_FINISHED:
+                self._active[job_id] = job
+                return
+
+            was_finished = job_id in self._finished
+            self._active.pop(job_id, None)
+            self._finished[job_id] = job
+            self._finished.move_to_end(job_id)
+            while len(self._finished) > self.max_finished:
+                self._finished.popitem(last=False)
+
+            if state == 9 and not was_finished and "submitted_at" in job and "completed_at" in job:
+                job["latency"] = job["completed_at"] - job["submitted_at"]
+                queued = job["processing_at"] - job["submitted_at"] if "processing_at" in job else None
+                job["queue_time"] = queued
+                self._latencies.append((job["completed_at"], job.get("printer", ""), job["latency"], queued))
+            self._expire(time.time())
+
+    def _expire(self, now: float) -> None:
+        """Oublie les latences sorties de la fenêtre glissante (verrou détenu)."""
+        while self._latencies and self._latencies[0][0] < now - self.window:
+            self._latencies.popleft()
+
+    # ----- Consultation -----
+
+    def jobs(self, printer: Optional[str] = None, which: str = "all") -> List[Dict[str, Any]]:
+        """
+        Liste les tâches connues.
+
+        Args:
+            printer: Limiter à une imprimante (None pour toutes)
+            which: "active", "completed" (tâches terminées) ou "all"
+
+        Returns:
+            List[Dict]: Tâches, des plus récentes aux plus anciennes
+        """
+        now = time.time()
+        with self._lock:
+            selected = []
+            if which in ("active", "all"):
+                selected += list(self._active.values())
+            if which in ("completed", "all"):
+                selected += list(self._finished.values())
+            jobs = [dict(job) for job in selected if printer is None or job.get("printer") == printer]
+        for job in jobs:
+            if job["state_code"] < JOB_FINISHED and "submitted_at" in job:
+                job["age"] = round(now - job["submitted_at"], 1)
+        return sorted(jobs, key=lambda job: job["id"], reverse=True)
+
+    def job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Renvoie une tâche par son identifiant.
+
+        Args:
+            job_id: Identifiant de la tâche CUPS
+
+        Returns:
+            Optional[Dict]: La tâche, ou None si elle est inconnue
+        """
+        with self._lock:
+            job = self._active.get(job_id) or self._finished.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Calcule les statistiques de chaque imprimante sur la fenêtre glissante.
+
+        Returns:
+            Dict: Par imprimante : tâches actives, âge de la plus ancienne,
+            latences p50/p95/p99 (secondes), attente p50, tâches terminées
+            dans la dernière minute
+        """
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            latencies = list(self._latencies)
+            active = list(self._active.values())
+
+        printers: Dict[str, Dict[str, Any]] = {}
+
+        def entry(name: str) -> Dict[str, Any]:
+            return printers.setdefault(name, {"active": 0, "oldest_age": None, "completed": 0, "jobs_per_minute": 0})
+
+        for job in active:
+            stats = entry(job.get("printer", ""))
+            stats["active"] += 1
+            if "submitted_at" in job:
+                age = round(now - job["submitted_at"], 1)
+                stats["oldest_age"] = max(stats["oldest_age"] or 0, age)
+
+        by_printer: Dict[str, List[Tuple[float, float, Optional[float]]]] = {}
+        for finished_at, printer, latency, queued in latencies:
+            by_printer.setdefault(printer, []).append((finished_at, latency, queued))
+        for printer, values in by_printer.items():
+            stats = entry(printer)
+            ordered = sorted(latency for _, latency, _ in values)
+            waits = sorted(queued for _, _, queued in values if queued is not None)
+            stats["completed"] = len(values)
+            stats["jobs_per_minute"] = sum(1 for finished_at, _, _ in values if finished_at >= now - 60)
+            for rank in PERCENTILES:
+                stats[f"p{rank}"] = percentile(ordered, rank)
+            stats["queue_p50"] = percentile(waits, 50)
+        return printers
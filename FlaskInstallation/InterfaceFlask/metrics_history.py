@@ -0,0 +1,260 @@
+"""
+TBerryPrint - Historique compact des métriques système
+
+L'historique est un fichier de taille fixe projeté en mémoire (mmap):
+il survit aux redémarrages du service et ne grossit jamais sur la carte SD.
+Il contient des tampons circulaires:
+- Échantillons bruts à la seconde (1 heure)
+- Agrégats par minute min/moy/max (24 heures)
+- Agrégats par heure min/moy/max (30 jours)
+- Transitions d'état des imprimantes (1024 dernières)
+"""
+
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Métriques enregistrées, dans l'ordre de stockage
+METRICS = ("cpu", "ram", "temperature")
+
+# En-tête du fichier : signature, version, position d'écriture des événements
+HEADER = struct.Struct("4sIQ")
+HEADER_SIZE = 64
+MAGIC = b"TBPH"
+VERSION = 1
+
+# Tampons circulaires : (résolution en secondes, nombre de cases)
+RAW_TIER = (1, 3600)
+MINUTE_TIER = (60, 1440)
+HOUR_TIER = (3600, 720)
+
+# Une case brute : horodatage + une valeur par métrique
+RAW_WIDTH = 1 + len(METRICS)
+# Une case agrégée : horodatage + min/moy/max par métrique
+ROLLUP_WIDTH = 1 + 3 * len(METRICS)
+
+# Transitions d'imprimante : horodatage, état, nom (tronqué à 32 octets)
+EVENT = struct.Struct("dd32s")
+EVENT_SLOTS = 1024
+
+DOUBLE_SIZE = 8
+NAN = float("nan")
+
+
+class MetricsHistory:
+    """
+    Historique des métriques dans un fichier de taille fixe projeté en mémoire.
+
+    Chaque case d'un tampon stocke l'horodatage de son intervalle : une case
+    dont l'horodatage ne correspond pas à l'intervalle demandé est considérée
+    vide (données écrasées ou jamais écrites). Les agrégats par minute et par
+    heure sont calculés quand l'intervalle correspondant se termine.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._raw_offset = HEADER_SIZE
+        self._minute_offset = self._raw_offset + RAW_TIER[1] * RAW_WIDTH * DOUBLE_SIZE
+        self._hour_offset = self._minute_offset + MINUTE_TIER[1] * ROLLUP_WIDTH * DOUBLE_SIZE
+        self._events_offset = self._hour_offset + HOUR_TIER[1] * ROLLUP_WIDTH * DOUBLE_SIZE
+        self.size = self._events_offset + EVENT_SLOTS * EVENT.size
+        self._printer_states: Dict[str, int] = {}
+
+        self._map = self._open()
+        self._raw = memoryview(self._map)[self._raw_offset:self._minute_offset].cast("d")
+        self._minutes = memoryview(self._map)[self._minute_offset:self._hour_offset].cast("d")
+        self._hours = memoryview(self._map)[self._hour_offset:self._events_offset].cast("d")
+
+        # Reprise après redémarrage : les intervalles en cours sont ceux du dernier échantillon
+        last = max((self._raw[slot * RAW_WIDTH] for slot in range(RAW_TIER[1])), default=0.0)
+        self._current_minute: Optional[float] = self._bucket(last, MINUTE_TIER[0]) if last > 0 else None
+        self._current_hour: Optional[float] = self._bucket(last, HOUR_TIER[0]) if last > 0 else None
+
+    def _open(self) -> mmap.mmap:
+        """Ouvre (ou initialise) le fichier d'historique."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            valid = os.fstat(fd).st_size == self.size
+            if valid:
+                magic, version, _ = HEADER.unpack(os.pread(fd, HEADER.size, 0))
+                valid = magic == MAGIC and version == VERSION
+            if not valid:
+                # Fichier absent, d'une autre version ou tronqué : on repart de zéro
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, HEADER.pack(MAGIC, VERSION, 0), 0)
+            return mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _bucket(timestamp: float, resolution: int) -> float:
+        """Début de l'intervalle contenant un horodatage."""
+        return float(int(timestamp) // resolution * resolution)
+
+    # ----- Écriture -----
+
+    def record(self, timestamp: float, values: Dict[str, Optional[float]]) -> None:
+        """
+        Enregistre un échantillon des métriques.
+
+        Args:
+            timestamp: Horodatage de l'échantillon (secondes depuis l'epoch)
+            values: Valeurs par métrique (cpu, ram, temperature) ; None si indisponible
+        """
+        with self._lock:
+            second = self._bucket(timestamp, RAW_TIER[0])
+            base = int(second) % RAW_TIER[1] * RAW_WIDTH
+            self._raw[base] = second
+            for index, metric in enumerate(METRICS):
+                value = values.get(metric)
+                self._raw[base + 1 + index] = NAN if value is None else float(value)
+
+            minute = self._bucket(timestamp, MINUTE_TIER[0])
+            if self._current_minute is not None and minute > self._current_minute:
+                self._rollup(self._raw, RAW_TIER, RAW_WIDTH, self._minutes, MINUTE_TIER, self._current_minute)
+                hour = self._bucket(timestamp, HOUR_TIER[0])
+                if self._current_hour is not None and hour > self._current_hour:
+                    self._rollup(self._minutes, MINUTE_TIER, ROLLUP_WIDTH, self._hours, HOUR_TIER, self._current_hour)
+                self._current_hour = hour
+            self._current_minute = minute
+
+    def _rollup(self, source, source_tier, source_width, target, target_tier, start: float) -> None:
+        """Agrège un intervalle terminé du tampon source dans le tampon cible."""
+        source_resolution, source_slots = source_tier
+        target_resolution, target_slots = target_tier
+        aggregates = [[math.inf, 0.0, -math.inf, 0] for _ in METRICS]
+
+        for step in range(target_resolution // source_resolution):
+            bucket = start + step * source_resolution
+            base = int(bucket) // source_resolution % source_slots * source_width
+            if source[base] != bucket:
+                continue
+            for index in range(len(METRICS)):
+                if source_width == RAW_WIDTH:
+                    low = mean = high = source[base + 1 + index]
+                else:
+                    low, mean, high = source[base + 1 + 3 * index:base + 4 + 3 * index]
+                if math.isnan(mean):
+                    continue
+                aggregate = aggregates[index]
+                aggregate[0] = min(aggregate[0], low)
+                aggregate[1] += mean
+                aggregate[2] = max(aggregate[2], high)
+                aggregate[3] += 1
+
+        base = int(start) // target_resolution % target_slots * ROLLUP_WIDTH
+        target[base] = start
+        for index, (low, total, high, count) in enumerate(aggregates):
+            values = (low, total / count, high) if count else (NAN, NAN, NAN)
+            for position, value in enumerate(values):
+                target[base + 1 + 3 * index + position] = value
+
+    def record_printer_state(self, timestamp: float, printer_name: str, state: int) -> None:
+        """
+        Enregistre l'état d'une imprimante s'il a changé depuis le dernier appel.
+
+        Args:
+            timestamp: Horodatage de l'observation
+            printer_name: Nom de l'imprimante
+            state: Code d'état CUPS
+        """
+        with self._lock:
+            if self._printer_states.get(printer_name) == state:
+                return
+            self._printer_states[printer_name] = state
+            _, _, position = HEADER.unpack_from(self._map, 0)
+            offset = self._events_offset + position % EVENT_SLOTS * EVENT.size
+            EVENT.pack_into(self._map, offset, timestamp, float(state), printer_name.encode()[:32])
+            HEADER.pack_into(self._map, 0, MAGIC, VERSION, position + 1)
+
+    def flush(self) -> None:
+        """Force l'écriture sur disque (ex: à l'arrêt du service)."""
+        with self._lock:
+            self._map.flush()
+
+    # ----- Lecture -----
+
+    def query(self, metric: str, range_seconds: int, points: int, now: Optional[float] = None) -> List[List[float]]:
+        """
+        Renvoie une série sous-échantillonnée pour une métrique.
+
+        Le tampon utilisé dépend de la plage : brut jusqu'à 1 h, minutes
+        jusqu'à 24 h, heures au-delà. Les cases sont ensuite regroupées en
+        au plus `points` points [horodatage, min, moy, max].
+
+        Args:
+            metric: Nom de la métrique (cpu, ram, temperature)
+            range_seconds: Durée couverte, en secondes, jusqu'à maintenant
+            points: Nombre maximal de points renvoyés
+            now: Horodatage de fin (maintenant par défaut)
+
+        Returns:
+            List[List[float]]: Points [horodatage, min, moy, max]
+        """
+        index = METRICS.index(metric)
+        now = time.time() if now is None else now
+        if range_seconds <= RAW_TIER[0] * RAW_TIER[1]:
+            tier, width, data = RAW_TIER, RAW_WIDTH, self._raw
+        elif range_seconds <= MINUTE_TIER[0] * MINUTE_TIER[1]:
+            tier, width, data = MINUTE_TIER, ROLLUP_WIDTH, self._minutes
+        else:
+            tier, width, data = HOUR_TIER, ROLLUP_WIDTH, self._hours
+        resolution, slots = tier
+
+        end = self._bucket(now, resolution)
+        count = min(slots, max(1, range_seconds // resolution))
+        start = end - (count - 1) * resolution
+        group = max(1, math.ceil(count / max(1, points)))
+
+        series = []
+        with self._lock:
+            for group_start in range(0, count, group):
+                low, total, high, samples = math.inf, 0.0, -math.inf, 0
+                for step in range(group_start, min(group_start + group, count)):
+                    bucket = start + step * resolution
+                    base = int(bucket) // resolution % slots * width
+                    if data[base] != bucket:
+                        continue
+                    if width == RAW_WIDTH:
+                        values = (data[base + 1 + index],) * 3
+                    else:
+                        values = tuple(data[base + 1 + 3 * index:base + 4 + 3 * index])
+                    if math.isnan(values[1]):
+                        continue
+                    low, total, high, samples = min(low, values[0]), total + values[1], max(high, values[2]), samples + 1
+                if samples:
+                    series.append([start + group_start * resolution, round(low, 2), round(total / samples, 2), round(high, 2)])
+        return series
+
+    def printer_events(self, range_seconds: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Renvoie les transitions d'état des imprimantes sur une plage.
+
+        Args:
+            range_seconds: Durée couverte, en secondes, jusqu'à maintenant
+            now: Horodatage de fin (maintenant par défaut)
+
+        Returns:
+            List[Dict]: Transitions {timestamp, printer, state}, de la plus ancienne à la plus récente
+        """
+        since = (time.time() if now is None else now) - range_seconds
+        with self._lock:
+            _, _, position = HEADER.unpack_from(self._map, 0)
+            events = []
+            for sequence in range(max(0, position - EVENT_SLOTS), position):
+                offset = self._events_offset + sequence % EVENT_SLOTS * EVENT.size
+                timestamp, state, name = EVENT.unpack_from(self._map, offset)
+                if timestamp >= since:
+                    events.append({
+                        "timestamp": timestamp,
+                        "printer": name.rstrip(b"\0").decode(errors="replace"),
+                        "state": int(state)
+                    })
+        return events
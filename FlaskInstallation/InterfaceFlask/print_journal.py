@@ -0,0 +1,608 @@
+"""
+TBerryPrint - Journal des tickets (journal d'écriture anticipée)
+
+Un changement de Wi-Fi redémarre TBerryPrint.service, une mise à jour
+redémarre le Raspberry Pi : un ticket en cours d'envoi à ce moment-là
+pouvait être perdu, ou imprimé deux fois si le client renvoyait sa requête.
+Ce module enregistre chaque ticket, de sa réception à la fin de son
+impression, dans un fichier en ajout seul:
+- "accepted" : ticket reçu (avec son contenu), écrit sur disque avant la réponse HTTP
+- "submitted" : tâche CUPS créée (identifiant de la tâche)
+- "finished" : tâche terminée (completed, canceled, aborted) ou abandonnée
+
+Chaque ticket porte une clé d'idempotence, reprise dans le titre de la
+tâche CUPS. Au démarrage, les tickets non terminés sont rejoués : un ticket
+déjà présent dans CUPS (retrouvé par sa clé) n'est pas renvoyé.
+
+Pour ménager la carte SD, les écritures sont regroupées (un seul fdatasync
+par lot) et le fichier n'est compacté que lorsqu'il dépasse une taille fixe
+et le double de l'état courant (tickets en attente compris) : une longue
+file de tickets non terminés ne provoque pas de réécriture à chaque lot.
+"""
+
+import json
+import os
+import re
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from instrumentation import report_error
+
+# En-tête d'un enregistrement : longueur du corps, CRC32 du corps
+RECORD_HEADER = struct.Struct("<II")
+
+# États d'un ticket, dans l'ordre (un enregistrement ne fait jamais reculer un ticket)
+ACCEPTED = "accepted"
+SUBMITTED = "submitted"
+FINISHED = "finished"
+STATE_ORDER = {ACCEPTED: 0, SUBMITTED: 1, FINISHED: 2}
+
+# États de tâche CUPS terminée : canceled (7), aborted (8), completed (9)
+JOB_FINISHED_STATES = {7: "canceled", 8: "aborted", 9: "completed"}
+
+# Clés d'idempotence acceptées (en-tête Idempotency-Key)
+KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# Marqueur de la clé dans le titre des tâches CUPS
+TITLE_MARKER = " #tbp-"
+
+# Longueur maximale du titre d'une tâche CUPS (job-name)
+MAX_TITLE_LENGTH = 255
+
+# Fins de tâches CUPS gardées tant que leur ticket n'est pas connu (fin notifiée avant submitted())
+RECENT_FINISHED_JOBS = 256
+
+# Délai entre deux tentatives de reprise si cupsd n'est pas encore joignable (secondes)
+RECOVERY_RETRY_DELAY = 5.0
+
+Document = Tuple[str, bytes]
+
+
+def tag_title(title: str, key: str) -> str:
+    """
+    Ajoute la clé d'idempotence au titre d'une tâche CUPS.
+
+    Args:
+        title: Titre de la tâche
+        key: Clé d'idempotence
+
+    Returns:
+        str: Titre complété (ex: "Ticket TBerryPrint #tbp-3f2a...")
+    """
+    marker = TITLE_MARKER + key
+    return title[:MAX_TITLE_LENGTH - len(marker)] + marker
+
+def key_from_title(title: str) -> Optional[str]:
+    """Clé d'idempotence contenue dans le titre d'une tâche CUPS (None si absente)."""
+    _, found, key = (title or "").rpartition(TITLE_MARKER)
+    return key if found and KEY_PATTERN.match(key) else None
+
+
+class DuplicateTicket(Exception):
+    """Un ticket avec la même clé d'idempotence a déjà été reçu."""
+
+    def __init__(self, entry: Dict[str, Any]) -> None:
+        super().__init__(f"Ticket déjà reçu (clé {entry['key']})")
+        self.entry = entry
+
+
+class JournalUnavailable(Exception):
+    """Le journal n'est pas ouvert (échec de l'ouverture) ou son thread d'écriture est arrêté."""
+
+
+class PrintJournal:
+    """
+    Journal d'écriture anticipée des tickets.
+
+    Les enregistrements sont ajoutés par un thread d'écriture unique : les
+    appels qui arrivent pendant un fdatasync partent dans le lot suivant.
+    L'état de chaque ticket est gardé en mémoire (contenu compris, tant que
+    le ticket n'est pas terminé).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_delay: float = 0.01,
+        compact_bytes: int = 4 * 1024 * 1024,
+        max_finished: int = 1000
+    ) -> None:
+        self.path = path
+        self.flush_delay = flush_delay
+        self.compact_bytes = compact_bytes
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._payloads: Dict[str, List[Document]] = {}
+        self._jobs: Dict[int, str] = {}
+        # Tâches terminées sans ticket associé : identifiant -> résultat (voir submitted())
+        self._finished_jobs: "OrderedDict[int, str]" = OrderedDict()
+        # Tickets non terminés à l'ouverture : les seuls que la reprise peut renvoyer
+        self._recoverable: List[str] = []
+        self._pending: List[Tuple[bytes, Optional[threading.Event]]] = []
+        self._pending_ready = threading.Condition(self._lock)
+        self._fd: Optional[int] = None
+        self._size = 0
+        # Taille de l'état courant lors du dernier compactage (seuil du suivant)
+        self._live_size = 0
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {
+            "records": 0,
+            "batches": 0,
+            "fsync_seconds": 0.0,
+            "compactions": 0,
+            "truncated_bytes": 0,
+            "duplicates": 0
+        }
+        self.recovery: Dict[str, Any] = {"state": "pending"}
+        # Cause de l'échec de l'ouverture (None si ouvert ou pas encore ouvert)
+        self.error: Optional[str] = None
+
+    # ----- Ouverture et relecture -----
+
+    def open(self) -> None:
+        """
+        Relit le journal existant et démarre le thread d'écriture.
+
+        Raises:
+            OSError: Fichier illisible ou impossible à créer (le journal reste indisponible)
+        """
+        if self._thread is not None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_CLOEXEC, 0o600)
+            self._load()
+            # Relevé avant l'ouverture du port : les tickets reçus ensuite sont soumis par leur requête
+            self._recoverable = [key for key, entry in self._entries.items() if entry["state"] != FINISHED]
+            # Compactage avant le démarrage du thread d'écriture (seul autre utilisateur du fichier)
+            if self._size > 0:
+                self.compact()
+        except Exception as e:
+            self.error = str(e)
+            raise
+        self.error = None
+        self._thread = threading.Thread(target=self._write_loop, name="print-journal", daemon=True)
+        self._thread.start()
+
+    @property
+    def available(self) -> bool:
+        """Vrai si le journal est ouvert et que son thread d'écriture tourne."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def _load(self) -> None:
+        """Rejoue les enregistrements du fichier ; une fin incomplète (coupure de courant) est tronquée."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            length, checksum = RECORD_HEADER.unpack_from(data, offset)
+            body = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+            if len(body) < length or zlib.crc32(body) != checksum:
+                break
+            try:
+                self._apply(*self._decode(body))
+            except (ValueError, KeyError) as e:
+                report_error("journal", f"Enregistrement illisible dans le journal des tickets : {e}")
+            offset += RECORD_HEADER.size + length
+        if offset < len(data):
+            self.counters["truncated_bytes"] = len(data) - offset
+            os.ftruncate(self._fd, offset)
+            print(f"Journal des tickets : {len(data) - offset} octets incomplets ignorés")
+        self._size = offset
+
+    @staticmethod
+    def _encode(record: Dict[str, Any], documents: Optional[List[Document]] = None) -> bytes:
+        """Sérialise un enregistrement : métadonnées JSON, puis contenu des documents."""
+        if documents:
+            record = dict(record, documents=[[name, len(data)] for name, data in documents])
+        body = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        body += b"".join(data for _, data in documents or [])
+        return RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+    @staticmethod
+    def _decode(body: bytes) -> Tuple[Dict[str, Any], List[Document]]:
+        """Relit un enregistrement sérialisé par _encode."""
+        meta, _, payload = body.partition(b"\n")
+        record = json.loads(meta)
+        documents = []
+        offset = 0
+        for name, length in record.pop("documents", []):
+            documents.append((name, payload[offset:offset + length]))
+            offset += length
+        return record, documents
+
+    def _apply(self, record: Dict[str, Any], documents: List[Document]) -> None:
+        """Met à jour l'état en mémoire (verrou détenu, ou pendant la relecture)."""
+        key = record["key"]
+        entry = self._entries.get(key)
+        if entry is not None and STATE_ORDER[record["state"]] < STATE_ORDER[entry["state"]]:
+            return
+        if entry is None:
+            entry = self._entries[key] = {"key": key}
+        entry.update(record)
+        if documents:
+            self._payloads[key] = documents
+        if entry.get("job_id") is not None:
+            self._jobs[entry["job_id"]] = key
+        if entry["state"] == FINISHED:
+            self._payloads.pop(key, None)
+            self._entries.move_to_end(key)
+            self._forget_finished()
+
+    def _forget_finished(self) -> None:
+        """Ne garde que les max_finished derniers tickets terminés (pour l'idempotence)."""
+        finished = [key for key, entry in self._entries.items() if entry["state"] == FINISHED]
+        for key in finished[:max(0, len(finished) - self.max_finished)]:
+            entry = self._entries.pop(key)
+            self._jobs.pop(entry.get("job_id"), None)
+
+    # ----- Écriture -----
+
+    def _append(self, record: Dict[str, Any], documents: Optional[List[Document]] = None, wait: bool = True) -> None:
+        """
+        Ajoute un enregistrement.
+
+        Args:
+            record: Métadonnées (key, state...)
+            documents: Contenu des documents (enregistrement "accepted")
+            wait: Attendre que l'enregistrement soit sur disque (fdatasync)
+        """
+        data = self._encode(record, documents)
+        with self._lock:
+            self._apply(record, documents or [])
+        self._write(data, wait)
+
+    def _write(self, data: bytes, wait: bool = True) -> None:
+        """
+        Confie un enregistrement sérialisé au thread d'écriture (état en mémoire déjà à jour).
+
+        Sans thread d'écriture, un enregistrement sans attente n'est gardé
+        qu'en mémoire ; un enregistrement avec attente lève une exception.
+
+        Raises:
+            JournalUnavailable: Journal non ouvert (attente demandée)
+        """
+        if not self.available:
+            if wait:
+                raise JournalUnavailable(self.error or "Journal des tickets non ouvert")
+            return
+        done = threading.Event() if wait else None
+        with self._lock:
+            self._pending.append((data, done))
+            self._pending_ready.notify()
+        if done is not None:
+            done.wait()
+
+    def _write_loop(self) -> None:
+        """Écrit les enregistrements par lots : une écriture et un fdatasync par lot."""
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._pending_ready.wait()
+            # Laisse arriver les enregistrements concurrents avant de forcer l'écriture
+            if self.flush_delay > 0:
+                time.sleep(self.flush_delay)
+            with self._lock:
+                batch, self._pending = self._pending, []
+            try:
+                start = time.perf_counter()
+                os.write(self._fd, b"".join(data for data, _ in batch))
+                os.fdatasync(self._fd)
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self._size += sum(len(data) for data, _ in batch)
+                    self.counters["records"] += len(batch)
+                    self.counters["batches"] += 1
+                    self.counters["fsync_seconds"] += elapsed
+                if self._size > max(self.compact_bytes, 2 * self._live_size):
+                    self.compact()
+            except Exception as e:
+                report_error("journal", f"Erreur d'écriture du journal des tickets : {e}")
+            finally:
+                for _, done in batch:
+                    if done is not None:
+                        done.set()
+
+    def compact(self) -> None:
+        """
+        Réécrit le journal avec le seul état courant (tickets non terminés et
+        clés des derniers tickets terminés), puis le remplace atomiquement.
+
+        Appelée au démarrage, puis uniquement par le thread d'écriture.
+        """
+        with self._lock:
+            records = b"".join(
+                self._encode(entry, self._payloads.get(key) if entry["state"] != FINISHED else None)
+                for key, entry in self._entries.items()
+            )
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        directory = os.open(os.path.dirname(self.path), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+        fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CLOEXEC)
+        with self._lock:
+            os.close(self._fd)
+            self._fd = fd
+            self._size = self._live_size = len(records)
+            self.counters["compactions"] += 1
+
+    # ----- Cycle de vie d'un ticket -----
+
+    def accept(
+        self,
+        printer: str,
+        title: str,
+        documents: List[Document],
+        options: Dict[str, str],
+        document_format: str,
+        key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Enregistre un ticket reçu (sur disque au retour de l'appel).
+
+        Args:
+            printer: Imprimante ou groupe demandé
+            title: Titre de la tâche (sans la clé)
+            documents: Liste de tuples (nom_document, contenu)
+            options: Options d'impression
+            document_format: Type MIME des documents
+            key: Clé d'idempotence fournie par le client (générée sinon)
+
+        Returns:
+            Dict: Entrée du journal (key, state...)
+
+        Raises:
+            DuplicateTicket: Un ticket avec cette clé a déjà été reçu
+            JournalUnavailable: Journal non ouvert : le ticket n'est pas enregistré
+        """
+        if not self.available:
+            raise JournalUnavailable(self.error or "Journal des tickets non ouvert")
+        key = key or uuid.uuid4().hex
+        record = {
+            "key": key,
+            "state": ACCEPTED,
+            "printer": printer,
+            "title": title,
+            "options": options,
+            "format": document_format,
+            "accepted_at": time.time()
+        }
+        with self._lock:
+            existing = self._entries.get(key)
+            if existing is not None:
+                self.counters["duplicates"] += 1
+                raise DuplicateTicket(dict(existing))
+            # Entrée réservée sous le même verrou : une requête concurrente avec la même clé est un doublon
+            self._apply(record, documents)
+        try:
+            self._write(self._encode(record, documents))
+        except Exception:
+            with self._lock:
+                self._entries.pop(key, None)
+                self._payloads.pop(key, None)
+            raise
+        return dict(record)
+
+    def submitted(self, key: str, job_id: int, printer: str) -> None:
+        """
+        Enregistre la tâche CUPS créée pour un ticket.
+
+        Une tâche brute courte peut être terminée (et notifiée) avant cet
+        appel : sa fin, gardée par handle_job_event, est alors enregistrée ici.
+        """
+        record = {"key": key, "state": SUBMITTED, "job_id": job_id, "job_printer": printer}
+        data = self._encode(record)
+        with self._lock:
+            self._apply(record, [])
+            result = self._finished_jobs.pop(job_id, None)
+        # Sans attente : si l'enregistrement est perdu, la reprise retrouve la tâche par sa clé
+        self._write(data, wait=False)
+        if result is not None:
+            self.finished(key, result)
+
+    def finished(self, key: str, result: str, message: Optional[str] = None) -> None:
+        """
+        Enregistre la fin d'un ticket.
+
+        Args:
+            key: Clé du ticket
+            result: completed, canceled, aborted, abandoned (erreur renvoyée au client)
+                ou lost (tâche disparue de CUPS pendant l'arrêt du service)
+            message: Détail de l'erreur éventuelle
+        """
+        record = {"key": key, "state": FINISHED, "result": result, "finished_at": time.time()}
+        if message:
+            record["message"] = message
+        self._append(record, wait=False)
+
+    def handle_job_event(self, event: Dict[str, Any]) -> None:
+        """
+        Enregistre la fin des tâches CUPS des tickets (appelée par CupsClient).
+
+        Args:
+            event: Notification CUPS (notify-job-id, job-state...)
+        """
+        result = JOB_FINISHED_STATES.get(event.get("job-state"))
+        if result is None:
+            return
+        job_id = event.get("notify-job-id")
+        with self._lock:
+            key = self._jobs.get(job_id)
+            entry = self._entries.get(key) if key else None
+            if key is None and job_id is not None:
+                # Tâche pas encore associée à un ticket (submitted() à venir) ou hors journal
+                self._finished_jobs[job_id] = result
+                if len(self._finished_jobs) > RECENT_FINISHED_JOBS:
+                    self._finished_jobs.popitem(last=False)
+        if entry is not None and entry["state"] != FINISHED:
+            self.finished(key, result)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Renvoie l'entrée d'un ticket par sa clé."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+
+    # ----- Reprise au démarrage -----
+
+    def recover(
+        self,
+        cups_client: Any,
+        submit: Callable[[str, str, List[Document], Dict[str, str], str], Tuple[int, str]]
+    ) -> Dict[str, Any]:
+        """
+        Rejoue les tickets qui n'étaient pas terminés à l'ouverture du journal.
+
+        Les tickets reçus depuis (en cours de soumission par leur requête)
+        ne sont jamais rejoués, même lors d'une nouvelle tentative.
+
+        - Ticket reçu mais pas soumis : s'il n'existe aucune tâche CUPS
+          portant sa clé, il est renvoyé
+        - Ticket soumis : son état est relu auprès de cupsd ; une tâche
+          disparue de l'historique de CUPS n'est pas renvoyée (elle a pu être
+          imprimée), le ticket est marqué "lost"
+
+        Args:
+            cups_client: Connexion CUPS (CupsClient)
+            submit: Fonction (imprimante, titre avec clé, documents, options, format)
+                renvoyant (identifiant de tâche, imprimante choisie)
+
+        Returns:
+            Dict: Bilan de la reprise (durée, tickets rejoués, renvoyés, retrouvés dans CUPS)
+        """
+        start = time.monotonic()
+        with self._lock:
+            unfinished = [
+                dict(self._entries[key]) for key in self._recoverable
+                if key in self._entries and self._entries[key]["state"] != FINISHED
+            ]
+        report = {
+            "state": "running",
+            "unfinished": len(unfinished),
+            "resubmitted": 0,
+            "found_in_cups": 0,
+            "finished": 0,
+            "lost": 0,
+            "errors": 0
+        }
+        self.recovery = report
+        if unfinished:
+            jobs = cups_client.call("getJobs", which_jobs="all", requested_attributes=["job-id", "job-name", "job-state", "job-printer-uri"])
+            by_key = {}
+            for job_id, attributes in jobs.items():
+                key = key_from_title(attributes.get("job-name", ""))
+                if key:
+                    by_key[key] = (job_id, attributes)
+
+            for entry in unfinished:
+                key = entry["key"]
+                try:
+                    job = by_key.get(key)
+                    if job is None and entry["state"] == SUBMITTED and entry.get("job_id") in jobs:
+                        job = (entry["job_id"], jobs[entry["job_id"]])
+                    if job is not None:
+                        job_id, attributes = job
+                        printer = attributes.get("job-printer-uri", "").rsplit("/", 1)[-1]
+                        if entry["state"] == ACCEPTED or entry.get("job_id") != job_id:
+                            self.submitted(key, job_id, printer)
+                            report["found_in_cups"] += 1
+                        result = JOB_FINISHED_STATES.get(attributes.get("job-state"))
+                        if result is not None:
+                            self.finished(key, result)
+                            report["finished"] += 1
+                        continue
+                    if entry["state"] == SUBMITTED:
+                        self.finished(key, "lost", "Tâche absente de l'historique de CUPS")
+                        report["lost"] += 1
+                        continue
+
+                    with self._lock:
+                        documents = self._payloads.get(key)
+                    if not documents:
+                        self.finished(key, "abandoned", "Contenu du ticket absent du journal")
+                        continue
+                    job_id, printer = submit(
+                        entry["printer"], tag_title(entry["title"], key), documents, entry["options"], entry["format"]
+                    )
+                    self.submitted(key, job_id, printer)
+                    report["resubmitted"] += 1
+                except Exception as e:
+                    report["errors"] += 1
+                    report_error("journal", f"Erreur lors de la reprise du ticket {key} : {e}")
+
+        report["state"] = "done"
+        report["duration"] = round(time.monotonic() - start, 3)
+        report["completed_at"] = time.time()
+        print(
+            f"Journal des tickets : reprise en {report['duration'] * 1000:.0f} ms "
+            f"({report['unfinished']} non terminés, {report['resubmitted']} renvoyés, "
+            f"{report['found_in_cups']} retrouvés dans CUPS)"
+        )
+        return report
+
+    def start_recovery(self, cups_client: Any, submit: Callable[..., Tuple[int, str]], started_at: float) -> None:
+        """
+        Lance la reprise en arrière-plan (nouvelle tentative tant que cupsd ne répond pas).
+
+        Args:
+            cups_client: Connexion CUPS (CupsClient)
+            submit: Voir recover()
+            started_at: Heure de démarrage du service (pour le délai total de reprise)
+        """
+        def run() -> None:
+            while True:
+                try:
+                    report = self.recover(cups_client, submit)
+                    report["since_start"] = round(time.time() - started_at, 3)
+                    return
+                except Exception as e:
+                    self.recovery = {"state": "retrying", "error": str(e)}
+                    report_error("journal", f"Reprise du journal des tickets impossible : {e}")
+                    time.sleep(RECOVERY_RETRY_DELAY)
+
+        threading.Thread(target=run, name="print-journal-recovery", daemon=True).start()
+
+    # ----- État -----
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Renvoie l'état du journal.
+
+        Returns:
+            Dict: Disponibilité (et cause de l'échec de l'ouverture), tickets par
+            état, taille du fichier, compteurs d'écriture et bilan de la reprise
+        """
+        with self._lock:
+            states: Dict[str, int] = {}
+            for entry in self._entries.values():
+                states[entry["state"]] = states.get(entry["state"], 0) + 1
+            counters = dict(self.counters)
+            size = self._size
+            live_size = self._live_size
+        batches = counters["batches"]
+        return {
+            "path": self.path,
+            "available": self.available,
+            "error": self.error,
+            "size_bytes": size,
+            "compact_bytes": self.compact_bytes,
+            "live_bytes": live_size,
+            "tickets": states,
+            "records_per_batch": round(counters["records"] / batches, 2) if batches else None,
+            "fsync_ms": round(counters["fsync_seconds"] / batches * 1000, 2) if batches else None,
+            **{name: round(value, 3) if isinstance(value, float) else value for name, value in counters.items()},
+            "recovery": dict(self.recovery)
+        }
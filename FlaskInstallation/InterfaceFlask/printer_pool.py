@@ -0,0 +1,271 @@
+"""
+TBerryPrint - Groupes d'imprimantes (répartition des tâches)
+
+Un groupe est un nom logique qui désigne plusieurs files CUPS (ex: deux
+TSP700II sur le même Raspberry Pi). Chaque tâche envoyée au groupe part
+vers le membre le moins chargé:
+- Les membres prêts (état 3) passent avant les membres occupés (état 4)
+- À état égal, la file CUPS la plus courte l'emporte
+- Les membres arrêtés (état 5) sont ignorés, et leurs tâches en attente
+  sont déplacées vers les membres disponibles
+- Les membres débranchés (suivi USB) sont ignorés, même si CUPS les voit prêts
+"""
+
+import itertools
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from instrumentation import report_error
+
+# États d'imprimante CUPS
+PRINTER_IDLE = 3
+PRINTER_PROCESSING = 4
+PRINTER_STOPPED = 5
+
+# Tâches déplaçables d'un membre arrêté : en attente (3) ou arrêtées (6)
+MOVABLE_JOB_STATES = (3, 6)
+
+# Tâches comptées dans la longueur d'une file : en attente, retenues, en cours, arrêtées
+ACTIVE_JOB_STATES = (3, 4, 5, 6)
+
+# Adresse des files CUPS locales (pour cups.Connection.moveJob)
+PRINTER_URI = "ipp://localhost/printers/{}"
+
+
+def parse_pools(value: str) -> Dict[str, List[str]]:
+    """
+    Lit la définition des groupes (ex: "caisse:TSP1,TSP2;accueil:TSP3").
+
+    Args:
+        value: Groupes séparés par ";", membres séparés par ","
+
+    Returns:
+        Dict[str, List[str]]: Membres indexés par nom de groupe
+    """
+    pools = {}
+    for definition in value.split(";"):
+        name, _, members = definition.partition(":")
+        members_list = [member.strip() for member in members.split(",") if member.strip()]
+        if name.strip() and members_list:
+            pools[name.strip()] = members_list
+    return pools
+
+
+class NoPrinterAvailable(Exception):
+    """Aucun membre du groupe ne peut recevoir de tâche."""
+
+
+class PrinterPool:
+    """
+    Répartition des tâches entre les membres des groupes d'imprimantes.
+
+    L'état des membres vient du cache de CupsClient ; la longueur des files
+    est lue auprès de cupsd à chaque répartition (une seule requête getJobs).
+    Un groupe automatique (auto_pool) contient toutes les imprimantes USB.
+    """
+
+    def __init__(
+        self,
+        cups_client: Any,
+        pools: Dict[str, List[str]],
+        auto_pool: Optional[str] = None,
+        usb_printers: Optional[Callable[[], List[Any]]] = None,
+        connected: Optional[Callable[[str, Dict[str, Any]], Optional[bool]]] = None
+    ) -> None:
+        self.cups_client = cups_client
+        self.pools = pools
+        self.auto_pool = auto_pool
+        self._usb_printers = usb_printers
+        # Branchement d'une file (nom, attributs des files) : False pour une imprimante débranchée
+        self._connected = connected
+        self._lock = threading.Lock()
+        self._rotation = itertools.count()
+        self._stopped: set = set()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.counters = {"dispatched": 0, "requeued": 0, "requeue_errors": 0}
+
+    def members(self, pool: str) -> Optional[List[str]]:
+        """
+        Renvoie les membres d'un groupe.
+
+        Args:
+            pool: Nom du groupe
+
+        Returns:
+            Optional[List[str]]: Membres, ou None si ce n'est pas un groupe
+        """
+        if pool in self.pools:
+            return list(self.pools[pool])
+        if self.auto_pool and pool == self.auto_pool and self._usb_printers is not None:
+            return [name for name, _ in self._usb_printers()]
+        return None
+
+    def all_members(self) -> set:
+        """Ensemble des imprimantes appartenant à au moins un groupe."""
+        names = set(itertools.chain.from_iterable(self.pools.values()))
+        if self.auto_pool:
+            names.update(self.members(self.auto_pool) or [])
+        return names
+
+    # ----- Répartition -----
+
+    def resolve(self, name: str) -> str:
+        """
+        Choisit l'imprimante qui recevra une tâche.
+
+        Args:
+            name: Nom d'une imprimante ou d'un groupe
+
+        Returns:
+            str: Le nom tel quel pour une imprimante, le membre choisi pour un groupe
+        """
+        members = self.members(name)
+        if members is None:
+            return name
+        printer = self._least_loaded(members)
+        if printer is None:
+            raise NoPrinterAvailable(f"Aucune imprimante disponible dans le groupe {name}")
+        with self._lock:
+            self.counters["dispatched"] += 1
+        return printer
+
+    def _least_loaded(self, members: List[str], exclude: Optional[str] = None) -> Optional[str]:
+        """Membre prêt ou occupé dont la file est la plus courte (départage à tour de rôle)."""
+        printers = self.cups_client.printers()
+        candidates = [
+            member for member in members
+            if member != exclude
+            and printers.get(member, {}).get("printer-state") in (PRINTER_IDLE, PRINTER_PROCESSING)
+            and (self._connected is None or self._connected(member, printers) is not False)
+        ]
+        if not candidates:
+            return None
+        queues = self.queue_lengths()
+        offset = next(self._rotation)
+        ranked = sorted(
+            enumerate(candidates),
+            key=lambda item: (
+                printers[item[1]]["printer-state"] != PRINTER_IDLE,
+                queues.get(item[1], 0),
+                (item[0] - offset) % len(candidates)
+            )
+        )
+        return ranked[0][1]
+
+    def queue_lengths(self) -> Dict[str, int]:
+        """
+        Compte les tâches non terminées de chaque file CUPS.
+
+        Returns:
+            Dict[str, int]: Nombre de tâches indexé par nom d'imprimante
+        """
+        counts: Dict[str, int] = {}
+        for job in self._jobs().values():
+            if job.get("job-state") in ACTIVE_JOB_STATES:
+                printer = job.get("job-printer-uri", "").rsplit("/", 1)[-1]
+                counts[printer] = counts.get(printer, 0) + 1
+        return counts
+
+    def _jobs(self) -> Dict[int, Dict[str, Any]]:
+        """Tâches non terminées de toutes les files."""
+        return self.cups_client.call(
+            "getJobs",
+            which_jobs="not-completed",
+            requested_attributes=["job-id", "job-printer-uri", "job-state"]
+        )
+
+    # ----- Reprise des tâches d'un membre arrêté -----
+
+    def start(self) -> None:
+        """Démarre la surveillance des membres arrêtés."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="printer-pool", daemon=True)
+        self.cups_client.add_listener(lambda event, printer_name: self._wakeup.set())
+        self._thread.start()
+        self._wakeup.set()
+
+    def _run(self) -> None:
+        """Déplace les tâches des membres qui viennent de s'arrêter."""
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.requeue_stopped()
+            except Exception as e:
+                report_error("pool", f"Erreur lors de la reprise des tâches d'un groupe : {e}")
+
+    def requeue_stopped(self) -> int:
+        """
+        Déplace les tâches en attente des membres arrêtés vers les autres membres de leur groupe.
+
+        Returns:
+            int: Nombre de tâches déplacées
+        """
+        printers = self.cups_client.printers()
+        members = self.all_members()
+        stopped = {name for name in members if printers.get(name, {}).get("printer-state") == PRINTER_STOPPED}
+        with self._lock:
+            newly_stopped = stopped - self._stopped
+            self._stopped = stopped
+        if not newly_stopped:
+            return 0
+
+        moved = 0
+        for job_id, job in self._jobs().items():
+            printer = job.get("job-printer-uri", "").rsplit("/", 1)[-1]
+            if printer not in newly_stopped or job.get("job-state") not in MOVABLE_JOB_STATES:
+                continue
+            pool_members = next(
+                (self.members(pool) for pool in self._pools_of(printer)),
+                None
+            )
+            target = self._least_loaded(pool_members or [], exclude=printer)
+            if target is None:
+                continue
+            try:
+                self.cups_client.call("moveJob", job_id=job_id, job_printer_uri=PRINTER_URI.format(target))
+                moved += 1
+                print(f"Tâche {job_id} déplacée de {printer} vers {target}")
+            except Exception as e:
+                with self._lock:
+                    self.counters["requeue_errors"] += 1
+                report_error("pool", f"Erreur lors du déplacement de la tâche {job_id} : {e}")
+        with self._lock:
+            self.counters["requeued"] += moved
+        return moved
+
+    def _pools_of(self, printer: str) -> List[str]:
+        """Groupes dont une imprimante fait partie."""
+        pools = [name for name, members in self.pools.items() if printer in members]
+        if self.auto_pool and printer in (self.members(self.auto_pool) or []):
+            pools.append(self.auto_pool)
+        return pools
+
+    # ----- État -----
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Renvoie l'état des groupes : membres, état et longueur de file de chacun.
+
+        Returns:
+            Dict: Groupes et compteurs (dispatched, requeued, requeue_errors)
+        """
+        printers = self.cups_client.printers()
+        queues = self.queue_lengths()
+        names = list(self.pools) + ([self.auto_pool] if self.auto_pool else [])
+        pools = {
+            name: [
+                {
+                    "name": member,
+                    "state": printers.get(member, {}).get("printer-state"),
+                    "queue": queues.get(member, 0)
+                }
+                for member in self.members(name) or []
+            ]
+            for name in names
+        }
+        with self._lock:
+            return {"pools": pools, **self.counters}
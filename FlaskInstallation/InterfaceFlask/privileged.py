@@ -0,0 +1,128 @@
+"""
+TBerryPrint - Client du service d'assistance privilégié
+
+Les opérations de fonctions.sh sont demandées au service root
+(FlaskInstallation/privileged_helper.py) via sa socket Unix. Si le service
+n'est pas disponible, l'appel retombe sur "sudo fonctions.sh".
+
+Les opérations longues (ex: apt_upgrade) peuvent transmettre leur sortie
+ligne par ligne pendant leur exécution (paramètre on_line).
+"""
+
+import json
+import os
+import socket
+import subprocess
+import time
+from typing import Callable, Optional
+
+from instrumentation import record_command, run_command
+
+# Socket du service d'assistance
+HELPER_SOCKET = os.environ.get("HELPER_SOCKET", "/run/tberryprint/helper.sock")
+
+# Script de repli lorsque le service n'est pas joignable
+FONCTIONS_SH = os.environ.get("FONCTIONS_SH", "/opt/TBERRYPRINT/fonctions.sh")
+
+
+class HelperUnavailable(Exception):
+    """Le service d'assistance n'est pas joignable."""
+
+
+def _connect(timeout: Optional[float]) -> socket.socket:
+    """Ouvre une connexion vers le service d'assistance."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    try:
+        client.connect(HELPER_SOCKET)
+    except OSError as e:
+        client.close()
+        raise HelperUnavailable(str(e))
+    return client
+
+def _request(op: str, args: tuple, timeout: Optional[float], on_line: Optional[Callable[[str], None]] = None) -> dict:
+    """Envoie une requête au service et renvoie sa réponse (après les lignes transmises à on_line)."""
+    client = _connect(timeout)
+    message = {"op": op, "args": list(args)}
+    if on_line is not None:
+        message["stream"] = True
+    try:
+        client.sendall((json.dumps(message) + "\n").encode())
+        with client.makefile("r", encoding="utf-8") as reader:
+            for raw in reader:
+                response = json.loads(raw)
+                if "line" not in response:
+                    return response
+                on_line(response["line"])
+    finally:
+        client.close()
+    raise HelperUnavailable("Connexion fermée par le service d'assistance")
+
+def run_privileged(
+    op: str,
+    *args: str,
+    check: bool = False,
+    timeout: Optional[float] = None,
+    on_line: Optional[Callable[[str], None]] = None
+) -> subprocess.CompletedProcess:
+    """
+    Exécute une opération privilégiée de fonctions.sh.
+
+    Args:
+        op: Nom de l'opération (ex: "wifi_iwconfig")
+        args: Arguments de l'opération
+        check: Lève CalledProcessError si le code de retour est non nul
+        timeout: Délai maximal en secondes (None pour attendre la fin)
+        on_line: Fonction appelée pour chaque ligne de sortie pendant l'exécution
+            (les sorties standard et d'erreur sont alors fusionnées dans stdout)
+
+    Returns:
+        subprocess.CompletedProcess: Résultat (returncode, stdout, stderr)
+    """
+    start = time.perf_counter()
+    try:
+        response = _request(op, args, timeout, on_line)
+        if not response.get("ok"):
+            raise RuntimeError(response.get("error", "Erreur du service d'assistance"))
+        result = subprocess.CompletedProcess(
+            [op, *args], response["returncode"], response.get("stdout", ""), response.get("stderr", "")
+        )
+    except HelperUnavailable:
+        result = _run_fallback(op, args, timeout, on_line)
+    except Exception:
+        record_command(f"helper:{op}", time.perf_counter() - start, None)
+        raise
+    else:
+        record_command(f"helper:{op}", time.perf_counter() - start, result.returncode)
+
+    if check:
+        result.check_returncode()
+    return result
+
+def _run_fallback(
+    op: str,
+    args: tuple,
+    timeout: Optional[float],
+    on_line: Optional[Callable[[str], None]] = None
+) -> subprocess.CompletedProcess:
+    """Exécute l'opération via "sudo fonctions.sh" (service d'assistance absent)."""
+    command = ["sudo", FONCTIONS_SH, op, *args]
+    if on_line is None:
+        return run_command(command, name=f"sudo:{op}", capture_output=True, text=True, timeout=timeout)
+
+    start = time.perf_counter()
+    output = []
+    returncode = None
+    try:
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True) as process:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            for line in process.stdout:
+                output.append(line)
+                on_line(line.rstrip("\n"))
+                if deadline is not None and time.monotonic() > deadline:
+                    process.kill()
+                    raise subprocess.TimeoutExpired(command, timeout)
+            returncode = process.wait()
+    finally:
+        record_command(f"sudo:{op}", time.perf_counter() - start, returncode)
+    return subprocess.CompletedProcess(command, returncode, "".join(output), "")
@@ -0,0 +1,102 @@
+"""
+TBerryPrint - Collecte parallèle des données des pages
+
+Les pages (tableau de bord, configuration Wi-Fi) réunissent plusieurs
+sondes : échantillon système, imprimantes, adresse IP, statut Wi-Fi...
+Ce module les exécute en parallèle, chacune avec son délai maximal:
+- La page est rendue avec les sondes terminées à temps
+- Une sonde en retard est remplacée par une valeur d'attente (complétée
+  ensuite par le navigateur via /stats ou /api/wifi_networks)
+- Une sonde encore bloquée n'est pas relancée : l'appel suivant attend
+  la même exécution au lieu d'en empiler une nouvelle
+- La durée de chaque sonde est journalisée et exportée par /metrics
+"""
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Tuple
+
+from instrumentation import ERRORS, REGISTRY
+
+# Sonde : (fonction, délai maximal en secondes, valeur d'attente)
+Probe = Tuple[Callable[[], Any], float, Any]
+
+PROBE_DURATION = REGISTRY.histogram(
+    "tberryprint_page_probe_duration_seconds",
+    "Durée des sondes de collecte des pages",
+    ("page", "probe")
+)
+PROBE_LATE = REGISTRY.counter(
+    "tberryprint_page_probe_late_total",
+    "Sondes remplacées par une valeur d'attente (délai dépassé ou erreur)",
+    ("page", "probe")
+)
+
+
+class ProbeRunner:
+    """
+    Exécution parallèle de sondes avec délai par sonde.
+
+    Le temps de rendu d'une page est borné par le plus long des délais, et
+    non par la somme des durées des sondes.
+    """
+
+    def __init__(self, max_workers: int = 8) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe")
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+
+    def gather(self, page: str, probes: Dict[str, Probe]) -> Dict[str, Any]:
+        """
+        Exécute les sondes d'une page et attend chacune au plus son délai.
+
+        Args:
+            page: Nom de la page (journal et métriques)
+            probes: Sondes indexées par nom
+
+        Returns:
+            Dict[str, Any]: Résultat de chaque sonde, ou sa valeur d'attente
+        """
+        start = time.monotonic()
+        futures = {name: self._submit(page, name, probe[0]) for name, probe in probes.items()}
+
+        results: Dict[str, Any] = {}
+        report = []
+        # Les sondes aux délais les plus courts sont attendues en premier
+        for name, (_, timeout, placeholder) in sorted(probes.items(), key=lambda item: item[1][1]):
+            remaining = max(0.0, start + timeout - time.monotonic())
+            try:
+                results[name], duration = futures[name].result(timeout=remaining)
+                report.append(f"{name} {duration * 1000:.0f} ms")
+            except FutureTimeout:
+                results[name] = placeholder
+                PROBE_LATE.inc(page=page, probe=name)
+                report.append(f"{name} en retard (> {timeout:g} s)")
+            except Exception as e:
+                results[name] = placeholder
+                PROBE_LATE.inc(page=page, probe=name)
+                ERRORS.inc(component="probes")
+                report.append(f"{name} en erreur ({e})")
+        print(f"Sondes {page} ({(time.monotonic() - start) * 1000:.0f} ms) : {', '.join(report)}")
+        return results
+
+    def _submit(self, page: str, name: str, function: Callable[[], Any]) -> Future:
+        """Lance une sonde, ou renvoie son exécution encore en cours."""
+        key = (page, name)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None and not future.done():
+                return future
+            future = self._executor.submit(self._measure, page, name, function)
+            self._inflight[key] = future
+            return future
+
+    @staticmethod
+    def _measure(page: str, name: str, function: Callable[[], Any]) -> Tuple[Any, float]:
+        """Exécute une sonde et renvoie son résultat avec sa durée."""
+        start = time.perf_counter()
+        try:
+            return function(), time.perf_counter() - start
+        finally:
+            PROBE_DURATION.observe(time.perf_counter() - start, page=page, probe=name)
@@ -0,0 +1,331 @@
+"""
+TBerryPrint - Cache des documents déjà convertis pour l'imprimante
+
+Les mêmes documents (test d'impression, modèles de billets, logos) sont
+imprimés en boucle, et CUPS relance à chaque fois toute la chaîne de filtres
+(ghostscript puis rastertostar). Ce module conserve sur disque le flux final
+prêt à envoyer à l'imprimante, indexé par:
+- L'empreinte du contenu du document
+- Les options d'impression (ex: media=Custom.80x120mm, Density=5)
+- L'empreinte du PPD de l'imprimante
+
+Un document déjà converti est envoyé comme tâche brute, sans aucun filtre.
+Un document absent du cache suit la chaîne de filtres habituelle de CUPS ;
+il n'est converti (en arrière-plan) que lorsqu'il revient une deuxième fois,
+pour que les billets uniques ne chassent pas les documents répétés. La
+taille du cache est bornée : les entrées les moins récemment utilisées sont
+supprimées en premier.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import queue
+import resource
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, BinaryIO, Callable, Dict, Optional, Set, Tuple, Union
+
+from cups_client import FORMAT_AUTO
+from instrumentation import report_error, run_command
+
+# En-tête de chaque entrée : signature et temps CPU de la conversion (secondes)
+ENTRY_HEADER = struct.Struct("4sd")
+ENTRY_MAGIC = b"TBPR"
+ENTRY_SUFFIX = ".prn"
+
+# Délai maximal d'une conversion par cupsfilter (secondes)
+RENDER_TIMEOUT = 120
+
+# Documents déjà vus une fois (empreintes) : un document est mis en cache à sa deuxième impression
+SEEN_MAX_KEYS = 4096
+
+# Conversions en attente au-delà desquelles les nouvelles demandes sont ignorées
+RENDER_QUEUE_SIZE = 16
+
+Source = Union[str, bytes]
+
+
+class RasterCache:
+    """
+    Cache disque LRU des flux prêts à imprimer.
+
+    Les conversions sont faites par un thread unique, hors des requêtes :
+    sur un Raspberry Pi, deux ghostscript en parallèle ne vont pas plus
+    vite, et un même document en attente de conversion n'est mis en file
+    qu'une fois.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int,
+        ppd_for: Callable[[str], Optional[bytes]],
+        temp_dir: Optional[str] = None
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.temp_dir = temp_dir
+        self._ppd_for = ppd_for
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, float]]" = OrderedDict()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._pending: Set[str] = set()
+        self._queue: "queue.Queue[Tuple[str, Source, Dict[str, str], str, str, bytes]]" = queue.Queue(RENDER_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._total_bytes = 0
+        self.available = shutil.which("cupsfilter") is not None
+        self.counters = {
+            "hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "renders": 0,
+            "render_failures": 0,
+            "render_dropped": 0,
+            "evictions": 0,
+            "render_cpu_seconds": 0.0,
+            "cpu_saved_seconds": 0.0
+        }
+        os.makedirs(os.path.join(self.directory, "ppd"), exist_ok=True)
+        self._load()
+
+    def _load(self) -> None:
+        """Reconstruit l'index à partir des fichiers présents (ordre LRU = date de modification)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "rb") as f:
+                    magic, cpu_seconds = ENTRY_HEADER.unpack(f.read(ENTRY_HEADER.size))
+                stat = os.stat(path)
+            except (OSError, struct.error):
+                magic = None
+            if magic != ENTRY_MAGIC:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+                continue
+            entries.append((stat.st_mtime, name[:-len(ENTRY_SUFFIX)], stat.st_size, cpu_seconds))
+
+        for _, key, size, cpu_seconds in sorted(entries):
+            self._entries[key] = {"size": size, "cpu_seconds": cpu_seconds}
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    # ----- Consultation -----
+
+    def lookup(
+        self,
+        printer: str,
+        source: Source,
+        options: Dict[str, str],
+        document_format: str = FORMAT_AUTO
+    ) -> Optional[BinaryIO]:
+        """
+        Renvoie le flux prêt à imprimer d'un document déjà converti.
+
+        Ne convertit jamais pendant l'appel : un document absent du cache est
+        mis en file de conversion s'il a déjà été vu, et l'appelant le fait
+        passer par la chaîne de filtres habituelle.
+
+        Args:
+            printer: Nom de la file CUPS (pour son PPD)
+            source: Chemin du document ou son contenu (non modifié ensuite)
+            options: Options d'impression qui influencent la conversion
+            document_format: Type MIME du document
+
+        Returns:
+            Optional[BinaryIO]: Fichier ouvert et positionné après l'en-tête
+            (à fermer par l'appelant), ou None si le document doit suivre la
+            chaîne de filtres habituelle
+        """
+        ppd = self._ppd_for(printer) if self.available else None
+        if ppd is None:
+            with self._lock:
+                self.counters["bypassed"] += 1
+            return None
+
+        ppd_digest = hashlib.sha256(ppd).hexdigest()
+        key = self._key(source, options, document_format, ppd_digest)
+        entry = self._open(key, count_hit=True)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            self.counters["misses"] += 1
+            if key in self._pending:
+                return None
+            if key not in self._seen:
+                # Première impression : on s'en souvient, sans convertir
+                self._seen[key] = None
+                if len(self._seen) > SEEN_MAX_KEYS:
+                    self._seen.popitem(last=False)
+                return None
+            del self._seen[key]
+            try:
+                self._queue.put_nowait((key, source, dict(options), document_format, ppd_digest, ppd))
+            except queue.Full:
+                self.counters["render_dropped"] += 1
+                return None
+            self._pending.add(key)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="raster-cache", daemon=True)
+                self._thread.start()
+        return None
+
+    @staticmethod
+    def _key(source: Source, options: Dict[str, str], document_format: str, ppd_digest: str) -> str:
+        """Empreinte du document, des options et du PPD."""
+        digest = hashlib.sha256()
+        if isinstance(source, bytes):
+            digest.update(source)
+        else:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        settings = json.dumps({"options": options, "format": document_format, "ppd": ppd_digest}, sort_keys=True)
+        digest.update(b"\0" + settings.encode())
+        return digest.hexdigest()
+
+    def _open(self, key: str, count_hit: bool) -> Optional[BinaryIO]:
+        """Ouvre une entrée du cache et la marque comme la plus récemment utilisée."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            try:
+                f = open(self._path(key), "rb")
+            except FileNotFoundError:
+                # Fichier supprimé hors du service : on oublie l'entrée
+                self._total_bytes -= entry["size"]
+                del self._entries[key]
+                return None
+            f.seek(ENTRY_HEADER.size)
+            self._entries.move_to_end(key)
+            if count_hit:
+                self.counters["hits"] += 1
+                self.counters["cpu_saved_seconds"] += entry["cpu_seconds"]
+        # La date de modification conserve l'ordre LRU après un redémarrage
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(f.name)
+        return f
+
+    # ----- Conversion -----
+
+    def _run(self) -> None:
+        """Boucle de conversion des documents mis en file par lookup()."""
+        while True:
+            key, source, options, document_format, ppd_digest, ppd = self._queue.get()
+            try:
+                self._render(key, source, options, document_format, self._ppd_path(ppd_digest, ppd))
+            except Exception as e:
+                report_error("raster_cache", f"Erreur lors de la conversion pour le cache raster : {e}")
+                with self._lock:
+                    self.counters["render_failures"] += 1
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def _ppd_path(self, ppd_digest: str, ppd: bytes) -> str:
+        """Écrit le PPD (une fois par version) pour cupsfilter."""
+        path = os.path.join(self.directory, "ppd", ppd_digest + ".ppd")
+        if not os.path.exists(path):
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+                f.write(ppd)
+            os.replace(f.name, path)
+        return path
+
+    def _render(
+        self,
+        key: str,
+        source: Source,
+        options: Dict[str, str],
+        document_format: str,
+        ppd_path: str
+    ) -> None:
+        """Convertit un document avec cupsfilter et l'ajoute au cache (thread de conversion)."""
+        with tempfile.TemporaryDirectory(dir=self.temp_dir, prefix="tberry-raster-") as work_dir:
+            if isinstance(source, bytes):
+                # Document reçu en mémoire : copie sur tmpfs pour cupsfilter
+                input_path = os.path.join(work_dir, "document")
+                with open(input_path, "wb") as f:
+                    f.write(source)
+            else:
+                input_path = source
+
+            command = ["cupsfilter", "-p", ppd_path, "-m", "printer/foo"]
+            if document_format != FORMAT_AUTO:
+                command += ["-i", document_format]
+            for name, value in sorted(options.items()):
+                command += ["-o", f"{name}={value}"]
+            command.append(input_path)
+
+            output_path = os.path.join(work_dir, "output")
+            before = resource.getrusage(resource.RUSAGE_CHILDREN)
+            with open(output_path, "wb") as output:
+                result = run_command(
+                    command, stdout=output, stderr=subprocess.PIPE, text=True, timeout=RENDER_TIMEOUT
+                )
+            after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            if result.returncode != 0 or os.path.getsize(output_path) == 0:
+                raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "cupsfilter a échoué")
+            cpu_seconds = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+
+            with tempfile.NamedTemporaryFile(dir=self.directory, delete=False) as f:
+                f.write(ENTRY_HEADER.pack(ENTRY_MAGIC, cpu_seconds))
+                with open(output_path, "rb") as output:
+                    shutil.copyfileobj(output, f)
+            size = os.path.getsize(f.name)
+            os.replace(f.name, self._path(key))
+
+        with self._lock:
+            self._entries[key] = {"size": size, "cpu_seconds": cpu_seconds}
+            self._total_bytes += size
+            self.counters["renders"] += 1
+            self.counters["render_cpu_seconds"] += cpu_seconds
+            self._evict()
+
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées au-delà de la taille maximale (verrou détenu)."""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry["size"]
+            self.counters["evictions"] += 1
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(self._path(key))
+
+    # ----- Statistiques -----
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Renvoie l'état du cache.
+
+        Returns:
+            Dict: Compteurs (hits, misses, bypassed, conversions, evictions),
+            temps CPU de conversion et temps CPU économisé, nombre et taille
+            des entrées, conversions en attente
+        """
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                "available": self.available,
+                "entries": len(self._entries),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "pending": len(self._pending),
+                "hit_ratio": round(self.counters["hits"] / lookups, 3) if lookups else None,
+                **{name: round(value, 3) if isinstance(value, float) else value for name, value in self.counters.items()},
+                "timestamp": time.time()
+            }
+
@@ -0,0 +1,330 @@
+"""
+TBerryPrint - Mode de service en production
+
+Ce module fournit:
+- Un serveur WSGI multi-thread (cheroot) avec un nombre borné de workers
+  et le maintien des connexions HTTP/1.1 (keep-alive)
+- Le service des fichiers statiques (CSS, JS, favicon) avec ETag, mise en
+  cache longue durée et versions précompressées en gzip
+- L'intégration à systemd : activation par socket (le port accepte les
+  connexions pendant le démarrage du processus), notification de
+  disponibilité (sd_notify) et jalons du démarrage mesurés depuis la mise
+  sous tension
+- L'import différé des modules coûteux (cups, psutil) jusqu'à leur première utilisation
+"""
+
+import gzip
+import hashlib
+import importlib
+import mimetypes
+import os
+import socket
+import sys
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, Optional
+
+from flask import Flask, Response, abort, request
+from werkzeug.security import safe_join
+
+# Durée de cache des fichiers statiques versionnés (un an) et non versionnés (5 minutes)
+STATIC_MAX_AGE_VERSIONED = 365 * 24 * 3600
+STATIC_MAX_AGE_DEFAULT = 300
+
+# Taille minimale d'un fichier statique pour le précompresser
+GZIP_MIN_SIZE = 1024
+
+# Premier descripteur transmis par l'activation par socket (SD_LISTEN_FDS_START)
+SD_LISTEN_FDS_START = 3
+
+
+class StaticAsset:
+    """Fichier statique chargé en mémoire, avec sa version gzip éventuelle."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.body = f.read()
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.version = hashlib.sha1(self.body).hexdigest()[:12]
+        self.etag = self.version
+        self.gzip_body: Optional[bytes] = None
+        if len(self.body) >= GZIP_MIN_SIZE:
+            compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+            # Inutile de servir une version compressée qui ne fait pas gagner au moins 10 %
+            if len(compressed) < len(self.body) * 0.9:
+                self.gzip_body = compressed
+
+
+class StaticAssets:
+    """
+    Remplace la vue "static" de Flask par une version servie depuis la mémoire.
+
+    Les URL générées par url_for('static', ...) reçoivent un paramètre "v"
+    (empreinte du contenu) : elles peuvent être mises en cache un an, et
+    changent dès que le fichier change.
+    """
+
+    def __init__(self, app: Flask) -> None:
+        self.folder = app.static_folder
+        self._assets: Dict[str, Optional[StaticAsset]] = {}
+        app.view_functions["static"] = self.serve
+        app.url_defaults(self.add_version)
+
+    def get(self, filename: str) -> Optional[StaticAsset]:
+        """
+        Renvoie un fichier statique (chargé et compressé au premier accès).
+
+        Args:
+            filename: Chemin relatif au dossier static
+
+        Returns:
+            Optional[StaticAsset]: Le fichier, ou None s'il n'existe pas
+        """
+        if filename not in self._assets:
+            path = safe_join(self.folder, filename)
+            self._assets[filename] = StaticAsset(path) if path and os.path.isfile(path) else None
+        return self._assets[filename]
+
+    def add_version(self, endpoint: str, values: Dict[str, str]) -> None:
+        """Ajoute l'empreinte du contenu aux URL des fichiers statiques."""
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            asset = self.get(values["filename"])
+            if asset is not None:
+                values["v"] = asset.version
+
+    def serve(self, filename: str) -> Response:
+        """Vue des fichiers statiques : ETag, cache et négociation gzip."""
+        asset = self.get(filename)
+        if asset is None:
+            abort(404)
+
+        use_gzip = asset.gzip_body is not None and "gzip" in request.accept_encodings
+        etag = f"{asset.etag}-gz" if use_gzip else asset.etag
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(asset.gzip_body if use_gzip else asset.body, mimetype=asset.mimetype)
+            if use_gzip:
+                response.headers["Content-Encoding"] = "gzip"
+        response.set_etag(etag)
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        if request.args.get("v") == asset.version:
+            response.cache_control.max_age = STATIC_MAX_AGE_VERSIONED
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.max_age = STATIC_MAX_AGE_DEFAULT
+        return response
+
+
+class _LazyModule(types.ModuleType):
+    """Module importé au premier accès à l'un de ses attributs."""
+
+    def __getattr__(self, attribute: str) -> Any:
+        module = importlib.import_module(self.__name__)
+        # Les accès suivants lisent directement les attributs du module réel
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+    Renvoie un module dont l'import est différé jusqu'au premier accès à un attribut.
+
+    Args:
+        name: Nom du module (ex: "psutil")
+
+    Returns:
+        types.ModuleType: Le module s'il est déjà chargé, sinon un module différé
+    """
+    return sys.modules.get(name) or _LazyModule(name)
+
+
+def systemd_listen_socket() -> Optional[socket.socket]:
+    """
+    Récupère la socket d'écoute transmise par systemd (InterfaceFlask.socket).
+
+    Les variables LISTEN_* sont retirées de l'environnement : elles ne
+    concernent que ce processus, pas les commandes qu'il lance ensuite.
+
+    Returns:
+        Optional[socket.socket]: Socket déjà à l'écoute, ou None sans activation par socket
+    """
+    pid = os.environ.pop("LISTEN_PID", "")
+    count = os.environ.pop("LISTEN_FDS", "")
+    os.environ.pop("LISTEN_FDNAMES", None)
+    if pid != str(os.getpid()) or not count.isdigit() or int(count) < 1:
+        return None
+    try:
+        listen_socket = socket.socket(fileno=SD_LISTEN_FDS_START)
+    except OSError:
+        return None
+    if listen_socket.type != socket.SOCK_STREAM:
+        # Unité mal configurée (ListenDatagram...) : on écoute soi-même
+        listen_socket.detach()
+        return None
+    listen_socket.set_inheritable(False)
+    return listen_socket
+
+
+def sd_notify(*fields: str) -> bool:
+    """
+    Envoie un état au gestionnaire de service (protocole sd_notify, sans libsystemd).
+
+    Args:
+        fields: Affectations à transmettre (ex: "READY=1", "STATUS=...")
+
+    Returns:
+        bool: True si le message a été envoyé (service lancé par systemd avec Type=notify)
+    """
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        # Socket de l'espace de noms abstrait
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM | socket.SOCK_CLOEXEC) as client:
+            client.connect(address)
+            client.sendall("\n".join(fields).encode())
+    except OSError:
+        return False
+    return True
+
+
+def since_boot() -> float:
+    """Secondes écoulées depuis le démarrage du système (mise en veille comprise)."""
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+
+def process_start_since_boot() -> float:
+    """Heure de lancement du processus, en secondes depuis le démarrage du système (/proc/self/stat)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Le nom du programme (2e champ) peut contenir des espaces : lecture après la parenthèse
+            fields = f.read().rsplit(")", 1)[1].split()
+        # Champ 22 (starttime), en tops d'horloge ; fields[0] est le 3e champ
+        return int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return since_boot()
+
+
+class StartupTimer:
+    """
+    Jalons du démarrage du service, en secondes depuis le démarrage du système.
+
+    L'horloge part de l'amorçage du noyau : le jalon "first_dashboard" donne
+    directement le délai entre un redémarrage et la première page servie.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.process_start = process_start_since_boot()
+        # Heure (horloge murale) de lancement du processus
+        self.started_at = time.time() - (since_boot() - self.process_start)
+        self._phases: Dict[str, float] = {"process_start": self.process_start}
+
+    def mark(self, phase: str) -> bool:
+        """
+        Enregistre un jalon (seul le premier passage compte).
+
+        Args:
+            phase: Nom du jalon (ex: "listening", "ready", "first_dashboard")
+
+        Returns:
+            bool: True si le jalon vient d'être atteint
+        """
+        if phase in self._phases:
+            return False
+        with self._lock:
+            if phase in self._phases:
+                return False
+            self._phases[phase] = since_boot()
+            return True
+
+    def reached(self, phase: str) -> bool:
+        """Indique si un jalon a été atteint."""
+        return phase in self._phases
+
+    def phases(self) -> Dict[str, float]:
+        """Jalons atteints, en secondes depuis le démarrage du système."""
+        with self._lock:
+            return {name: round(value, 3) for name, value in self._phases.items()}
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Jalons depuis le démarrage du système et depuis le lancement du processus.
+
+        Returns:
+            Dict: since_boot et since_process_start (secondes par jalon)
+        """
+        phases = self.phases()
+        return {
+            "since_boot": phases,
+            "since_process_start": {name: round(value - self.process_start, 3) for name, value in phases.items()}
+        }
+
+
+def serve(
+    app: Flask,
+    host: str,
+    port: int,
+    threads: int,
+    keepalive_timeout: float,
+    listen_socket: Optional[socket.socket] = None,
+    on_ready: Optional[Callable[[], None]] = None
+) -> None:
+    """
+    Lance l'application avec un serveur WSGI de production.
+
+    Args:
+        app: Application Flask
+        host: Adresse d'écoute
+        port: Port d'écoute
+        threads: Nombre de workers (borné)
+        keepalive_timeout: Délai d'inactivité avant fermeture d'une connexion (secondes)
+        listen_socket: Socket déjà à l'écoute (activation par socket) ; host et port sont alors ignorés
+        on_ready: Fonction appelée dès que le serveur accepte les requêtes
+    """
+    try:
+        from cheroot import wsgi
+    except ImportError:
+        print("cheroot n'est pas installé (python3-cheroot) : utilisation du serveur Werkzeug multi-thread")
+        from werkzeug.serving import make_server
+        server = make_server(
+            host, port, app, threaded=True, fd=listen_socket.fileno() if listen_socket is not None else None
+        )
+        if on_ready is not None:
+            on_ready()
+        server.serve_forever()
+        return
+
+    class Server(wsgi.Server):
+        def bind(self, family: int, type: int, proto: int = 0) -> socket.socket:
+            if listen_socket is None:
+                return super().bind(family, type, proto)
+            # Socket transmise par systemd : déjà liée, elle est reprise telle quelle, avec
+            # TCP_NODELAY comme les sockets de cheroot (héritée par les connexions acceptées)
+            if self.nodelay:
+                listen_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.socket = listen_socket
+            return listen_socket
+
+    server = Server(
+        listen_socket.getsockname()[:2] if listen_socket is not None else (host, port),
+        app,
+        numthreads=threads,
+        max=threads,
+        request_queue_size=64,
+        timeout=int(keepalive_timeout),
+        server_name="tberryprint"
+    )
+    try:
+        server.prepare()
+        if on_ready is not None:
+            on_ready()
+        server.serve()
+    except KeyboardInterrupt:
+        server.stop()
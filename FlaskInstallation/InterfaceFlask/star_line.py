@@ -0,0 +1,418 @@
+"""
+TBerryPrint - Rendu des tickets en Star Line Mode
+
+Les tickets décrits de façon structurée (lignes de texte, code-barres, QR
+code, logo) sont traduits directement en commandes Star Line Mode pour la
+TSP700II, puis envoyés à CUPS comme tâche brute. On évite ainsi la chaîne
+PDF -> ghostscript -> raster -> rastertostar, qui rastérise toute la page.
+
+Les commandes d'initialisation et de largeur imprimable sont celles de
+CupsInstallation/rastertostar/rastertostar.c. La commande de densité
+(ESC RS d) n'est envoyée que si le ticket la demande ("density", de 0 à 6,
+3 = standard) : rastertostar ne l'envoie qu'aux TSP828L, TSP651/654,
+HSP7000R et FVP10, et tsp700II.ppd n'a pas d'option de densité. Sans elle,
+la TSP700II garde son réglage, comme pour les tickets PDF.
+
+Exemple de ticket:
+    {
+        "width": 80,
+        "cut": "partial",
+        "items": [
+            {"type": "logo", "name": "logo.pbm"},
+            {"type": "text", "text": "BILLET", "bold": true, "size": 2, "align": "center"},
+            {"type": "separator"},
+            {"type": "barcode", "data": "0123456789", "symbology": "code128"},
+            {"type": "qr", "data": "https://exemple.fr/billet/42"},
+            {"type": "feed", "lines": 2}
+        ]
+    }
+
+Un lot de tickets ({"cut": "partial", "tickets": [...]}) est traduit en une
+seule tâche : l'imprimante n'est initialisée qu'une fois, et chaque ticket
+garde sa propre coupe ("cut" du ticket, sinon celle du lot).
+"""
+
+import functools
+import os
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+ESC = b"\x1b"
+GS = b"\x1d"
+RS = b"\x1e"
+LF = b"\n"
+
+# Commandes reprises de rastertostar.c
+PRINTER_INITIALIZE = ESC + b"@"
+PRINT_DENSITY = [ESC + b"\x1e" + b"d" + bytes([ord("6") - index]) for index in range(7)]  # -3 ... +3 (TSP828L)
+RASTER_MODE_START = ESC + b"*rR" + ESC + b"*rA"
+RASTER_MODE_END = ESC + b"*rB"
+RASTER_NO_CUT = ESC + b"*rF1\x00" + ESC + b"*rE1\x00"
+RASTER_RECEIPT_PAGE = ESC + b"*rP0\x00"
+
+# Largeur du papier (mm) -> (argument de la commande ESC RS A pour la TSP700II, octets par ligne raster)
+PAPER_WIDTHS = {
+    80: (0x02, 80),
+    72: (0x00, 72)
+}
+
+# Page de code Windows-1252 (ESC GS t 32) : accents français et symbole euro
+CODE_PAGE = ESC + GS + b"t\x20"
+ENCODING = "cp1252"
+
+# Largeur d'un caractère de la police A, en points
+FONT_A_WIDTH = 12
+
+ALIGNMENTS = {"left": 0, "center": 1, "right": 2}
+
+# Coupe en fin de ticket (avance jusqu'à la position de coupe, puis coupe)
+CUTS = {"none": b"", "partial": ESC + b"d\x03", "full": ESC + b"d\x02"}
+
+# Symbologies (ESC b n1 ...) et caractères acceptés
+BARCODES = {
+    "ean13": (b"3", "0123456789"),
+    "code39": (b"4", "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ -.$/+%"),
+    "itf": (b"5", "0123456789"),
+    "code128": (b"6", None),
+    "code93": (b"7", None)
+}
+
+QR_ERROR_CORRECTION = {"L": 0, "M": 1, "Q": 2, "H": 3}
+
+MAX_EXPANSION = 6
+MAX_FEED_LINES = 20
+
+
+class TicketError(ValueError):
+    """Description de ticket invalide."""
+
+
+# ===== LOGOS =====
+
+def _read_pbm(path: str) -> Tuple[int, int, bytes]:
+    """
+    Lit une image PBM binaire (P4) : une ligne = bits de gauche à droite, 1 = noir.
+
+    Returns:
+        Tuple[int, int, bytes]: Largeur, hauteur et lignes de pixels
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    fields = []
+    position = 0
+    while len(fields) < 3:
+        while data[position:position + 1].isspace():
+            position += 1
+        if data[position:position + 1] == b"#":
+            position = data.index(b"\n", position) + 1
+            continue
+        start = position
+        while not data[position:position + 1].isspace():
+            position += 1
+        fields.append(data[start:position])
+    if fields[0] != b"P4":
+        raise TicketError("Seules les images PBM binaires (P4) sont lues sans Pillow")
+    width, height = int(fields[1]), int(fields[2])
+    pixels = data[position + 1:]
+    if len(pixels) < (width + 7) // 8 * height:
+        raise TicketError("Image PBM tronquée")
+    return width, height, pixels
+
+def _read_image(path: str) -> Tuple[int, int, bytes]:
+    """Lit une image avec Pillow (PNG, BMP...) et la convertit en noir et blanc."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise TicketError("Pillow (python3-pil) est nécessaire pour les logos autres que PBM")
+    with Image.open(path) as image:
+        # Mode "1" de Pillow : 1 = blanc ; on inverse pour obtenir 1 = noir
+        image = ImageOps.invert(image.convert("L")).convert("1")
+        return image.width, image.height, image.tobytes()
+
+@functools.lru_cache(maxsize=16)
+def _encode_logo(path: str, mtime_ns: int, line_bytes: int, alignment: int) -> bytes:
+    """
+    Encode un logo en lignes raster (commandes "b n1 n2 d1...dk" de rastertostar).
+
+    Le résultat est mis en cache : la clé inclut la date de modification du
+    fichier, un logo modifié est donc relu automatiquement.
+    """
+    if path.lower().endswith(".pbm"):
+        width, height, pixels = _read_pbm(path)
+    else:
+        width, height, pixels = _read_image(path)
+
+    row_bytes = (width + 7) // 8
+    if row_bytes > line_bytes:
+        raise TicketError(f"Logo trop large ({width} points, maximum {line_bytes * 8})")
+    margin = (line_bytes - row_bytes) * alignment // 2
+    prefix = bytes(margin)
+
+    lines = [RASTER_MODE_START, RASTER_RECEIPT_PAGE, RASTER_NO_CUT]
+    for row in range(height):
+        data = (prefix + pixels[row * row_bytes:(row + 1) * row_bytes]).rstrip(b"\x00")
+        lines.append(b"b" + len(data).to_bytes(2, "little") + data)
+    lines.append(RASTER_MODE_END)
+    return b"".join(lines)
+
+
+# ===== RENDU =====
+
+class StarLineRenderer:
+    """
+    Traduit un ticket structuré en commandes Star Line Mode.
+
+    Les logos sont lus dans un répertoire dédié et gardés en mémoire sous
+    forme de lignes raster déjà encodées.
+    """
+
+    def __init__(self, logo_dir: str) -> None:
+        self.logo_dir = logo_dir
+
+    def render(self, ticket: Dict[str, Any], initialize: bool = True) -> bytes:
+        """
+        Génère les commandes d'impression d'un ticket.
+
+        Args:
+            ticket: Description du ticket (width, density, cut, items)
+            initialize: Commencer par la réinitialisation de l'imprimante
+                (ESC @) ; inutile pour les tickets suivants d'un lot
+
+        Returns:
+            bytes: Données à envoyer telles quelles à l'imprimante
+        """
+        if not isinstance(ticket, dict):
+            raise TicketError("Le ticket doit être un objet JSON")
+        width = self._integer(ticket.get("width", 80), "width")
+        if width not in PAPER_WIDTHS:
+            raise TicketError(f"Largeur de papier non prise en charge : {width}")
+        width_argument, line_bytes = PAPER_WIDTHS[width]
+        density = ticket.get("density")
+        if density is not None:
+            density = self._integer(density, "density")
+            if not 0 <= density < len(PRINT_DENSITY):
+                raise TicketError("density doit être compris entre 0 et 6")
+        cut = ticket.get("cut", "partial")
+        if cut not in CUTS:
+            raise TicketError(f"Coupe inconnue : {cut}")
+        items = ticket.get("items")
+        if not isinstance(items, list) or not items:
+            raise TicketError("Le ticket doit contenir une liste d'éléments (items)")
+
+        output = [
+            PRINTER_INITIALIZE if initialize else b"",
+            ESC + b"\x1e" + b"A" + bytes([width_argument]),
+            PRINT_DENSITY[density] if density is not None else b"",
+            CODE_PAGE
+        ]
+        columns = line_bytes * 8 // FONT_A_WIDTH
+        for item in items:
+            output.append(self._render_item(item, line_bytes, columns))
+        output.append(CUTS[cut])
+        return b"".join(output)
+
+    def _render_item(self, item: Dict[str, Any], line_bytes: int, columns: int) -> bytes:
+        """Génère les commandes d'un élément du ticket."""
+        if not isinstance(item, dict):
+            raise TicketError("Chaque élément doit être un objet JSON")
+        kind = item.get("type", "text")
+        alignment = ALIGNMENTS.get(item.get("align", "left"))
+        if alignment is None:
+            raise TicketError(f"Alignement inconnu : {item.get('align')}")
+        align = ESC + GS + b"a" + bytes([alignment])
+
+        if kind == "text":
+            return align + self._render_text(item)
+        if kind == "separator":
+            char = str(item.get("char", "-"))[:1] or "-"
+            return align + (char * columns).encode(ENCODING, errors="replace") + LF
+        if kind == "feed":
+            lines = self._integer(item.get("lines", 1), "lines")
+            return LF * max(0, min(lines, MAX_FEED_LINES))
+        if kind == "barcode":
+            return align + self._render_barcode(item)
+        if kind == "qr":
+            return align + self._render_qr(item)
+        if kind == "logo":
+            return self._render_logo(item, line_bytes, alignment)
+        raise TicketError(f"Type d'élément inconnu : {kind}")
+
+    def _render_text(self, item: Dict[str, Any]) -> bytes:
+        """Texte (une ou plusieurs lignes) avec gras, soulignement et agrandissement."""
+        size = item.get("size", 1)
+        if isinstance(size, list) and len(size) == 2:
+            size_width, size_height = (self._integer(value, "size") for value in size)
+        else:
+            size_width = size_height = self._integer(size, "size")
+        if not (1 <= size_width <= MAX_EXPANSION and 1 <= size_height <= MAX_EXPANSION):
+            raise TicketError(f"size doit être compris entre 1 et {MAX_EXPANSION}")
+
+        bold = bool(item.get("bold"))
+        underline = bool(item.get("underline"))
+        text = str(item.get("text", ""))
+
+        output = [ESC + b"i" + bytes([size_height - 1, size_width - 1])]
+        if bold:
+            output.append(ESC + b"E")
+        if underline:
+            output.append(ESC + b"-\x01")
+        output.append(text.encode(ENCODING, errors="replace").replace(b"\r\n", LF) + LF)
+        if underline:
+            output.append(ESC + b"-\x00")
+        if bold:
+            output.append(ESC + b"F")
+        output.append(ESC + b"i\x00\x00")
+        return b"".join(output)
+
+    def _render_barcode(self, item: Dict[str, Any]) -> bytes:
+        """Code-barres 1D (ESC b), avec ou sans texte lisible en dessous."""
+        symbology = item.get("symbology", "code128")
+        if symbology not in BARCODES:
+            raise TicketError(f"Symbologie inconnue : {symbology}")
+        code, charset = BARCODES[symbology]
+        data = str(item.get("data", ""))
+        if not data or not data.isascii() or (charset and any(char not in charset for char in data)):
+            raise TicketError(f"Données invalides pour un code-barres {symbology}")
+        height = self._integer(item.get("height", 60), "height")
+        if not 1 <= height <= 255:
+            raise TicketError("height doit être compris entre 1 et 255")
+        module = self._integer(item.get("module", 2), "module")
+        if not 1 <= module <= 3:
+            raise TicketError("module doit être compris entre 1 et 3")
+        hri = b"2" if item.get("hri", True) else b"1"
+        return ESC + b"b" + code + hri + str(module).encode() + bytes([height]) + data.encode() + RS
+
+    def _render_qr(self, item: Dict[str, Any]) -> bytes:
+        """QR code (modèle 2) stocké puis imprimé par l'imprimante."""
+        data = str(item.get("data", "")).encode("utf-8")
+        if not data or len(data) > 7089:
+            raise TicketError("Données invalides pour un QR code")
+        cell = self._integer(item.get("size", 4), "size")
+        if not 1 <= cell <= 8:
+            raise TicketError("size doit être compris entre 1 et 8 pour un QR code")
+        ecc = QR_ERROR_CORRECTION.get(str(item.get("ecc", "M")).upper())
+        if ecc is None:
+            raise TicketError(f"Niveau de correction inconnu : {item.get('ecc')}")
+        return b"".join([
+            ESC + GS + b"yS0\x02",
+            ESC + GS + b"yS1" + bytes([ecc]),
+            ESC + GS + b"yS2" + bytes([cell]),
+            ESC + GS + b"yD1\x00" + len(data).to_bytes(2, "little") + data,
+            ESC + GS + b"yP",
+            LF
+        ])
+
+    def _render_logo(self, item: Dict[str, Any], line_bytes: int, alignment: int) -> bytes:
+        """Logo lu dans le répertoire des logos (encodage mis en cache)."""
+        name = str(item.get("name", ""))
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise TicketError(f"Nom de logo invalide : {name!r}")
+        path = os.path.join(self.logo_dir, name)
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            raise TicketError(f"Logo introuvable : {name}")
+        return _encode_logo(path, mtime_ns, line_bytes, alignment)
+
+    @staticmethod
+    def _integer(value: Any, field: str) -> int:
+        """Convertit un champ numérique du ticket."""
+        if isinstance(value, bool):
+            raise TicketError(f"{field} doit être un entier")
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise TicketError(f"{field} doit être un entier")
+
+
+
+# ===== LOTS DE TICKETS =====
+
+def parse_batch(batch: Any, max_tickets: int) -> Tuple[List[Any], str]:
+    """
+    Vérifie la forme d'un lot de tickets (le contenu de chaque ticket est vérifié au rendu).
+
+    Args:
+        batch: {"cut": ..., "tickets": [...]} ou directement la liste des tickets
+        max_tickets: Nombre maximal de tickets
+
+    Returns:
+        Tuple[List, str]: Tickets et coupe par défaut du lot
+    """
+    if isinstance(batch, list):
+        batch = {"tickets": batch}
+    if not isinstance(batch, dict):
+        raise TicketError("Le lot doit être un objet JSON ou une liste de tickets")
+    tickets = batch.get("tickets")
+    if not isinstance(tickets, list) or not tickets:
+        raise TicketError("Le lot doit contenir une liste de tickets (tickets)")
+    if len(tickets) > max_tickets:
+        raise TicketError(f"Lot limité à {max_tickets} tickets")
+    cut = batch.get("cut", "partial")
+    if cut not in CUTS:
+        raise TicketError(f"Coupe inconnue : {cut}")
+    return tickets, cut
+
+
+class TicketBatchStream:
+    """
+    Flux binaire d'un lot de tickets, rendu au fur et à mesure de sa lecture.
+
+    CupsClient.submit_stream lit ce flux bloc par bloc : chaque ticket est
+    traduit juste avant son envoi à cupsd, au lieu de préparer tout le lot
+    en mémoire. Un ticket invalide est ignoré et signalé dans results.
+    """
+
+    def __init__(self, renderer: StarLineRenderer, tickets: List[Any], cut: str = "partial") -> None:
+        self.renderer = renderer
+        self.tickets = tickets
+        self.cut = cut
+        self.results: List[Dict[str, Any]] = []
+        self.render_seconds = 0.0
+        self._pages: Iterator[bytes] = self._render_pages()
+        self._pending = b""
+        self._initialized = False
+
+    @property
+    def printed(self) -> int:
+        """Nombre de tickets valides (envoyés à l'imprimante)."""
+        return sum(1 for result in self.results if result["success"])
+
+    def prime(self) -> None:
+        """
+        Rend les tickets jusqu'au premier ticket valide.
+
+        Appelée avant la création de la tâche CUPS : un lot entièrement
+        invalide est refusé sans créer de tâche vide.
+        """
+        while not self._pending:
+            try:
+                self._pending = next(self._pages)
+            except StopIteration:
+                raise TicketError("Aucun ticket valide dans le lot")
+
+    def read(self, size: int = -1) -> bytes:
+        """Renvoie au plus size octets : le reste du ticket en cours, ou le ticket suivant."""
+        if not self._pending:
+            self._pending = next(self._pages, b"")
+        if size is None or size < 0:
+            size = len(self._pending)
+        chunk, self._pending = self._pending[:size], self._pending[size:]
+        return chunk
+
+    def _render_pages(self) -> Iterator[bytes]:
+        """Traduit les tickets un par un, en notant le résultat de chacun."""
+        for index, ticket in enumerate(self.tickets):
+            start = time.perf_counter()
+            try:
+                if isinstance(ticket, dict) and "cut" not in ticket:
+                    ticket = dict(ticket, cut=self.cut)
+                data = self.renderer.render(ticket, initialize=not self._initialized)
+            except TicketError as e:
+                self.results.append({"index": index, "success": False, "message": str(e)})
+                continue
+            finally:
+                self.render_seconds += time.perf_counter() - start
+            self._initialized = True
+            self.results.append({"index": index, "success": True, "bytes": len(data), "cut": ticket.get("cut")})
+            yield data
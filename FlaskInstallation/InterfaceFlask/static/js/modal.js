@@ -153,4 +153,94 @@ function setupWifi() {
             button.style.opacity = 1;
         });
     });
-}
\ No newline at end of file
+}
+
+
+// ===== SUIVI DES TÂCHES DE MAINTENANCE ===== \\
+
+const TASK_POLLING_INTERVAL = 1000;
+
+// Interroge /api/tasks/<id> jusqu'à la fin de la tâche.
+// onLines reçoit les nouvelles lignes de journal, onDone la tâche terminée.
+function pollTask(taskId, onLines, onDone, onError) {
+    let since = 0;
+    
+    function poll() {
+        fetch(`/api/tasks/${taskId}?since=${since}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Tâche introuvable (HTTP ${response.status})`);
+                }
+                return response.json();
+            })
+            .then(task => {
+                since = task.next;
+                if (task.lines.length > 0) {
+                    onLines(task.lines);
+                }
+                if (task.state === 'running') {
+                    setTimeout(poll, TASK_POLLING_INTERVAL);
+                } else {
+                    onDone(task);
+                }
+            })
+            .catch(error => onError(error));
+    }
+    
+    poll();
+}
+
+// Lance une tâche (route POST) et renvoie la réponse JSON : {task_id} ou {message}
+function startTask(url, formData) {
+    return fetch(url, {
+        method: 'POST',
+        headers: { 'Accept': 'application/json' },
+        body: formData
+    }).then(response => response.json());
+}
+
+function appendTaskLog(element, lines) {
+    element.textContent += lines.join('\n') + '\n';
+    element.scrollTop = element.scrollHeight;
+}
+
+// Mise à jour du système avec affichage de la progression dans la modale
+function startUpdate() {
+    const content = document.querySelector('#updateModal .modal-content');
+    const buttons = document.querySelectorAll('#updateModal .modal-actions button');
+    buttons.forEach(button => {
+        button.disabled = true;
+        button.style.opacity = 0.5;
+    });
+    
+    content.innerHTML = `
+        <p><i class="fas fa-spinner fa-spin"></i> Mise à jour en cours...</p>
+        <pre class="task-log"></pre>
+    `;
+    const log = content.querySelector('.task-log');
+    
+    function finish(message, success) {
+        content.querySelector('p').innerHTML = success
+            ? `<i class="fas fa-check-circle" style="color: #2ecc71;"></i> ${message}`
+            : `<i class="fas fa-exclamation-circle" style="color: var(--danger);"></i> ${message}`;
+        buttons[0].disabled = false;
+        buttons[0].style.opacity = 1;
+        buttons[0].textContent = 'Fermer';
+    }
+    
+    startTask('/update')
+        .then(data => {
+            if (!data.task_id) {
+                throw new Error(data.message || 'Erreur inconnue');
+            }
+            // Une mise à jour déjà en cours (409) est suivie de la même manière
+            pollTask(
+                data.task_id,
+                lines => appendTaskLog(log, lines),
+                task => finish(task.message, task.state === 'succeeded'),
+                // Le redémarrage coupe la connexion : on considère la mise à jour terminée
+                error => finish(`Connexion perdue (${error.message}). Le système redémarre peut-être.`, false)
+            );
+        })
+        .catch(error => finish(error.message, false));
+}
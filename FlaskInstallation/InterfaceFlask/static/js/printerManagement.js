@@ -69,7 +69,7 @@ function testPrinter(printerName) {
     .then(response => response.json())
     .then(data => {
         if (data.success) {
-            alert('Test d\'impression lancé avec succès');
+            alert(`Test d'impression lancé avec succès (tâche n°${data.job_id})`);
         } else {
             alert('Erreur lors du test d\'impression: ' + data.message);
         }
@@ -80,6 +80,28 @@ function testPrinter(printerName) {
     });
 }
 
+// Formatage d'une durée en secondes (ex: "850 ms", "3.2 s", "2 min")
+function formatDuration(seconds) {
+    if (seconds === null || seconds === undefined) return '-';
+    if (seconds < 1) return `${Math.round(seconds * 1000)} ms`;
+    if (seconds < 60) return `${seconds.toFixed(1)} s`;
+    return `${Math.round(seconds / 60)} min`;
+}
+
+// Résumé des tâches d'une imprimante : file, latences et débit
+function formatPrinterJobs(jobs) {
+    if (!jobs) return '';
+    const parts = [`File : ${jobs.active}`];
+    if (jobs.oldest_age !== null) parts.push(`plus ancienne ${formatDuration(jobs.oldest_age)}`);
+    if (jobs.completed > 0) {
+        parts.push(`p50 ${formatDuration(jobs.p50)}`);
+        parts.push(`p95 ${formatDuration(jobs.p95)}`);
+        parts.push(`p99 ${formatDuration(jobs.p99)}`);
+    }
+    parts.push(`${jobs.jobs_per_minute} tâche(s)/min`);
+    return `<div class="stat-label printer-jobs">${parts.join(' · ')}</div>`;
+}
+
 // Fonction de mise à jour des imprimantes
 function updatePrinterStatus(printers) {
     const container = document.getElementById('printers-container');
@@ -101,6 +123,7 @@ function updatePrinterStatus(printers) {
                 <div>
                     <div class="stat-value">${printer.name}</div>
                     <div class="stat-label">${printer.status_text}</div>
+                    ${formatPrinterJobs(printer.jobs)}
                 </div>
                 <div class="printer-actions">
                     <button onclick="showPrinterMenu('${printer.name}')" class="btn-icon">
@@ -1,3 +1,25 @@
+// Intervalle du mode de secours par interrogation (ms)
+const STATS_POLLING_INTERVAL = 5000;
+// Délai avant une nouvelle tentative de connexion au flux (ms)
+const STATS_STREAM_RETRY_DELAY = 30000;
+
+let statsPollingTimer = null;
+
+// Fonction pour appliquer les statistiques reçues (complètes ou partielles)
+function applyStats(data) {
+    // Mise à jour CPU et RAM : seuls les champs présents sont modifiés
+    ['temperature', 'cpu_percent', 'ram_used', 'ram_percent'].forEach(stat => {
+        if (data[stat] !== undefined) {
+            document.querySelector(`.stat-value[data-stat="${stat}"]`).textContent = data[stat];
+        }
+    });
+
+    // Mise à jour des imprimantes
+    if (data.printers !== undefined) {
+        updatePrinterStatus(data.printers);
+    }
+}
+
 // Fonction pour mettre à jour les statistiques
 function updateStats() {
     fetch('/stats')
@@ -7,20 +29,47 @@ function updateStats() {
             }
             return response.json();
         })
-        .then(data => {
-            // Mise à jour CPU et RAM existante
-            document.querySelector('.stat-value[data-stat="temperature"]').textContent = data.temperature;
-            document.querySelector('.stat-value[data-stat="cpu_percent"]').textContent = data.cpu_percent;
-            document.querySelector('.stat-value[data-stat="ram_used"]').textContent = data.ram_used;
-            document.querySelector('.stat-value[data-stat="ram_percent"]').textContent = data.ram_percent;
-            
-            // Mise à jour des imprimantes
-            updatePrinterStatus(data.printers);
-        })
+        .then(applyStats)
         .catch(error => {
             console.error('Error fetching stats:', error);
         });
 }
 
-// Mise à jour les stats toutes les 5 secondes
-setInterval(updateStats, 5000);
\ No newline at end of file
+// Mode de secours : mise à jour des stats toutes les 5 secondes
+function startStatsPolling() {
+    if (statsPollingTimer === null) {
+        updateStats();
+        statsPollingTimer = setInterval(updateStats, STATS_POLLING_INTERVAL);
+    }
+}
+
+function stopStatsPolling() {
+    if (statsPollingTimer !== null) {
+        clearInterval(statsPollingTimer);
+        statsPollingTimer = null;
+    }
+}
+
+// Flux SSE : le serveur pousse uniquement les champs modifiés
+function connectStatsStream() {
+    if (!window.EventSource) {
+        startStatsPolling();
+        return;
+    }
+
+    const source = new EventSource('/stats/stream');
+
+    source.onmessage = event => {
+        stopStatsPolling();
+        applyStats(JSON.parse(event.data));
+    };
+
+    source.onerror = () => {
+        // Repli sur l'interrogation périodique, puis nouvelle tentative plus tard
+        source.close();
+        startStatsPolling();
+        setTimeout(connectStatsStream, STATS_STREAM_RETRY_DELAY);
+    };
+}
+
+connectStatsStream();
@@ -51,6 +51,7 @@ const TEMPLATES = {
         <div style="text-align: center; margin: 2rem 0;">
             <i class="fas fa-spinner fa-spin" style="font-size: 2rem; color: var(--primary);"></i>
         </div>
+        <pre class="task-log"></pre>
     `,
     CONNECTED_STATUS: (status) => `
         <div class="current-connection">
@@ -124,15 +125,15 @@ function toggleLoadingButtons(modalId, isLoading) {
 
 // ===== FONCTIONS PRINCIPALES ===== \\
 
-function fetchWifiNetworks() {
+function fetchWifiNetworks(forceRefresh = false) {
     const refreshBtn = getElement(DOM_IDS.REFRESH_BTN);
     
     // Afficher l'icône de chargement
     refreshBtn.classList.add('spinning');
     setElementHTML(DOM_IDS.NETWORKS_LIST, TEMPLATES.LOADING);
     
-    // Récupérer les réseaux depuis l'API
-    fetch(API_ENDPOINTS.WIFI_NETWORKS)
+    // Récupérer les réseaux depuis l'API (le bouton d'actualisation force un nouveau scan)
+    fetch(forceRefresh ? `${API_ENDPOINTS.WIFI_NETWORKS}?refresh=1` : API_ENDPOINTS.WIFI_NETWORKS)
         .then(response => {
             if (!response.ok) {
                 throw new Error('Network response was not ok');
@@ -252,35 +253,44 @@ function connectToWifi(ssid, password, isAlreadyConnected) {
         ? API_ENDPOINTS.SETUP_WIFI_CONNECTED 
         : API_ENDPOINTS.SETUP_WIFI;
     
-    // Envoyer la requête
-    fetch(endpoint, {
-        method: 'POST',
-        body: formData
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.success) {
-            hideModal(DOM_IDS.WIFI_PASSWORD_MODAL);
-            showModal(DOM_IDS.WIFI_CONFIRMATION_MODAL);
-        } else {
-            // Afficher un message d'erreur dans la modale
-            document.querySelector(`#${DOM_IDS.WIFI_PASSWORD_MODAL} ${MODAL_SELECTORS.CONTENT}`).innerHTML = 
-                TEMPLATES.CONNECTION_ERROR(ssid, data.message);
-            
-            // Réactiver les boutons
-            toggleLoadingButtons(DOM_IDS.WIFI_PASSWORD_MODAL, false);
-        }
-    })
-    .catch(error => {
-        console.error('Error:', error);
-        
+    const showError = (message) => {
         // Afficher un message d'erreur dans la modale
         document.querySelector(`#${DOM_IDS.WIFI_PASSWORD_MODAL} ${MODAL_SELECTORS.CONTENT}`).innerHTML = 
-            TEMPLATES.CONNECTION_ERROR(ssid, error.message || 'Erreur inconnue');
+            TEMPLATES.CONNECTION_ERROR(ssid, message);
         
         // Réactiver les boutons
         toggleLoadingButtons(DOM_IDS.WIFI_PASSWORD_MODAL, false);
-    });
+    };
+    
+    // Lancer la connexion (tâche en arrière-plan), puis suivre sa progression
+    startTask(endpoint, formData)
+        .then(data => {
+            if (!data.task_id) {
+                showError(data.message);
+                return;
+            }
+            const log = document.querySelector(`#${DOM_IDS.WIFI_PASSWORD_MODAL} .task-log`);
+            pollTask(
+                data.task_id,
+                lines => appendTaskLog(log, lines),
+                task => {
+                    if (task.state === 'succeeded') {
+                        hideModal(DOM_IDS.WIFI_PASSWORD_MODAL);
+                        showModal(DOM_IDS.WIFI_CONFIRMATION_MODAL);
+                    } else {
+                        showError(task.message);
+                    }
+                },
+                error => {
+                    console.error('Error:', error);
+                    showError(error.message || 'Erreur inconnue');
+                }
+            );
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            showError(error.message || 'Erreur inconnue');
+        });
 }
 
 
@@ -291,5 +301,5 @@ document.addEventListener('DOMContentLoaded', function() {
     fetchWifiNetworks();
     
     // Configurer le bouton d'actualisation
-    getElement(DOM_IDS.REFRESH_BTN).addEventListener('click', fetchWifiNetworks);
+    getElement(DOM_IDS.REFRESH_BTN).addEventListener('click', () => fetchWifiNetworks(true));
 });
\ No newline at end of file
@@ -0,0 +1,189 @@
+"""
+TBerryPrint - Tâches de maintenance en arrière-plan
+
+Les opérations longues (mise à jour du système, changement de réseau Wi-Fi,
+redémarrage) ne s'exécutent plus dans la requête HTTP:
+- La route lance la tâche et renvoie aussitôt son identifiant
+- La tâche tourne dans son propre thread et journalise sa progression
+- /api/tasks/<id> renvoie l'état et les lignes de journal (par morceaux)
+- Une seule tâche d'un même groupe tourne à la fois (ex: deux mises à jour)
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from instrumentation import report_error
+
+# États d'une tâche
+TASK_RUNNING = "running"
+TASK_SUCCEEDED = "succeeded"
+TASK_FAILED = "failed"
+
+# Lignes de journal conservées par tâche (les plus anciennes sont oubliées)
+MAX_TASK_LINES = 2000
+
+
+class TaskAlreadyRunning(Exception):
+    """Une tâche du même groupe est déjà en cours."""
+
+    def __init__(self, task: "Task") -> None:
+        super().__init__(f"Une tâche {task.kind} est déjà en cours")
+        self.task = task
+
+
+class TaskFailed(Exception):
+    """Échec attendu d'une tâche : le message est affiché tel quel à l'utilisateur."""
+
+
+class Task:
+    """Une tâche de maintenance : état, journal et résultat."""
+
+    def __init__(self, kind: str, group: str) -> None:
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.group = group
+        self.state = TASK_RUNNING
+        self.message = ""
+        self.result: Dict[str, Any] = {}
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._lines: Deque[str] = deque(maxlen=MAX_TASK_LINES)
+        self._line_count = 0
+
+    def log(self, line: str) -> None:
+        """
+        Ajoute une ligne au journal de la tâche.
+
+        Args:
+            line: Ligne de progression (sortie d'une commande, étape...)
+        """
+        with self._lock:
+            self._lines.append(line.rstrip("\n"))
+            self._line_count += 1
+
+    def finish(self, state: str, message: str) -> None:
+        """Termine la tâche."""
+        with self._lock:
+            self.state = state
+            self.message = message
+            self.finished_at = time.time()
+
+    @property
+    def running(self) -> bool:
+        return self.state == TASK_RUNNING
+
+    def to_dict(self, since: int = 0) -> Dict[str, Any]:
+        """
+        Renvoie l'état de la tâche et les lignes de journal à partir d'un rang.
+
+        Args:
+            since: Rang de la première ligne voulue (valeur "next" de l'appel précédent)
+
+        Returns:
+            Dict: État, message, résultat, lignes et rang de la prochaine ligne
+        """
+        with self._lock:
+            first = self._line_count - len(self._lines)
+            lines = list(self._lines)[max(0, since - first):]
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "state": self.state,
+                "message": self.message,
+                "result": self.result,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "lines": lines,
+                "next": self._line_count
+            }
+
+
+class TaskRunner:
+    """
+    Exécution des tâches de maintenance, une tâche par thread.
+
+    Les tâches terminées restent consultables (dans une liste bornée) pour
+    que le navigateur récupère leur résultat après coup.
+    """
+
+    def __init__(self, max_finished: int = 20) -> None:
+        self.max_finished = max_finished
+        self._lock = threading.Lock()
+        self._tasks: "OrderedDict[str, Task]" = OrderedDict()
+        self._running: Dict[str, Task] = {}
+
+    def submit(
+        self,
+        kind: str,
+        target: Callable[..., Optional[Dict[str, Any]]],
+        *args: Any,
+        group: Optional[str] = None
+    ) -> Task:
+        """
+        Lance une tâche en arrière-plan.
+
+        Args:
+            kind: Type de tâche (ex: "update", "wifi")
+            target: Fonction exécutée, appelée avec la tâche puis args ; elle
+                renvoie le résultat (dict) ou lève TaskFailed
+            args: Arguments de la fonction
+            group: Groupe d'exclusion (défaut : le type de tâche)
+
+        Returns:
+            Task: La tâche lancée
+
+        Raises:
+            TaskAlreadyRunning: Une tâche du même groupe est déjà en cours
+        """
+        task = Task(kind, group or kind)
+        with self._lock:
+            current = self._running.get(task.group)
+            if current is not None:
+                raise TaskAlreadyRunning(current)
+            self._running[task.group] = task
+            self._tasks[task.id] = task
+            self._trim()
+        threading.Thread(target=self._run, args=(task, target, args), name=f"task-{kind}", daemon=True).start()
+        return task
+
+    def _run(self, task: Task, target: Callable[..., Optional[Dict[str, Any]]], args: tuple) -> None:
+        """Exécute une tâche et enregistre son issue."""
+        try:
+            task.result = target(task, *args) or {}
+            task.finish(TASK_SUCCEEDED, task.result.get("message", "Terminé"))
+        except TaskFailed as e:
+            task.finish(TASK_FAILED, str(e))
+        except Exception as e:
+            report_error("tasks", f"Erreur dans la tâche {task.kind} : {e}")
+            task.finish(TASK_FAILED, str(e))
+        finally:
+            with self._lock:
+                self._running.pop(task.group, None)
+
+    def _trim(self) -> None:
+        """Oublie les tâches terminées les plus anciennes (verrou détenu)."""
+        finished = [task_id for task_id, task in self._tasks.items() if not task.running]
+        for task_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._tasks[task_id]
+
+    def get(self, task_id: str) -> Optional[Task]:
+        """
+        Renvoie une tâche par son identifiant.
+
+        Args:
+            task_id: Identifiant renvoyé au lancement
+
+        Returns:
+            Optional[Task]: La tâche, ou None si elle est inconnue
+        """
+        with self._lock:
+            return self._tasks.get(task_id)
+
+    def running(self) -> Dict[str, Task]:
+        """Tâches en cours, indexées par groupe."""
+        with self._lock:
+            return dict(self._running)
@@ -0,0 +1,356 @@
+"""
+TBerryPrint - Télémétrie matérielle sans sous-processus
+
+Ce module lit directement les interfaces du noyau, sans lancer de commande:
+- Températures : /sys/class/thermal/thermal_zone*/temp
+- Bridage et sous-tension : get_throttled du firmware (sysfs, sinon la
+  boîte aux lettres /dev/vcio)
+- Utilisation CPU par cœur : différences entre deux lectures de /proc/stat
+- Qualité du lien Wi-Fi : /proc/net/wireless
+- Adresse IPv4 et SSID d'une interface : ioctl SIOCGIFADDR / SIOCGIWESSID
+- Interface de la route par défaut : /proc/net/route
+
+Les fichiers sont ouverts une seule fois et relus avec os.pread : une
+lecture coûte quelques microsecondes, contre plusieurs millisecondes pour
+un fork de vcgencmd ou de iwconfig.
+"""
+
+import array
+import fcntl
+import glob
+import os
+import socket
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Zones thermiques du noyau (la première est le SoC sur Raspberry Pi)
+THERMAL_ZONES = "/sys/class/thermal/thermal_zone*"
+
+# Valeur get_throttled du firmware (noyaux Raspberry Pi OS récents)
+THROTTLED_PATHS = (
+    "/sys/devices/platform/soc/soc:firmware/get_throttled",
+    "/sys/devices/platform/firmware/get_throttled"
+)
+
+# Boîte aux lettres du VideoCore (repli si get_throttled n'est pas exposé)
+VCIO_PATH = "/dev/vcio"
+IOCTL_MBOX_PROPERTY = 0xC0046400 if struct.calcsize("P") == 4 else 0xC0086400
+TAG_GET_THROTTLED = 0x00030046
+
+# Bits de get_throttled (état courant, puis « s'est produit depuis le démarrage »)
+THROTTLED_FLAGS = {
+    0: "under_voltage",
+    1: "frequency_capped",
+    2: "throttled",
+    3: "soft_temperature_limit",
+    16: "under_voltage_occurred",
+    17: "frequency_capped_occurred",
+    18: "throttled_occurred",
+    19: "soft_temperature_limit_occurred"
+}
+
+PROC_STAT = "/proc/stat"
+PROC_NET_WIRELESS = "/proc/net/wireless"
+PROC_NET_ROUTE = "/proc/net/route"
+
+# ioctl réseau (voir <linux/sockios.h> et <linux/wireless.h>)
+SIOCGIFADDR = 0x8915
+SIOCGIWESSID = 0x8B1B
+IFNAMSIZ = 16
+IW_ESSID_MAX_SIZE = 32
+
+# Taille maximale lue dans un fichier de sysfs ou de procfs
+READ_SIZE = 64 * 1024
+
+
+class CachedFile:
+    """Fichier de sysfs/procfs ouvert une fois et relu depuis le début à chaque lecture."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def read(self) -> Optional[str]:
+        """
+        Relit le contenu du fichier.
+
+        Returns:
+            Optional[str]: Contenu, ou None si le fichier n'existe pas ou n'est pas lisible
+        """
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._fd is None:
+                        self._fd = os.open(self.path, os.O_RDONLY | os.O_CLOEXEC)
+                    return os.pread(self._fd, READ_SIZE, 0).decode("ascii", "replace")
+                except OSError:
+                    # Descripteur invalidé (ex: interface recréée) : une seule réouverture
+                    self._close()
+                    if attempt == 1:
+                        return None
+        return None
+
+    def _close(self) -> None:
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+
+class Telemetry:
+    """
+    Lectures matérielles du Raspberry Pi, sans fork.
+
+    Chaque méthode renvoie None lorsque l'information n'est pas disponible
+    (ex: pas de zone thermique dans un conteneur) : l'appelant garde alors
+    son ancienne méthode en repli.
+    """
+
+    def __init__(self) -> None:
+        self._files: Dict[str, CachedFile] = {}
+        self._lock = threading.Lock()
+        self._zones: Optional[List[Tuple[str, CachedFile]]] = None
+        self._throttled_file: Optional[CachedFile] = None
+        self._throttled_probed = False
+        self._vcio_fd: Optional[int] = None
+        self._previous_stat: Optional[Dict[str, Tuple[int, int]]] = None
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _file(self, path: str) -> CachedFile:
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is None:
+                cached = self._files[path] = CachedFile(path)
+            return cached
+
+    # ----- Températures -----
+
+    def thermal_zones(self) -> Dict[str, float]:
+        """
+        Lit toutes les zones thermiques.
+
+        Returns:
+            Dict[str, float]: Température en °C indexée par type de zone (ex: "cpu-thermal")
+        """
+        if self._zones is None:
+            zones = []
+            for path in sorted(glob.glob(THERMAL_ZONES)):
+                zone_type = (self._file(os.path.join(path, "type")).read() or os.path.basename(path)).strip()
+                zones.append((zone_type, self._file(os.path.join(path, "temp"))))
+            self._zones = zones
+        temperatures = {}
+        for zone_type, temp_file in self._zones:
+            raw = temp_file.read()
+            if raw and raw.strip().lstrip("-").isdigit():
+                temperatures[zone_type] = int(raw) / 1000
+        return temperatures
+
+    def temperature(self) -> Optional[float]:
+        """
+        Température du SoC (première zone thermique).
+
+        Returns:
+            Optional[float]: Température en °C, ou None si aucune zone n'est disponible
+        """
+        zones = self.thermal_zones()
+        return next(iter(zones.values()), None)
+
+    # ----- Bridage et sous-tension -----
+
+    def throttled(self) -> Optional[int]:
+        """
+        Valeur brute de get_throttled (sysfs, sinon boîte aux lettres du VideoCore).
+
+        Returns:
+            Optional[int]: Champ de bits (voir THROTTLED_FLAGS), ou None si indisponible
+        """
+        if not self._throttled_probed:
+            path = next((path for path in THROTTLED_PATHS if os.path.exists(path)), None)
+            self._throttled_file = self._file(path) if path else None
+            self._throttled_probed = True
+        raw = self._throttled_file.read() if self._throttled_file is not None else None
+        if raw is not None:
+            try:
+                return int(raw.strip(), 16)
+            except ValueError:
+                pass
+        return self._mailbox_throttled()
+
+    def _mailbox_throttled(self) -> Optional[int]:
+        """Demande get_throttled au firmware via /dev/vcio (ioctl de propriété)."""
+        try:
+            if self._vcio_fd is None:
+                self._vcio_fd = os.open(VCIO_PATH, os.O_RDWR | os.O_CLOEXEC)
+            # Taille, requête, étiquette, taille du tampon, taille de la valeur, valeur, fin
+            buffer = array.array("I", [7 * 4, 0, TAG_GET_THROTTLED, 4, 0, 0, 0])
+            fcntl.ioctl(self._vcio_fd, IOCTL_MBOX_PROPERTY, buffer, True)
+            return buffer[5]
+        except OSError:
+            return None
+
+    def throttled_flags(self) -> Optional[Dict[str, bool]]:
+        """
+        Décode get_throttled.
+
+        Returns:
+            Optional[Dict[str, bool]]: État de chaque indicateur (ex: under_voltage)
+        """
+        value = self.throttled()
+        if value is None:
+            return None
+        return {name: bool(value & (1 << bit)) for bit, name in THROTTLED_FLAGS.items()}
+
+    # ----- CPU -----
+
+    def cpu_percent_per_core(self) -> Optional[Dict[str, float]]:
+        """
+        Utilisation CPU depuis l'appel précédent, par cœur et totale.
+
+        Le premier appel initialise la référence et renvoie des valeurs nulles.
+
+        Returns:
+            Optional[Dict[str, float]]: Pourcentage par ligne de /proc/stat ("cpu", "cpu0"...)
+        """
+        raw = self._file(PROC_STAT).read()
+        if raw is None:
+            return None
+        current = {}
+        for line in raw.splitlines():
+            if not line.startswith("cpu"):
+                break
+            name, *fields = line.split()
+            values = [int(field) for field in fields]
+            # idle + iowait
+            idle = values[3] + (values[4] if len(values) > 4 else 0)
+            current[name] = (sum(values[:8]), idle)
+
+        with self._lock:
+            previous, self._previous_stat = self._previous_stat, current
+        usage = {}
+        for name, (total, idle) in current.items():
+            last_total, last_idle = (previous or {}).get(name, (total, idle))
+            elapsed = total - last_total
+            usage[name] = round(100 * (1 - (idle - last_idle) / elapsed), 1) if elapsed > 0 else 0.0
+        return usage
+
+    # ----- Réseau -----
+
+    def default_interface(self) -> Optional[str]:
+        """
+        Interface portant la route IPv4 par défaut.
+
+        Returns:
+            Optional[str]: Nom de l'interface (ex: "wlan0"), ou None sans route par défaut
+        """
+        raw = self._file(PROC_NET_ROUTE).read()
+        for line in (raw or "").splitlines()[1:]:
+            fields = line.split()
+            if len(fields) > 1 and fields[1] == "00000000":
+                return fields[0]
+        return None
+
+    def ipv4_address(self, interface: str) -> Optional[str]:
+        """
+        Adresse IPv4 d'une interface (ioctl SIOCGIFADDR).
+
+        Args:
+            interface: Nom de l'interface
+
+        Returns:
+            Optional[str]: Adresse, ou None si l'interface n'a pas d'adresse
+        """
+        request = struct.pack("256s", interface.encode()[:IFNAMSIZ - 1])
+        try:
+            response = fcntl.ioctl(self._socket.fileno(), SIOCGIFADDR, request)
+        except OSError:
+            return None
+        return socket.inet_ntoa(response[20:24])
+
+    def primary_ip(self) -> Optional[str]:
+        """Adresse IPv4 de l'interface de la route par défaut."""
+        interface = self.default_interface()
+        return self.ipv4_address(interface) if interface else None
+
+    def wifi_ssid(self, interface: str) -> Optional[str]:
+        """
+        SSID du réseau auquel une interface Wi-Fi est associée (ioctl SIOCGIWESSID).
+
+        Args:
+            interface: Nom de l'interface Wi-Fi
+
+        Returns:
+            Optional[str]: SSID ("" si non associée), ou None si ce n'est pas une interface Wi-Fi
+        """
+        essid = array.array("B", bytes(IW_ESSID_MAX_SIZE + 1))
+        address, _ = essid.buffer_info()
+        # struct iwreq : nom de l'interface, puis struct iw_point (pointeur, longueur, drapeaux)
+        request = struct.pack(f"{IFNAMSIZ}sPHH", interface.encode()[:IFNAMSIZ - 1], address, len(essid), 0)
+        request = request.ljust(IFNAMSIZ + 16, b"\0")
+        try:
+            response = fcntl.ioctl(self._socket.fileno(), SIOCGIWESSID, request)
+        except OSError:
+            return None
+        length = struct.unpack_from(f"{IFNAMSIZ}sPHH", response)[2]
+        return essid.tobytes()[:length].rstrip(b"\0").decode("utf-8", "replace")
+
+    def wireless(self) -> Dict[str, Dict[str, float]]:
+        """
+        Qualité du lien des interfaces Wi-Fi (/proc/net/wireless).
+
+        Returns:
+            Dict: Par interface : link (qualité), level (dBm) et noise (dBm)
+        """
+        raw = self._file(PROC_NET_WIRELESS).read()
+        interfaces = {}
+        # Les deux premières lignes sont des en-têtes
+        for line in (raw or "").splitlines()[2:]:
+            name, _, values = line.partition(":")
+            fields = values.split()
+            if len(fields) >= 4:
+                interfaces[name.strip()] = {
+                    "link": float(fields[1].rstrip(".")),
+                    "level": float(fields[2].rstrip(".")),
+                    "noise": float(fields[3].rstrip("."))
+                }
+        return interfaces
+
+    def wifi_status(self, interface: str) -> Optional[Dict[str, object]]:
+        """
+        Statut Wi-Fi d'une interface, au format de get_wifi_status().
+
+        Returns:
+            Optional[Dict]: connected, ssid, ip_address et link, ou None si
+            l'interface n'est pas une interface Wi-Fi
+        """
+        ssid = self.wifi_ssid(interface)
+        if ssid is None:
+            return None
+        connected = bool(ssid)
+        return {
+            "connected": connected,
+            "ssid": ssid if connected else None,
+            "ip_address": self.ipv4_address(interface) if connected else None,
+            "link": self.wireless().get(interface)
+        }
+
+    # ----- Vue d'ensemble -----
+
+    def snapshot(self) -> Dict[str, object]:
+        """
+        Relève toutes les mesures disponibles.
+
+        Returns:
+            Dict: thermal, throttled, cpu, wireless et timestamp
+        """
+        return {
+            "thermal": self.thermal_zones(),
+            "throttled": self.throttled_flags(),
+            "cpu": self.cpu_percent_per_core(),
+            "wireless": self.wireless(),
+            "timestamp": time.time()
+        }
@@ -0,0 +1,241 @@
+"""
+TBerryPrint - Spouleur des billets déposés par TBerryPrint.exe
+
+TBerryPrint.exe (sous wine) dépose les billets dans le répertoire partagé
+wine/billets (lecteur r:). Ce module:
+- Surveille ce répertoire avec inotify (aucune interrogation périodique)
+- Prend en charge chaque billet dès la fermeture de son écriture
+- Regroupe les billets arrivés en rafale dans une seule tâche CUPS
+- Limite le nombre de billets en attente (contre-pression)
+"""
+
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from instrumentation import report_error
+
+# Constantes inotify (voir <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+# En-tête d'un événement inotify : wd, mask, cookie, len
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Taille du tampon de lecture des événements
+INOTIFY_BUFFER_SIZE = 64 * 1024
+
+# Délai avant une nouvelle tentative après un échec de soumission (secondes)
+RETRY_DELAY = 5.0
+
+
+class InotifyWatcher:
+    """Surveillance inotify minimale d'un répertoire (via la libc, sans dépendance)."""
+
+    def __init__(self, directory: str, mask: int) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 a échoué")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Impossible de surveiller {directory}")
+
+    def read_events(self, timeout: Optional[float]) -> List[tuple]:
+        """
+        Attend puis lit les événements disponibles.
+
+        Args:
+            timeout: Délai maximal d'attente en secondes (None pour attendre indéfiniment)
+
+        Returns:
+            List[tuple]: Liste de tuples (masque, nom_fichier)
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, INOTIFY_BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + name_length].rstrip(b"\0")
+            offset += name_length
+            events.append((mask, os.fsdecode(name)))
+        return events
+
+
+class TicketSpooler:
+    """
+    Transmet à CUPS les billets déposés dans un répertoire.
+
+    Un thread lit les événements inotify et place les billets dans une file
+    bornée : quand elle est pleine, la lecture s'arrête et le noyau conserve
+    les événements (en cas de débordement, le répertoire est relu). Un second
+    thread vide la file : tous les billets disponibles au moment de l'envoi,
+    plus ceux arrivés pendant une courte fenêtre de regroupement, partent dans
+    une seule tâche CUPS. Un billet n'est supprimé qu'une fois accepté par CUPS.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        submit: Callable[[str, List[str]], int],
+        resolve_printer: Callable[[], Optional[str]],
+        max_pending: int = 500,
+        max_batch: int = 50,
+        batch_window: float = 0.1
+    ) -> None:
+        self.directory = directory
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.batch_window = batch_window
+        self._submit = submit
+        self._resolve_printer = resolve_printer
+        self._queue: "queue.Queue[str]" = queue.Queue(maxsize=max_pending)
+        self._known: set = set()
+        self._lock = threading.Lock()
+        self._started = False
+        self._stats: Dict[str, Any] = {
+            "in_flight": 0,
+            "tickets_submitted": 0,
+            "jobs_submitted": 0,
+            "last_batch_size": 0,
+            "last_job_id": None,
+            "overflows": 0,
+            "last_error": None
+        }
+
+    def start(self) -> None:
+        """Démarre la surveillance du répertoire et l'envoi des billets."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        watcher = InotifyWatcher(self.directory, IN_CLOSE_WRITE | IN_MOVED_TO)
+        threading.Thread(target=self._watch, args=(watcher,), name="spooler-watch", daemon=True).start()
+        threading.Thread(target=self._submit_loop, name="spooler-submit", daemon=True).start()
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Renvoie l'état du spouleur.
+
+        Returns:
+            Dict: Profondeur de la file, compteurs et dernière erreur
+        """
+        with self._lock:
+            status = dict(self._stats)
+        status.update({
+            "running": self._started,
+            "directory": self.directory,
+            "queue_depth": self._queue.qsize(),
+            "max_pending": self.max_pending
+        })
+        return status
+
+    # ----- Réception des billets -----
+
+    def _is_ticket(self, name: str) -> bool:
+        """Ignore les fichiers cachés et temporaires (ex: .gitkeep)."""
+        return bool(name) and not name.startswith(".") and not name.endswith((".tmp", "~"))
+
+    def _enqueue(self, name: str) -> None:
+        """Ajoute un billet à la file (bloque si la file est pleine)."""
+        path = os.path.join(self.directory, name)
+        with self._lock:
+            if path in self._known:
+                return
+            self._known.add(path)
+        self._queue.put(path)
+
+    def _scan(self) -> None:
+        """Relit le répertoire (démarrage ou débordement de la file inotify)."""
+        entries = [entry for entry in os.scandir(self.directory) if entry.is_file() and self._is_ticket(entry.name)]
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            self._enqueue(entry.name)
+
+    def _watch(self, watcher: InotifyWatcher) -> None:
+        """Boucle de lecture des événements inotify."""
+        self._scan()
+        while True:
+            try:
+                for mask, name in watcher.read_events(None):
+                    if mask & IN_Q_OVERFLOW:
+                        with self._lock:
+                            self._stats["overflows"] += 1
+                        self._scan()
+                    elif self._is_ticket(name):
+                        self._enqueue(name)
+            except Exception as e:
+                report_error("spooler", f"Erreur du spouleur (surveillance) : {e}")
+                time.sleep(RETRY_DELAY)
+
+    # ----- Envoi des billets -----
+
+    def _next_batch(self) -> List[str]:
+        """Attend un billet puis regroupe ceux qui arrivent dans la fenêtre de regroupement."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _submit_loop(self) -> None:
+        """Boucle d'envoi des billets à CUPS, par lots."""
+        while True:
+            paths = self._next_batch()
+            with self._lock:
+                self._stats["in_flight"] = len(paths)
+
+            while True:
+                batch = [path for path in paths if os.path.isfile(path)]
+                if not batch:
+                    break
+                try:
+                    printer = self._resolve_printer()
+                    if not printer:
+                        raise RuntimeError("Aucune imprimante disponible")
+                    job_id = self._submit(printer, batch)
+                except Exception as e:
+                    # Les billets restent sur le disque : nouvelle tentative plus tard
+                    with self._lock:
+                        self._stats["last_error"] = str(e)
+                    report_error("spooler", f"Erreur du spouleur (envoi) : {e}")
+                    time.sleep(RETRY_DELAY)
+                    continue
+
+                for path in batch:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                with self._lock:
+                    self._stats["tickets_submitted"] += len(batch)
+                    self._stats["jobs_submitted"] += 1
+                    self._stats["last_batch_size"] = len(batch)
+                    self._stats["last_job_id"] = job_id
+                    self._stats["last_error"] = None
+                break
+
+            with self._lock:
+                self._known.difference_update(paths)
+                self._stats["in_flight"] = 0
@@ -0,0 +1,111 @@
+"""
+TBerryPrint - Cache des scans Wi-Fi
+
+Un scan Wi-Fi prend plusieurs secondes et occupe la radio. Ce module:
+- Conserve le résultat du dernier scan pendant une durée configurable (TTL)
+- Ne lance jamais deux scans en parallèle : les appelants simultanés
+  partagent le scan en cours
+- Relance les scans en tâche de fond et sert le résultat précédent en attendant
+- Analyse la sortie structurée de NetworkManager (nmcli -t)
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from instrumentation import report_error
+
+
+def split_terse_line(line: str) -> List[str]:
+    """
+    Découpe une ligne de sortie "nmcli -t" en champs.
+
+    nmcli sépare les champs par ":" et échappe les ":" et "\\" des valeurs.
+
+    Args:
+        line: Ligne de sortie de nmcli en mode terse
+
+    Returns:
+        List[str]: Valeurs des champs, sans caractères d'échappement
+    """
+    fields = []
+    current = []
+    escaped = False
+    for char in line:
+        if escaped:
+            current.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == ":":
+            fields.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    fields.append("".join(current))
+    return fields
+
+
+class WifiScanCache:
+    """
+    Cache à scan unique en vol pour les réseaux Wi-Fi.
+
+    Un résultat plus récent que le TTL est servi immédiatement. Un résultat
+    périmé est aussi servi immédiatement, mais déclenche un scan en tâche de
+    fond. Sans résultat (premier appel) ou en cas d'actualisation forcée,
+    l'appelant attend le scan en cours, partagé avec les autres appelants.
+    """
+
+    def __init__(self, scan: Callable[[], List[Dict[str, Any]]], ttl: float, timeout: float = 30.0) -> None:
+        self.ttl = ttl
+        self.timeout = timeout
+        self._scan = scan
+        self._lock = threading.Lock()
+        self._results: Optional[List[Dict[str, Any]]] = None
+        self._scanned_at = 0.0
+        self._in_flight: Optional[threading.Event] = None
+
+    def get(self, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        Renvoie les réseaux Wi-Fi détectés.
+
+        Args:
+            force: Attendre un nouveau scan au lieu de servir le cache
+
+        Returns:
+            List[Dict]: Réseaux Wi-Fi détectés
+        """
+        with self._lock:
+            fresh = self._results is not None and time.monotonic() - self._scanned_at < self.ttl
+            if fresh and not force:
+                return self._results
+            in_flight = self._start_scan()
+            previous = self._results
+
+        if previous is not None and not force:
+            return previous
+
+        in_flight.wait(self.timeout)
+        with self._lock:
+            return self._results or []
+
+    def _start_scan(self) -> threading.Event:
+        """Lance un scan s'il n'y en a pas déjà un en cours (verrou détenu)."""
+        if self._in_flight is None:
+            self._in_flight = threading.Event()
+            threading.Thread(target=self._run, args=(self._in_flight,), name="wifi-scan", daemon=True).start()
+        return self._in_flight
+
+    def _run(self, done: threading.Event) -> None:
+        """Exécute un scan et publie son résultat."""
+        try:
+            results = self._scan()
+            with self._lock:
+                self._results = results
+                self._scanned_at = time.monotonic()
+        except Exception as e:
+            report_error("wifi", f"Erreur lors du scan Wi-Fi: {e}")
+        finally:
+            with self._lock:
+                self._in_flight = None
+            done.set()
@@ -19,7 +19,7 @@ apt-get install -y python3-pip python3-cups
 
 # Installation des bibliothèques Python requises via apt
 log_info "Installation des bibliothèques Python..."
-apt install -y python3-flask python3-psutil python3-dotenv
+apt install -y python3-flask python3-psutil python3-dotenv python3-cheroot
 
 
 # Attribution des permissions
@@ -28,14 +28,67 @@ chown -R admin:admin /opt/TBERRYPRINT/FlaskInstallation/InterfaceFlask
 chmod -R 755 /opt/TBERRYPRINT/FlaskInstallation/InterfaceFlask
 
 
-# Création du fichier .service
+# Création du service d'assistance privilégié (remplace les appels "sudo fonctions.sh")
+log_info "Création du service d'assistance privilégié..."
+chown root:root /opt/TBERRYPRINT/FlaskInstallation/privileged_helper.py
+chmod 755 /opt/TBERRYPRINT/FlaskInstallation/privileged_helper.py
+sudo cat > /etc/systemd/system/TBerryPrintHelper.service << EOF
+[Unit]
+Description=Service d assistance privilegie de TBerryPrint
+
+[Service]
+User=root
+RuntimeDirectory=tberryprint
+Environment=HELPER_ALLOWED_USER=admin
+ExecStart=/usr/bin/python3 /opt/TBERRYPRINT/FlaskInstallation/privileged_helper.py
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+
+# Création du fichier .socket : le port est ouvert par systemd dès le début du
+# démarrage, les premières connexions attendent l'application au lieu d'être refusées.
+# L'adresse reprend SERVER_HOST et SERVER_PORT du .env (relancer ce script s'ils changent)
+log_info "Création de la socket systemd..."
+ENV_FILE=/opt/TBERRYPRINT/FlaskInstallation/InterfaceFlask/.env
+SERVER_HOST=$(grep -E '^SERVER_HOST=' "$ENV_FILE" | tail -n 1 | cut -d= -f2-)
+SERVER_PORT=$(grep -E '^SERVER_PORT=' "$ENV_FILE" | tail -n 1 | cut -d= -f2-)
+SERVER_HOST=${SERVER_HOST:-0.0.0.0}
+SERVER_PORT=${SERVER_PORT:-5000}
+if [[ "$SERVER_HOST" == *:* ]]; then
+    LISTEN_ADDRESS="[$SERVER_HOST]:$SERVER_PORT"
+else
+    LISTEN_ADDRESS="$SERVER_HOST:$SERVER_PORT"
+fi
+sudo cat > /etc/systemd/system/InterfaceFlask.socket << EOF
+[Unit]
+Description=Socket de l'interface web du Raspberry
+
+[Socket]
+ListenStream=$LISTEN_ADDRESS
+NoDelay=true
+Backlog=64
+
+[Install]
+WantedBy=sockets.target
+EOF
+
+
+# Création du fichier .service (Type=notify : prêt quand app.py envoie READY=1)
 log_info "Création du service systemd..."
 sudo cat > /etc/systemd/system/InterfaceFlask.service << EOF
 [Unit]
 Description=Interface web du Raspberry
-After=network.target
+Requires=InterfaceFlask.socket
+After=InterfaceFlask.socket TBerryPrintHelper.service
+Wants=TBerryPrintHelper.service
 
 [Service]
+Type=notify
+NotifyAccess=main
+TimeoutStartSec=90
 User=admin
 WorkingDirectory=/opt/TBERRYPRINT/FlaskInstallation/InterfaceFlask
 ExecStart=/usr/bin/python3 /opt/TBERRYPRINT/FlaskInstallation/InterfaceFlask/app.py
@@ -49,6 +102,8 @@ EOF
 # Rechargement de systemd et création des liens symboliques appropriés
 log_info "Rechargement des fichiers de configuration..."
 sudo systemctl daemon-reload
+sudo systemctl enable TBerryPrintHelper
+sudo systemctl enable InterfaceFlask.socket
 sudo systemctl enable InterfaceFlask
 
 
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+TBerryPrint - Service d'assistance privilégié
+
+Ce service tourne en root et expose les opérations de fonctions.sh sur une
+socket Unix locale, pour que l'interface web n'ait plus à lancer
+"sudo fonctions.sh" (PAM + bash + relecture du script) à chaque appel.
+
+Protocole (une ligne JSON par message):
+- Requête : {"op": "wifi_iwconfig", "args": []}
+- Réponse : {"ok": true, "returncode": 0, "stdout": "...", "stderr": "..."}
+- En cas de requête invalide : {"ok": false, "error": "..."}
+- Avec "stream": true dans la requête, chaque ligne de sortie est envoyée
+  au fil de l'eau ({"line": "..."}) avant la réponse finale ; les sorties
+  standard et d'erreur sont alors fusionnées dans "stdout"
+"""
+
+import json
+import os
+import pwd
+import re
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Emplacement de la socket (créé par systemd via RuntimeDirectory=tberryprint)
+SOCKET_PATH = os.environ.get("HELPER_SOCKET", "/run/tberryprint/helper.sock")
+
+# Utilisateur autorisé en plus de root (utilisateur du service InterfaceFlask)
+ALLOWED_USER = os.environ.get("HELPER_ALLOWED_USER", "admin")
+
+# Interface Wi-Fi par défaut (identique à fonctions.sh)
+DEFAULT_INTERFACE = "wlan0"
+
+# Options d'impression des tickets (identiques à scriptImpression.sh)
+PRINT_OPTIONS = ["-o", "media=Custom.80x120mm", "-o", "Density=5"]
+
+# Seul document accepté par impression_test (même valeur que TEST_PRINT_FILE dans app.py)
+TEST_PRINT_FILE = os.environ.get("TEST_PRINT_FILE", "/opt/TBERRYPRINT/FlaskInstallation/testImpressionInterface.pdf")
+
+# Validation des arguments
+HOSTNAME_PATTERN = re.compile(r"^[A-Za-z0-9-]{1,63}$")
+NAME_PATTERN = re.compile(r"^[^\x00\n]{1,255}$")
+# Argument positionnel : ne doit pas pouvoir être lu comme une option ("-...")
+POSITIONAL_PATTERN = re.compile(r"^[^\x00\n-][^\x00\n]{0,254}$")
+
+# Structure renvoyée par SO_PEERCRED : pid, uid, gid
+PEERCRED = struct.Struct("3i")
+
+Result = Tuple[int, str, str]
+
+
+class HelperError(Exception):
+    """Requête invalide (opération inconnue, arguments incorrects)."""
+
+
+# ===== OPÉRATIONS =====
+
+def check_name(value: str) -> str:
+    """Valide un SSID, un nom d'interface ou un nom d'imprimante (sans "-" initial)."""
+    if not isinstance(value, str) or not POSITIONAL_PATTERN.match(value):
+        raise HelperError(f"Argument invalide : {value!r}")
+    return value
+
+def check_password(value: str) -> str:
+    """Valide un mot de passe Wi-Fi (valeur du mot-clé "password" de nmcli, "-" initial permis)."""
+    if not isinstance(value, str) or not NAME_PATTERN.match(value):
+        raise HelperError("Mot de passe invalide")
+    return value
+
+def check_test_file(path: str) -> str:
+    """N'accepte que le document de test configuré (chemin résolu, liens symboliques compris)."""
+    if not isinstance(path, str) or os.path.realpath(path) != os.path.realpath(TEST_PRINT_FILE):
+        raise HelperError(f"Document de test non autorisé : {path!r}")
+    return os.path.realpath(TEST_PRINT_FILE)
+
+def set_hostname(hostname: str) -> Result:
+    """Équivalent de set_hostname dans fonctions.sh."""
+    if not HOSTNAME_PATTERN.match(hostname):
+        raise HelperError(f"Hostname invalide : {hostname!r}")
+
+    with open("/etc/hostname", "w") as f:
+        f.write(hostname + "\n")
+
+    with open("/etc/hosts") as f:
+        lines = f.read().splitlines()
+    if any(line.startswith("127.0.1.1") for line in lines):
+        lines = [f"127.0.1.1 {hostname}" if line.startswith("127.0.1.1") else line for line in lines]
+    else:
+        lines.append(f"127.0.1.1 {hostname}")
+    with open("/etc/hosts", "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    result = subprocess.run(["hostnamectl", "set-hostname", hostname], capture_output=True, text=True)
+    return result.returncode, result.stdout, result.stderr
+
+def printer_resume(printer: str) -> Result:
+    """Équivalent de printer_resume dans fonctions.sh : réactive une file et la rouvre aux tâches."""
+    check_name(printer)
+    stdout = []
+    for command in (["cupsenable", printer], ["cupsaccept", printer]):
+        result = subprocess.run(command, capture_output=True, text=True)
+        stdout.append(result.stdout)
+        if result.returncode != 0:
+            return result.returncode, "".join(stdout), result.stderr
+    return 0, "".join(stdout), ""
+
+# Opérations exposées : nom -> (nombre d'arguments min, max, construction de la commande)
+# Une commande est une liste d'arguments (exécutée sans shell) ou une fonction Python.
+OPERATIONS: Dict[str, Tuple[int, int, Callable[..., Any]]] = {
+    "set_hostname": (1, 1, set_hostname),
+    "wifi_show": (0, 0, lambda: ["nmcli", "connection", "show"]),
+    "wifi_connect": (2, 3, lambda ssid, password, interface=DEFAULT_INTERFACE: [
+        "nmcli", "device", "wifi", "connect", check_name(ssid),
+        "password", check_password(password), "ifname", check_name(interface)
+    ]),
+    "wifi_delete": (1, 1, lambda ssid: ["nmcli", "connection", "delete", check_name(ssid)]),
+    "wifi_up": (1, 1, lambda ssid: ["nmcli", "connection", "up", check_name(ssid)]),
+    "wifi_down": (1, 1, lambda ssid: ["nmcli", "connection", "down", check_name(ssid)]),
+    "wifi_scan": (0, 0, lambda: ["nmcli", "device", "wifi", "list"]),
+    "wifi_iwconfig": (0, 0, lambda: ["iwconfig", DEFAULT_INTERFACE]),
+    "ip_info": (0, 0, lambda: ["ip", "addr", "show", DEFAULT_INTERFACE]),
+    "wifi_scan_iwlist": (0, 0, lambda: ["iwlist", DEFAULT_INTERFACE, "scan"]),
+    "wifi_scan_nmcli": (0, 0, lambda: [
+        "nmcli", "-t", "-f", "IN-USE,SSID,SIGNAL,SECURITY",
+        "device", "wifi", "list", "--rescan", "yes", "ifname", DEFAULT_INTERFACE
+    ]),
+    "measure_temp": (0, 0, lambda: ["vcgencmd", "measure_temp"]),
+    "printer_remove": (1, 1, lambda printer: ["lpadmin", "-x", check_name(printer)]),
+    "printer_resume": (1, 1, printer_resume),
+    "impression_test": (2, 2, lambda file, printer: [
+        "lp", "-d", check_name(printer), *PRINT_OPTIONS, check_test_file(file)
+    ]),
+    "TBerryPrint_restart": (0, 0, lambda: ["systemctl", "restart", "TBerryPrint.service"]),
+    "reboot_system": (0, 0, lambda: ["reboot"]),
+    "apt_update": (0, 0, lambda: ["apt-get", "update"]),
+    "apt_upgrade": (0, 0, lambda: ["apt-get", "upgrade", "-y"])
+}
+
+# Opérations dont l'échec est signalé par le code 1, comme dans fonctions.sh
+FAILS_WITH_ONE = ("wifi_connect", "wifi_delete", "wifi_up", "wifi_down")
+
+def run_operation(op: str, args: List[str], on_line: Optional[Callable[[str], None]] = None) -> Result:
+    """
+    Exécute une opération après validation.
+
+    Args:
+        op: Nom de l'opération (voir OPERATIONS)
+        args: Arguments de l'opération
+        on_line: Fonction appelée pour chaque ligne de sortie (sorties fusionnées)
+
+    Returns:
+        Tuple[int, str, str]: Code de retour, sortie standard, sortie d'erreur
+    """
+    if op not in OPERATIONS:
+        raise HelperError(f"Commande inconnue: {op}")
+    min_args, max_args, build = OPERATIONS[op]
+    if not isinstance(args, list) or not min_args <= len(args) <= max_args:
+        raise HelperError(f"Nombre d'arguments invalide pour {op}")
+    if not all(isinstance(arg, str) for arg in args):
+        raise HelperError(f"Arguments invalides pour {op}")
+
+    command = build(*args)
+    if not isinstance(command, list):
+        # Opération implémentée directement en Python
+        return command
+
+    env = dict(os.environ, DEBIAN_FRONTEND="noninteractive", LC_ALL="C.UTF-8")
+    try:
+        if on_line is None:
+            result = subprocess.run(command, capture_output=True, text=True, env=env)
+            returncode, stdout, stderr = result.returncode, result.stdout, result.stderr
+        else:
+            returncode, stdout, stderr = stream_command(command, env, on_line)
+    except FileNotFoundError:
+        # Même code que bash pour une commande introuvable
+        return 127, "", f"{command[0]}: commande introuvable"
+    if op in FAILS_WITH_ONE and returncode != 0:
+        returncode = 1
+    return returncode, stdout, stderr
+
+def stream_command(command: List[str], env: Dict[str, str], on_line: Callable[[str], None]) -> Result:
+    """Exécute une commande en transmettant chaque ligne de sortie dès qu'elle est écrite."""
+    output = []
+    with subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env, bufsize=1
+    ) as process:
+        for line in process.stdout:
+            output.append(line)
+            on_line(line.rstrip("\n"))
+    return process.returncode, "".join(output), ""
+
+
+# ===== SERVEUR =====
+
+class HelperRequestHandler(socketserver.StreamRequestHandler):
+    """Traite les requêtes d'un client (plusieurs requêtes possibles par connexion)."""
+
+    def setup(self) -> None:
+        super().setup()
+        credentials = self.request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEERCRED.size)
+        _, uid, _ = PEERCRED.unpack(credentials)
+        self.authorized = uid in self.server.allowed_uids
+
+    def send(self, message: Dict[str, Any]) -> None:
+        self.wfile.write((json.dumps(message) + "\n").encode())
+        self.wfile.flush()
+
+    def handle(self) -> None:
+        if not self.authorized:
+            self.send({"ok": False, "error": "Accès refusé"})
+            return
+
+        for raw in self.rfile:
+            try:
+                request = json.loads(raw)
+                on_line = (lambda line: self.send({"line": line})) if request.get("stream") else None
+                returncode, stdout, stderr = run_operation(request.get("op"), request.get("args", []), on_line)
+                self.send({"ok": True, "returncode": returncode, "stdout": stdout, "stderr": stderr})
+            except HelperError as e:
+                self.send({"ok": False, "error": str(e)})
+            except (BrokenPipeError, ConnectionResetError):
+                return
+            except Exception as e:
+                self.send({"ok": False, "error": f"Erreur interne : {e}"})
+
+
+class HelperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str) -> None:
+        if os.path.exists(path):
+            os.unlink(path)
+        super().__init__(path, HelperRequestHandler)
+        self.allowed_uids = {0}
+        try:
+            user = pwd.getpwnam(ALLOWED_USER)
+            self.allowed_uids.add(user.pw_uid)
+            os.chown(path, 0, user.pw_gid)
+        except KeyError:
+            print(f"Utilisateur {ALLOWED_USER} introuvable : seul root est autorisé", file=sys.stderr)
+        os.chmod(path, 0o660)
+
+
+if __name__ == "__main__":
+    if os.geteuid() != 0:
+        print("Ce service doit être exécuté en tant que root", file=sys.stderr)
+        sys.exit(1)
+    os.makedirs(os.path.dirname(SOCKET_PATH), exist_ok=True)
+    with HelperServer(SOCKET_PATH) as server:
+        server.serve_forever()
@@ -0,0 +1,538 @@
+"""
+TBerryPrint - Agrégateur de flotte
+
+Surveille un ensemble de boîtiers TBerryPrint depuis un seul processus et
+présente leur état dans un tableau de bord commun:
+- Connexion à chaque boîtier avec le compte client (cookie de session gardé par boîtier)
+- Abonnement au flux /stats/stream de chaque boîtier, ou interrogation de /stats
+- Connexions HTTP réutilisées (pool aiohttp) et nombre de requêtes simultanées borné
+- Attente exponentielle (avec aléa) par boîtier injoignable, sans ralentir les autres
+- API JSON (/api/fleet) et tableau de bord (/)
+
+Utilisation:
+    python3 fleet.py [--nodes nodes.txt] [--port 8080]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp import web
+from dotenv import load_dotenv
+
+# Chargement des variables d'environnement
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+load_dotenv(os.path.join(BASE_DIR, ".env"))
+
+# ===== CONFIGURATION =====
+
+# Adresse d'écoute du tableau de bord de la flotte
+FLEET_HOST = os.environ.get("FLEET_HOST", "0.0.0.0")
+FLEET_PORT = int(os.environ.get("FLEET_PORT", "8080"))
+
+# Accès au tableau de bord de la flotte (authentification HTTP Basic, vide : sans authentification)
+FLEET_USERNAME = os.environ.get("FLEET_USERNAME", "")
+FLEET_PASSWORD = os.environ.get("FLEET_PASSWORD", "")
+
+# Liste des boîtiers (une adresse par ligne, voir nodes.txt)
+FLEET_NODES_FILE = os.environ.get("FLEET_NODES_FILE", os.path.join(BASE_DIR, "nodes.txt"))
+
+# Compte utilisé sur les boîtiers (sauf identifiants précisés dans nodes.txt)
+FLEET_NODE_USERNAME = os.environ.get("FLEET_NODE_USERNAME", "client")
+FLEET_NODE_PASSWORD = os.environ.get("FLEET_NODE_PASSWORD", "client_password")
+
+# Port par défaut des boîtiers (SERVER_PORT de l'interface web)
+DEFAULT_NODE_PORT = 5000
+
+# "stream" : abonnement à /stats/stream ; "poll" : interrogation de /stats
+FLEET_MODE = os.environ.get("FLEET_MODE", "stream")
+FLEET_POLL_INTERVAL = float(os.environ.get("FLEET_POLL_INTERVAL", "5"))
+
+# Requêtes simultanées au plus (connexions et interrogations ; les flux ouverts ne comptent pas)
+FLEET_CONCURRENCY = int(os.environ.get("FLEET_CONCURRENCY", "32"))
+
+# Délai maximal d'une requête, et silence maximal d'un flux (le boîtier envoie un
+# commentaire toutes les SSE_KEEPALIVE_INTERVAL secondes)
+FLEET_REQUEST_TIMEOUT = float(os.environ.get("FLEET_REQUEST_TIMEOUT", "5"))
+FLEET_STREAM_IDLE_TIMEOUT = float(os.environ.get("FLEET_STREAM_IDLE_TIMEOUT", "45"))
+
+# Attente entre deux tentatives vers un boîtier injoignable (doublée à chaque échec)
+FLEET_BACKOFF_MIN = float(os.environ.get("FLEET_BACKOFF_MIN", "1"))
+FLEET_BACKOFF_MAX = float(os.environ.get("FLEET_BACKOFF_MAX", "120"))
+
+# Âge (en secondes) au-delà duquel les données d'un boîtier sont considérées périmées
+FLEET_STALE_AFTER = float(os.environ.get("FLEET_STALE_AFTER", "60"))
+
+# États d'un boîtier
+NODE_CONNECTING = "connecting"
+NODE_ONLINE = "online"
+NODE_BACKOFF = "backoff"
+NODE_AUTH_FAILED = "auth_failed"
+
+# Codes d'état CUPS des imprimantes (voir get_printer_status_text dans app.py)
+PRINTER_STOPPED = 5
+
+
+class AuthenticationFailed(Exception):
+    """Identifiants refusés par un boîtier."""
+
+
+class SessionExpired(Exception):
+    """Cookie de session refusé (boîtier redémarré avec une nouvelle clé secrète)."""
+
+
+# ===== BOÎTIERS =====
+
+class Node:
+    """État d'un boîtier surveillé."""
+
+    def __init__(self, url: str, username: str, password: str) -> None:
+        self.url = url
+        self.username = username
+        self.password = password
+        self.cookie: Optional[str] = None
+        self.state = NODE_CONNECTING
+        self.stats: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.failures = 0
+        self.last_update: Optional[float] = None
+        self.next_attempt: Optional[float] = None
+        self.connected_at: Optional[float] = None
+
+    @property
+    def name(self) -> str:
+        """Nom d'hôte annoncé par le boîtier (adresse tant qu'il n'a pas répondu)."""
+        return self.stats.get("hostname") or urlsplit(self.url).netloc
+
+    def to_dict(self, now: float, full: bool = False) -> Dict[str, Any]:
+        """
+        Résumé du boîtier pour l'API.
+
+        Args:
+            now: Heure courante (time.time())
+            full: Inclure toutes les statistiques reçues
+
+        Returns:
+            Dict: État, erreur, âge des données et statistiques principales
+        """
+        printers = self.stats.get("printers", [])
+        age = round(now - self.last_update, 1) if self.last_update else None
+        summary = {
+            "name": self.name,
+            "url": self.url,
+            "state": self.state,
+            "stale": age is None or age > FLEET_STALE_AFTER,
+            "age": age,
+            "error": self.error,
+            "failures": self.failures,
+            "retry_in": round(max(0.0, self.next_attempt - now), 1) if self.state == NODE_BACKOFF and self.next_attempt else None,
+            "cpu_percent": self.stats.get("raw_cpu_percent"),
+            "ram_percent": self.stats.get("raw_ram_percent"),
+            "temperature": self.stats.get("temperature"),
+            "throttled": self.stats.get("throttled"),
+            "printers": [
+                {
+                    "name": printer.get("name"),
+                    "status": printer.get("status"),
+                    "status_text": printer.get("status_text"),
+                    "active_jobs": (printer.get("jobs") or {}).get("active", 0)
+                }
+                for printer in printers
+            ]
+        }
+        if full:
+            summary["stats"] = self.stats
+        return summary
+
+
+def parse_nodes(path: str) -> List[Node]:
+    """
+    Lit la liste des boîtiers.
+
+    Une ligne par boîtier : "adresse [utilisateur mot_de_passe]". L'adresse
+    peut être une URL complète (http://10.0.0.12:5000) ou un nom d'hôte
+    (tberryprint-3, port DEFAULT_NODE_PORT). Les lignes vides et les
+    commentaires (#) sont ignorés.
+
+    Args:
+        path: Chemin du fichier
+
+    Returns:
+        List[Node]: Boîtiers, dans l'ordre du fichier
+    """
+    nodes = []
+    seen = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            url = fields[0] if "://" in fields[0] else f"http://{fields[0]}"
+            if urlsplit(url).port is None:
+                url = f"{url.rstrip('/')}:{DEFAULT_NODE_PORT}"
+            url = url.rstrip("/")
+            if url in seen:
+                continue
+            seen.add(url)
+            username, password = (fields[1], fields[2]) if len(fields) >= 3 else (FLEET_NODE_USERNAME, FLEET_NODE_PASSWORD)
+            nodes.append(Node(url, username, password))
+    return nodes
+
+
+# ===== COLLECTE =====
+
+class FleetAggregator:
+    """
+    Surveillance concurrente des boîtiers.
+
+    Une tâche asyncio par boîtier : un boîtier lent ou éteint n'attend que
+    lui-même. Toutes les requêtes passent par une seule session aiohttp
+    (connexions réutilisées) ; les cookies sont gérés par boîtier, car
+    plusieurs boîtiers peuvent partager une même adresse (tests locaux sur
+    plusieurs ports) et le cookie de session Flask ne tient pas compte du port.
+    """
+
+    def __init__(
+        self,
+        nodes: List[Node],
+        mode: str = "stream",
+        poll_interval: float = 5.0,
+        concurrency: int = 32,
+        request_timeout: float = 5.0,
+        stream_idle_timeout: float = 45.0,
+        backoff_min: float = 1.0,
+        backoff_max: float = 120.0
+    ) -> None:
+        self.nodes = nodes
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self.request_timeout = request_timeout
+        self.stream_idle_timeout = stream_idle_timeout
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.version = 0
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._changed: Optional[asyncio.Event] = None
+
+    async def start(self) -> None:
+        """Ouvre la session HTTP et lance une tâche de surveillance par boîtier."""
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._changed = asyncio.Event()
+        # Les flux gardent une connexion chacun : le pool n'est pas borné en mode flux
+        connector = aiohttp.TCPConnector(
+            limit=0 if self.mode == "stream" else self.concurrency,
+            limit_per_host=0,
+            ttl_dns_cache=300,
+            keepalive_timeout=30
+        )
+        self._session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar())
+        for node in self.nodes:
+            self._tasks.append(asyncio.create_task(self._watch(node)))
+            # Démarrages étalés : pas de rafale de connexions au lancement
+            await asyncio.sleep(min(0.01, 1.0 / max(len(self.nodes), 1)))
+
+    async def stop(self) -> None:
+        """Arrête les tâches de surveillance et ferme la session HTTP."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session is not None:
+            await self._session.close()
+
+    def _updated(self) -> None:
+        """Signale un changement d'état de la flotte."""
+        self.version += 1
+        # Un nouvel événement par changement : chaque attente est réveillée une seule fois
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait_changed(self, timeout: float) -> None:
+        """Attend le prochain changement d'état de la flotte (au plus timeout secondes)."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _watch(self, node: Node) -> None:
+        """Surveille un boîtier indéfiniment, avec attente exponentielle après un échec."""
+        while True:
+            logged_in_at = None
+            try:
+                if node.cookie is None:
+                    await self._login(node)
+                    logged_in_at = time.time()
+                if self.mode == "stream":
+                    await self._stream(node)
+                else:
+                    await self._poll(node)
+            except asyncio.CancelledError:
+                raise
+            except SessionExpired:
+                node.cookie = None
+                if logged_in_at is None or (node.last_update or 0) >= logged_in_at:
+                    # Session expirée (redémarrage du boîtier) : nouvelle connexion immédiate
+                    continue
+                # Cookie refusé avant toute donnée reçue avec lui : échec, avec attente
+                self._failed(node, NODE_BACKOFF, f"Session refusée par {node.url} juste après la connexion")
+            except AuthenticationFailed as e:
+                self._failed(node, NODE_AUTH_FAILED, str(e))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self._failed(node, NODE_BACKOFF, str(e) or type(e).__name__)
+            delay = min(self.backoff_max, self.backoff_min * 2 ** min(node.failures - 1, 16))
+            # Aléa : les boîtiers tombés ensemble (coupure réseau) ne reviennent pas en rafale
+            delay *= random.uniform(0.5, 1.0)
+            node.next_attempt = time.time() + delay
+            await asyncio.sleep(delay)
+            node.state = NODE_CONNECTING
+            self._updated()
+
+    def _failed(self, node: Node, state: str, error: str) -> None:
+        """Enregistre l'échec d'une tentative vers un boîtier."""
+        node.failures += 1
+        node.state = state
+        node.error = error
+        node.connected_at = None
+        if node.failures == 1:
+            print(f"Flotte : {node.url} injoignable ({error})")
+        self._updated()
+
+    def _received(self, node: Node, stats: Dict[str, Any], partial: bool = False) -> None:
+        """Met à jour les statistiques d'un boîtier (changements seuls si partial)."""
+        if partial:
+            node.stats.update(stats)
+        else:
+            node.stats = stats
+        if node.state != NODE_ONLINE:
+            if node.failures:
+                print(f"Flotte : {node.url} de nouveau joignable après {node.failures} échec(s)")
+            node.state = NODE_ONLINE
+            node.connected_at = time.time()
+        node.failures = 0
+        node.error = None
+        node.last_update = time.time()
+        self._updated()
+
+    def _timeout(self, read: Optional[float] = None) -> aiohttp.ClientTimeout:
+        return aiohttp.ClientTimeout(total=None if read else self.request_timeout, sock_connect=self.request_timeout, sock_read=read)
+
+    async def _login(self, node: Node) -> None:
+        """
+        Se connecte au boîtier et garde son cookie de session.
+
+        Raises:
+            AuthenticationFailed: Identifiants refusés (page de connexion renvoyée)
+        """
+        async with self._slots:
+            async with self._session.post(
+                f"{node.url}/login",
+                data={"username": node.username, "password": node.password},
+                allow_redirects=False,
+                timeout=self._timeout()
+            ) as response:
+                cookie = response.cookies.get("session")
+                # Succès : redirection vers le tableau de bord avec un cookie de session
+                if response.status not in (301, 302, 303) or cookie is None:
+                    raise AuthenticationFailed(f"Connexion refusée par {node.url} (HTTP {response.status})")
+                node.cookie = f"session={cookie.value}"
+
+    async def _fetch_stats(self, node: Node) -> None:
+        """Lit /stats une fois."""
+        async with self._slots:
+            async with self._session.get(
+                f"{node.url}/stats", headers={"Cookie": node.cookie}, timeout=self._timeout()
+            ) as response:
+                if response.status == 401:
+                    raise SessionExpired()
+                response.raise_for_status()
+                self._received(node, await response.json())
+
+    async def _poll(self, node: Node) -> None:
+        """Interroge /stats toutes les poll_interval secondes."""
+        while True:
+            await self._fetch_stats(node)
+            # Aléa : les interrogations restent étalées dans le temps
+            await asyncio.sleep(self.poll_interval * random.uniform(0.9, 1.1))
+
+    async def _stream(self, node: Node) -> None:
+        """
+        Suit le flux SSE /stats/stream (état complet, puis champs modifiés).
+
+        Si le boîtier a déjà trop de clients du flux (503), /stats est
+        interrogé en attendant qu'une place se libère.
+        """
+        while True:
+            async with self._session.get(
+                f"{node.url}/stats/stream",
+                headers={"Cookie": node.cookie, "Accept": "text/event-stream"},
+                timeout=self._timeout(read=self.stream_idle_timeout)
+            ) as response:
+                if response.status == 401:
+                    raise SessionExpired()
+                if response.status != 503:
+                    response.raise_for_status()
+                    data: List[str] = []
+                    first = True
+                    async for raw in response.content:
+                        line = raw.decode("utf-8").rstrip("\r\n")
+                        if line.startswith("data:"):
+                            data.append(line[5:].lstrip())
+                        elif not line and data:
+                            self._received(node, json.loads("\n".join(data)), partial=not first)
+                            first = False
+                            data = []
+                    raise aiohttp.ServerDisconnectedError("Flux /stats/stream interrompu")
+            await self._fetch_stats(node)
+            await asyncio.sleep(self.poll_interval * random.uniform(0.9, 1.1))
+
+    # ----- Vue d'ensemble -----
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Vue d'ensemble de la flotte.
+
+        Returns:
+            Dict: Nombre de boîtiers par état, imprimantes (total, arrêtées), tâches en cours
+        """
+        now = time.time()
+        states: Dict[str, int] = {}
+        printers = stopped = active_jobs = stale = 0
+        for node in self.nodes:
+            states[node.state] = states.get(node.state, 0) + 1
+            if node.last_update is None or now - node.last_update > FLEET_STALE_AFTER:
+                stale += 1
+            for printer in node.stats.get("printers", []):
+                printers += 1
+                stopped += printer.get("status") == PRINTER_STOPPED
+                active_jobs += (printer.get("jobs") or {}).get("active", 0)
+        return {
+            "nodes": len(self.nodes),
+            "states": states,
+            "stale": stale,
+            "printers": printers,
+            "printers_stopped": stopped,
+            "active_jobs": active_jobs
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """État complet de la flotte pour /api/fleet."""
+        now = time.time()
+        return {
+            "generated_at": now,
+            "version": self.version,
+            "mode": self.mode,
+            "summary": self.summary(),
+            "nodes": [node.to_dict(now) for node in self.nodes]
+        }
+
+    def find(self, name: str) -> Optional[Node]:
+        """Recherche un boîtier par nom d'hôte ou par adresse."""
+        for node in self.nodes:
+            if name in (node.name, urlsplit(node.url).netloc):
+                return node
+        return None
+
+
+# ===== SERVEUR WEB =====
+
+@web.middleware
+async def basic_auth(request: web.Request, handler):
+    """Authentification HTTP Basic du tableau de bord (si FLEET_USERNAME est défini)."""
+    if FLEET_USERNAME:
+        expected = "Basic " + base64.b64encode(f"{FLEET_USERNAME}:{FLEET_PASSWORD}".encode()).decode()
+        if request.headers.get("Authorization") != expected:
+            return web.Response(status=401, headers={"WWW-Authenticate": 'Basic realm="TBerryPrint"'})
+    return await handler(request)
+
+async def index(request: web.Request) -> web.FileResponse:
+    """Tableau de bord de la flotte."""
+    return web.FileResponse(os.path.join(BASE_DIR, "static", "fleet.html"))
+
+async def fleet_status(request: web.Request) -> web.Response:
+    """
+    API de l'état de la flotte.
+
+    Le paramètre "wait" (secondes, 30 au plus) attend un changement par
+    rapport à la version "since" avant de répondre (interrogation longue).
+    """
+    aggregator: FleetAggregator = request.app["aggregator"]
+    try:
+        since = int(request.query.get("since", "-1"))
+        wait = min(30.0, float(request.query.get("wait", "0")))
+    except ValueError:
+        return web.json_response({"success": False, "message": "Paramètres invalides"}, status=400)
+    deadline = time.monotonic() + wait
+    while aggregator.version == since and time.monotonic() < deadline:
+        await aggregator.wait_changed(deadline - time.monotonic())
+    return web.json_response(aggregator.snapshot())
+
+async def node_status(request: web.Request) -> web.Response:
+    """API de l'état détaillé d'un boîtier (toutes les statistiques reçues)."""
+    aggregator: FleetAggregator = request.app["aggregator"]
+    node = aggregator.find(request.match_info["name"])
+    if node is None:
+        return web.json_response({"success": False, "message": "Boîtier inconnu"}, status=404)
+    return web.json_response(node.to_dict(time.time(), full=True))
+
+def create_app(aggregator: FleetAggregator) -> web.Application:
+    """
+    Crée l'application web de la flotte.
+
+    Args:
+        aggregator: Agrégateur (démarré et arrêté avec l'application)
+
+    Returns:
+        web.Application: Application aiohttp
+    """
+    app = web.Application(middlewares=[basic_auth])
+    app["aggregator"] = aggregator
+
+    async def lifecycle(app: web.Application):
+        await aggregator.start()
+        yield
+        await aggregator.stop()
+
+    app.cleanup_ctx.append(lifecycle)
+    app.router.add_get("/", index)
+    app.router.add_get("/api/fleet", fleet_status)
+    app.router.add_get("/api/fleet/{name}", node_status)
+    app.router.add_static("/static", os.path.join(BASE_DIR, "static"))
+    return app
+
+
+# ===== POINT D'ENTRÉE =====
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Agrégateur de flotte TBerryPrint")
+    parser.add_argument("--nodes", default=FLEET_NODES_FILE, help="Fichier de la liste des boîtiers")
+    parser.add_argument("--host", default=FLEET_HOST)
+    parser.add_argument("--port", type=int, default=FLEET_PORT)
+    parser.add_argument("--mode", choices=("stream", "poll"), default=FLEET_MODE)
+    args = parser.parse_args()
+
+    nodes = parse_nodes(args.nodes)
+    print(f"Flotte : {len(nodes)} boîtier(s), mode {args.mode}")
+    aggregator = FleetAggregator(
+        nodes,
+        mode=args.mode,
+        poll_interval=FLEET_POLL_INTERVAL,
+        concurrency=FLEET_CONCURRENCY,
+        request_timeout=FLEET_REQUEST_TIMEOUT,
+        stream_idle_timeout=FLEET_STREAM_IDLE_TIMEOUT,
+        backoff_min=FLEET_BACKOFF_MIN,
+        backoff_max=FLEET_BACKOFF_MAX
+    )
+    web.run_app(create_app(aggregator), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+// ===== TABLEAU DE BORD DE LA FLOTTE ===== \\
+
+// Interrogation longue de /api/fleet : la réponse arrive dès qu'un boîtier change
+const FLEET_WAIT_SECONDS = 25;
+// Intervalle minimal entre deux rafraîchissements (des centaines de boîtiers changent en continu)
+const FLEET_MIN_INTERVAL = 1000;
+const FLEET_RETRY_DELAY = 5000;
+
+const STATE_LABELS = {
+    online: ['fa-check-circle', 'En ligne'],
+    connecting: ['fa-spinner fa-spin', 'Connexion...'],
+    backoff: ['fa-exclamation-circle', 'Injoignable'],
+    auth_failed: ['fa-lock', 'Identifiants refusés']
+};
+
+// État CUPS "arrêtée" (voir get_printer_status_text dans app.py)
+const PRINTER_STOPPED = 5;
+
+let fleet = null;
+let version = -1;
+
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
+function formatPercent(value) {
+    return value === null || value === undefined ? '-' : `${value.toFixed(1)}%`;
+}
+
+function formatAge(age) {
+    if (age === null || age === undefined) return 'jamais';
+    if (age < 60) return `il y a ${Math.round(age)} s`;
+    if (age < 3600) return `il y a ${Math.round(age / 60)} min`;
+    return `il y a ${Math.round(age / 3600)} h`;
+}
+
+function hasProblem(node) {
+    return node.state !== 'online' || node.stale
+        || (node.throttled && node.throttled.length > 0)
+        || node.printers.some(printer => printer.status === PRINTER_STOPPED);
+}
+
+function renderNode(node) {
+    const [icon, label] = STATE_LABELS[node.state] || ['fa-question-circle', node.state];
+    let detail = '';
+    if (node.error) {
+        detail = escapeHtml(node.error);
+        if (node.retry_in !== null) {
+            detail += ` (nouvel essai dans ${Math.round(node.retry_in)} s)`;
+        }
+    }
+    const printers = node.printers.length === 0
+        ? '<span class="warning">Aucune</span>'
+        : node.printers.map(printer => `
+            <span class="printer ${printer.status === PRINTER_STOPPED ? 'stopped' : ''}" title="${escapeHtml(printer.status_text)}">
+                <i class="fas fa-print"></i> ${escapeHtml(printer.name)}${printer.active_jobs ? ` (${printer.active_jobs})` : ''}
+            </span>`).join('');
+    const throttled = node.throttled && node.throttled.length > 0
+        ? ` <i class="fas fa-bolt warning" title="${escapeHtml(node.throttled.join(', '))}"></i>`
+        : '';
+
+    return `
+        <tr class="${node.stale ? 'stale' : ''}">
+            <td>
+                <a href="${escapeHtml(node.url)}" target="_blank">${escapeHtml(node.name)}</a>
+                <span class="node-url">${escapeHtml(node.url)}</span>
+            </td>
+            <td class="state state-${escapeHtml(node.state)}">
+                <i class="fas ${icon}"></i> ${label}
+                <span class="state-detail">${detail}</span>
+            </td>
+            <td>${formatPercent(node.cpu_percent)}</td>
+            <td>${formatPercent(node.ram_percent)}</td>
+            <td>${escapeHtml(node.temperature || '-')}${throttled}</td>
+            <td>${printers}</td>
+            <td>${formatAge(node.age)}</td>
+        </tr>`;
+}
+
+function render() {
+    if (!fleet) return;
+    const summary = fleet.summary;
+    const online = summary.states.online || 0;
+    document.getElementById('summary-online').textContent = online;
+    document.getElementById('summary-nodes').textContent = summary.nodes;
+    document.getElementById('summary-offline').textContent = summary.nodes - online;
+    document.getElementById('summary-printers').textContent = summary.printers;
+    document.getElementById('summary-stopped').textContent = summary.printers_stopped;
+    document.getElementById('summary-jobs').textContent = summary.active_jobs;
+
+    const filter = document.getElementById('filter').value.trim().toLowerCase();
+    const problemsOnly = document.getElementById('problems-only').checked;
+    const nodes = fleet.nodes
+        .filter(node => !problemsOnly || hasProblem(node))
+        .filter(node => !filter
+            || node.name.toLowerCase().includes(filter)
+            || node.url.toLowerCase().includes(filter)
+            || node.printers.some(printer => printer.name.toLowerCase().includes(filter)))
+        // Boîtiers en difficulté en premier, puis par nom
+        .sort((a, b) => (hasProblem(b) - hasProblem(a)) || a.name.localeCompare(b.name));
+
+    document.getElementById('nodes').innerHTML = nodes.map(renderNode).join('');
+}
+
+function refresh() {
+    const started = Date.now();
+    fetch(`/api/fleet?since=${version}&wait=${FLEET_WAIT_SECONDS}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            fleet = data;
+            version = data.version;
+            document.getElementById('connection-status').textContent = '';
+            render();
+            setTimeout(refresh, Math.max(0, FLEET_MIN_INTERVAL - (Date.now() - started)));
+        })
+        .catch(error => {
+            document.getElementById('connection-status').textContent = `Agrégateur injoignable (${error.message})`;
+            setTimeout(refresh, FLEET_RETRY_DELAY);
+        });
+}
+
+document.getElementById('filter').addEventListener('input', render);
+document.getElementById('problems-only').addEventListener('change', render);
+refresh();
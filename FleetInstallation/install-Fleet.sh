@@ -0,0 +1,50 @@
+#!/bin/bash
+
+# Installation de l'agrégateur de flotte, sur la machine qui surveille les boîtiers
+# (un Raspberry Pi dédié ou un serveur du réseau, pas sur chaque boîtier)
+
+source /opt/TBERRYPRINT/fonctions.sh
+
+# Vérification de si le script est utilisé en tant qu'administrateur
+require_root
+
+
+# Installation des bibliothèques Python requises via apt
+log_info "Installation des bibliothèques Python..."
+apt install -y python3-aiohttp python3-dotenv
+
+
+# Liste des boîtiers à compléter
+if [ ! -s /opt/TBERRYPRINT/FleetInstallation/FleetAggregator/nodes.txt ]; then
+    log_warning "Ajouter les boîtiers dans /opt/TBERRYPRINT/FleetInstallation/FleetAggregator/nodes.txt"
+fi
+
+
+# Création du fichier .service
+log_info "Création du service systemd..."
+sudo cat > /etc/systemd/system/TBerryPrintFleet.service << EOF
+[Unit]
+Description=Agregateur de flotte TBerryPrint
+After=network-online.target
+Wants=network-online.target
+
+[Service]
+User=admin
+WorkingDirectory=/opt/TBERRYPRINT/FleetInstallation/FleetAggregator
+ExecStart=/usr/bin/python3 /opt/TBERRYPRINT/FleetInstallation/FleetAggregator/fleet.py
+Restart=always
+# Un descripteur par boîtier suivi (flux /stats/stream)
+LimitNOFILE=8192
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+
+# Rechargement de systemd et activation du service
+log_info "Rechargement des fichiers de configuration..."
+sudo systemctl daemon-reload
+sudo systemctl enable --now TBerryPrintFleet
+
+
+log_success "Installation de l'agrégateur de flotte terminée ! Tableau de bord sur le port 8080."
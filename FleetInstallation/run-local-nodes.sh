@@ -0,0 +1,38 @@
+#!/bin/bash
+
+# Lance plusieurs instances de l'interface web sur la machine locale (ports
+# 5001, 5002...) et génère la liste des boîtiers correspondante, pour essayer
+# l'agrégateur de flotte sans Raspberry Pi.
+#
+# Utilisation : ./run-local-nodes.sh [nombre] [premier_port]
+# Puis : python3 FleetAggregator/fleet.py --nodes /tmp/tberryprint-fleet/nodes.txt
+
+COUNT=${1:-3}
+FIRST_PORT=${2:-5001}
+ROOT=$(cd "$(dirname "$0")/.." && pwd)
+WORK_DIR=/tmp/tberryprint-fleet
+
+mkdir -p "$WORK_DIR"
+: > "$WORK_DIR/nodes.txt"
+
+PIDS=()
+for i in $(seq 0 $((COUNT - 1))); do
+    PORT=$((FIRST_PORT + i))
+    DATA_DIR="$WORK_DIR/node-$PORT"
+    mkdir -p "$DATA_DIR"
+    # Fichiers de données séparés : chaque instance a son propre journal et son historique
+    SERVER_HOST=127.0.0.1 \
+    SERVER_PORT=$PORT \
+    HISTORY_PATH="$DATA_DIR/metrics_history.bin" \
+    JOURNAL_PATH="$DATA_DIR/print_journal.wal" \
+    RASTER_CACHE_DIR="$DATA_DIR/raster_cache" \
+    SPOOLER_ENABLED=0 \
+        python3 "$ROOT/FlaskInstallation/InterfaceFlask/app.py" > "$DATA_DIR/app.log" 2>&1 &
+    PIDS+=($!)
+    echo "http://127.0.0.1:$PORT" >> "$WORK_DIR/nodes.txt"
+    echo "Instance $PORT lancée (journal : $DATA_DIR/app.log)"
+done
+
+trap 'kill ${PIDS[*]} 2>/dev/null' EXIT INT TERM
+echo "Liste des boîtiers : $WORK_DIR/nodes.txt (Ctrl+C pour tout arrêter)"
+wait
@@ -0,0 +1,615 @@
+#!/usr/bin/env python3
+"""
+TBerryPrint - Banc d'essai : charge de l'interface Flask et chaîne d'impression
+
+Démarre la vraie application (app.py, serveur cheroot) dans un processus
+séparé, entourée de remplaçants locaux, puis mesure:
+- Le démarrage à froid : délais jusqu'à la première réponse, au premier
+  tableau de bord et à la disponibilité annoncée par /healthz (avec
+  --socket-activation, le port est ouvert avant le lancement, comme par
+  InterfaceFlask.socket)
+- La latence de chaque route (p50, p90, p99, max) et son débit (requêtes/s)
+  sous plusieurs niveaux de clients simultanés (connexions maintenues)
+- Le débit de tickets de bout en bout : /api/print/ticket (un ticket par
+  requête) et /api/print/batch (un lot par requête), jusqu'à la fin de la
+  tâche dans CUPS (vérifiée dans le journal des tickets)
+
+Remplaçants (benchmarks/fakes):
+- cups/cups.py : module pycups simulé (latence IPP réglable), cups/bin/cupsfilter
+- fonctions.sh : rejoue les sorties de iwconfig, ip addr et nmcli enregistrées
+  sur un Raspberry Pi (recordings/), avec leur durée
+- system/bin : sudo (exécution directe) et vcgencmd
+psutil et la télémétrie lisent le /proc et le /sys de la machine de mesure.
+
+Utilisation:
+    python3 benchmarks/bench_app.py [--duration S] [--clients 1,8,32] [--routes stats,ticket]
+                                    [--output resultats.json] [--compare reference.json]
+    python3 benchmarks/bench_app.py --input nouveau.json --compare reference.json
+
+Avec --real-cups, le module pycups installé et le cupsd local sont utilisés :
+la file désignée par --printer doit exister (ex: lpadmin -p BENCH -E -v
+file:///dev/null, avec "FileDevice Yes" dans cups-files.conf).
+
+Les résultats JSON (version, machine, paramètres, mesures) servent de
+référence : --compare signale les routes dont le p99 ou le débit (et les
+délais de démarrage) se sont dégradés de plus de --threshold % et renvoie
+alors le code 1.
+"""
+
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
+
+from bench_star_line import SAMPLE_TICKET, write_logo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, "FlaskInstallation", "InterfaceFlask")
+FAKES_DIR = os.path.join(ROOT, "benchmarks", "fakes")
+
+USERNAME = "bench"
+PASSWORD = "bench"
+
+# Délai maximal de démarrage de l'application
+STARTUP_TIMEOUT = 60.0
+
+# Activation par socket : argv = [descripteur transmis, commande de l'application...]
+SOCKET_ACTIVATION_LAUNCHER = (
+    "import os, sys\n"
+    "fd = int(sys.argv[1])\n"
+    "if fd != 3:\n"
+    "    os.dup2(fd, 3)\n"
+    "    os.close(fd)\n"
+    "os.set_inheritable(3, True)\n"
+    "os.environ['LISTEN_PID'] = str(os.getpid())\n"
+    "os.execv(sys.argv[2], sys.argv[2:])\n"
+)
+
+# Format des résultats (incrémenté si leur structure change)
+RESULTS_VERSION = 1
+
+# Réseaux déjà connus (fichiers .nmconnection) : une partie des réseaux enregistrés
+KNOWN_NETWORKS = ("TBerry-Atelier", "iPhone Hugo")
+
+# Routes mesurées : (méthode, chemin, corps, type du corps, tickets par requête)
+Request = Tuple[str, str, Optional[bytes], Optional[str], int]
+
+
+def build_routes(printer: str, batch_size: int) -> Dict[str, Request]:
+    """Requêtes de chaque scénario (chemins et corps prêts à envoyer)."""
+    printer = urllib.parse.quote(printer)
+    ticket = json.dumps(SAMPLE_TICKET).encode()
+    batch = json.dumps({"cut": "partial", "tickets": [SAMPLE_TICKET] * batch_size}).encode()
+    return {
+        "stats": ("GET", "/stats", None, None, 0),
+        "dashboard": ("GET", "/", None, None, 0),
+        "wifi_setup": ("GET", "/wifi_setup", None, None, 0),
+        "wifi_networks": ("GET", "/api/wifi_networks", None, None, 0),
+        "test_print": ("POST", f"/test_print/{printer}", b"", None, 0),
+        "ticket": ("POST", f"/api/print/ticket?printer={printer}", ticket, "application/json", 1),
+        "batch": ("POST", f"/api/print/batch?printer={printer}", batch, "application/json", batch_size)
+    }
+
+
+# ===== APPLICATION SOUS TEST =====
+
+def free_port() -> int:
+    """Port TCP local libre."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def prepare_environment(work_dir: str, port: int, args: argparse.Namespace) -> Dict[str, str]:
+    """Variables d'environnement de l'application : remplaçants et données dans work_dir."""
+    logo_dir = os.path.join(work_dir, "logos")
+    nm_dir = os.path.join(work_dir, "system-connections")
+    os.makedirs(logo_dir)
+    os.makedirs(nm_dir)
+    write_logo(logo_dir)
+    for ssid in KNOWN_NETWORKS:
+        open(os.path.join(nm_dir, f"{ssid}.nmconnection"), "w").close()
+
+    paths = [os.path.join(FAKES_DIR, "system", "bin")]
+    python_paths = []
+    if not args.real_cups:
+        paths.append(os.path.join(FAKES_DIR, "cups", "bin"))
+        python_paths.append(os.path.join(FAKES_DIR, "cups"))
+    if os.environ.get("PYTHONPATH"):
+        python_paths.append(os.environ["PYTHONPATH"])
+
+    env = dict(os.environ)
+    env.update({
+        "PATH": os.pathsep.join(paths + [os.environ.get("PATH", os.defpath)]),
+        "PYTHONPATH": os.pathsep.join(python_paths),
+        "BENCH_CUPS_PRINTERS": args.printer,
+        "BENCH_CUPS_LATENCY_MS": str(args.cups_latency_ms),
+        "BENCH_REPLAY_DELAYS": "1" if args.replay_delays else "0",
+        "FONCTIONS_SH": os.path.join(FAKES_DIR, "fonctions.sh"),
+        # Service d'assistance absent : les opérations passent par le fonctions.sh simulé
+        "HELPER_SOCKET": os.path.join(work_dir, "helper.sock"),
+        "DEBUG": "0",
+        "SERVER_HOST": "127.0.0.1",
+        "SERVER_PORT": str(port),
+        "SERVER_THREADS": str(args.threads),
+        "ADMIN_USERNAME": USERNAME,
+        "ADMIN_PASSWORD": PASSWORD,
+        "HISTORY_PATH": os.path.join(work_dir, "metrics_history.bin"),
+        "JOURNAL_PATH": os.path.join(work_dir, "print_journal.wal"),
+        "RASTER_CACHE_DIR": os.path.join(work_dir, "raster_cache"),
+        "TICKET_LOGO_DIR": logo_dir,
+        "NM_CONNECTIONS_DIR": nm_dir,
+        "TEST_PRINT_FILE": os.path.join(ROOT, "FlaskInstallation", "testImpressionInterface.pdf"),
+        # Interface absente : le statut Wi-Fi vient des sorties enregistrées
+        "WIFI_INTERFACE": "tbbench0",
+        "HOTPLUG_ENABLED": "0",
+        "SPOOLER_ENABLED": "0",
+        "PROFILER_ENABLED": "0"
+    })
+    return env
+
+def start_app(env: Dict[str, str], port: int, log_path: str, socket_activation: bool) -> Tuple[subprocess.Popen, float]:
+    """
+    Lance app.py et attend qu'il serve la page de connexion.
+
+    Args:
+        env: Variables d'environnement de l'application
+        port: Port d'écoute
+        log_path: Fichier recevant la sortie de l'application
+        socket_activation: Ouvrir le port avant le lancement et le transmettre
+            comme systemd (descripteur 3, LISTEN_PID et LISTEN_FDS)
+
+    Returns:
+        Tuple[subprocess.Popen, float]: Processus et instant (perf_counter) de son lancement
+    """
+    command = [sys.executable, os.path.join(APP_DIR, "app.py")]
+    listen_socket = None
+    pass_fds = ()
+    if socket_activation:
+        listen_socket = socket.socket()
+        listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listen_socket.bind(("127.0.0.1", port))
+        listen_socket.listen(64)
+        # Petit lanceur : place la socket en 3 et fixe LISTEN_PID avant exec (même pid)
+        command = [sys.executable, "-c", SOCKET_ACTIVATION_LAUNCHER, str(listen_socket.fileno()), *command]
+        env = {**env, "LISTEN_FDS": "1"}
+        pass_fds = (listen_socket.fileno(),)
+
+    launched = time.perf_counter()
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            command, cwd=APP_DIR, env=env, stdout=log, stderr=subprocess.STDOUT, pass_fds=pass_fds
+        )
+    if listen_socket is not None:
+        listen_socket.close()
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=STARTUP_TIMEOUT)
+            connection.request("GET", "/login")
+            status = connection.getresponse().status
+            connection.close()
+            if status == 200:
+                return process, launched
+        except OSError:
+            time.sleep(0.01)
+    stop_app(process)
+    with open(log_path, errors="replace") as f:
+        log_tail = "".join(f.readlines()[-20:])
+    raise RuntimeError(f"L'application n'a pas démarré :\n{log_tail}")
+
+def measure_startup(port: int, launched: float) -> Tuple[str, Dict[str, Any]]:
+    """
+    Mesure le démarrage à froid : première réponse, premier tableau de bord et disponibilité (/healthz).
+
+    Args:
+        port: Port de l'application
+        launched: Instant (perf_counter) du lancement du processus
+
+    Returns:
+        Tuple[str, Dict]: Cookie de session et délais en secondes depuis le lancement
+        (ainsi que les jalons mesurés par l'application elle-même)
+    """
+    first_response = time.perf_counter() - launched
+    cookie = login(port)
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=STARTUP_TIMEOUT)
+    error = send(connection, ("GET", "/", None, None, 0), cookie)
+    first_dashboard = time.perf_counter() - launched
+    if error is not None:
+        raise RuntimeError(f"Le tableau de bord échoue : {error}")
+    while True:
+        connection.request("GET", "/healthz")
+        response = connection.getresponse()
+        health = json.loads(response.read())
+        if response.status != 503 or time.perf_counter() - launched > STARTUP_TIMEOUT:
+            break
+        time.sleep(0.01)
+    connection.close()
+    return cookie, {
+        "first_response": round(first_response, 3),
+        "first_dashboard": round(first_dashboard, 3),
+        "ready": round(time.perf_counter() - launched, 3),
+        "status": health.get("status"),
+        "app": health.get("startup", {}).get("since_process_start", {})
+    }
+
+def stop_app(process: subprocess.Popen) -> None:
+    """Arrête l'application (SIGTERM, puis SIGKILL)."""
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def login(port: int) -> str:
+    """Ouvre une session et renvoie son cookie."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    connection.request(
+        "POST", "/login",
+        urllib.parse.urlencode({"username": USERNAME, "password": PASSWORD}),
+        {"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    response = connection.getresponse()
+    response.read()
+    connection.close()
+    cookie = response.getheader("Set-Cookie")
+    if response.status != 302 or not cookie:
+        raise RuntimeError(f"Connexion refusée (HTTP {response.status})")
+    return cookie.split(";", 1)[0]
+
+def get_json(port: int, cookie: str, path: str) -> Dict[str, Any]:
+    """Lit une route JSON de l'application."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    connection.request("GET", path, headers={"Cookie": cookie})
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return json.loads(body)
+
+
+# ===== GÉNÉRATION DE CHARGE =====
+
+def send(connection: http.client.HTTPConnection, route: Request, cookie: str) -> Optional[str]:
+    """
+    Envoie une requête et lit toute la réponse.
+
+    Returns:
+        Optional[str]: None si la réponse est un succès (2xx), sinon le statut HTTP
+
+    Raises:
+        OSError, http.client.HTTPException: Connexion perdue
+    """
+    method, path, body, content_type, _ = route
+    headers = {"Cookie": cookie}
+    if content_type:
+        headers["Content-Type"] = content_type
+    connection.request(method, path, body, headers)
+    response = connection.getresponse()
+    response.read()
+    return None if 200 <= response.status < 300 else f"HTTP {response.status}"
+
+def client_loop(
+    port: int,
+    cookie: str,
+    route: Request,
+    deadline: float,
+    record_after: float,
+    samples: List[float],
+    errors: List[str]
+) -> None:
+    """Envoie les requêtes d'un client (connexion maintenue) jusqu'à l'échéance."""
+    connection = None
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        if connection is None:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        try:
+            error = send(connection, route, cookie)
+        except (OSError, http.client.HTTPException) as e:
+            connection.close()
+            connection = None
+            error = type(e).__name__
+        elapsed = time.perf_counter() - start
+        if start < record_after:
+            # Échauffement : requête non comptée
+            continue
+        if error is None:
+            samples.append(elapsed)
+        else:
+            errors.append(error)
+    if connection is not None:
+        connection.close()
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Percentile (rang le plus proche) d'une liste triée non vide."""
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(percent / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def run_scenario(
+    port: int,
+    cookie: str,
+    name: str,
+    route: Request,
+    clients: int,
+    duration: float,
+    warmup: float
+) -> Dict[str, Any]:
+    """
+    Mesure une route avec un nombre donné de clients simultanés.
+
+    Args:
+        port: Port de l'application
+        cookie: Cookie de session
+        name: Nom de la route
+        route: Requête envoyée en boucle par chaque client
+        clients: Nombre de clients (un thread et une connexion chacun)
+        duration: Durée de la mesure en secondes
+        warmup: Durée de l'échauffement non compté en secondes
+
+    Returns:
+        Dict: Requêtes, erreurs, débit, latences (ms) et, pour l'impression, tickets par seconde
+    """
+    per_client_samples: List[List[float]] = [[] for _ in range(clients)]
+    per_client_errors: List[List[str]] = [[] for _ in range(clients)]
+    record_after = time.perf_counter() + warmup
+    deadline = record_after + duration
+    threads = [
+        threading.Thread(
+            target=client_loop,
+            args=(port, cookie, route, deadline, record_after, per_client_samples[index], per_client_errors[index]),
+            daemon=True
+        )
+        for index in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Les dernières requêtes dépassent l'échéance : le débit est rapporté à la durée réelle
+    elapsed = max(duration, time.perf_counter() - record_after)
+
+    samples = sorted(sample for client in per_client_samples for sample in client)
+    errors: Dict[str, int] = {}
+    for client in per_client_errors:
+        for error in client:
+            errors[error] = errors.get(error, 0) + 1
+    latency: Dict[str, Optional[float]] = dict.fromkeys(("mean", "p50", "p90", "p99", "max"))
+    if samples:
+        latency["mean"] = round(sum(samples) / len(samples) * 1000, 3)
+        for p in (50, 90, 99):
+            latency[f"p{p}"] = round(percentile(samples, p) * 1000, 3)
+        latency["max"] = round(samples[-1] * 1000, 3)
+    result = {
+        "route": name,
+        "method": route[0],
+        "path": route[1],
+        "clients": clients,
+        "duration": round(elapsed, 3),
+        "requests": len(samples),
+        "errors": sum(errors.values()),
+        "error_kinds": errors,
+        "requests_per_second": round(len(samples) / elapsed, 2),
+        "latency_ms": latency
+    }
+    if route[4]:
+        result["tickets"] = len(samples) * route[4]
+        result["tickets_per_second"] = round(len(samples) * route[4] / elapsed, 2)
+    return result
+
+def prime(port: int, cookie: str, routes: Dict[str, Request]) -> None:
+    """Envoie chaque requête une fois (caches remplis, premier scan Wi-Fi) et vérifie qu'elle réussit."""
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    try:
+        for name, route in routes.items():
+            error = send(connection, route, cookie)
+            if error is not None:
+                raise RuntimeError(f"La route {name} ({route[0]} {route[1]}) échoue : {error}")
+    finally:
+        connection.close()
+
+def wait_for_journal(port: int, cookie: str, timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    Attend que toutes les tâches soumises soient terminées dans CUPS (aucun ticket
+    "accepted" ou "submitted" dans le journal).
+
+    Args:
+        port: Port de l'application
+        cookie: Cookie de session
+        timeout: Délai maximal en secondes
+
+    Returns:
+        Dict: Tickets par état du journal, délai d'attente après la fin de la charge
+        et indicateur de tâches encore en cours à l'échéance
+    """
+    start = time.perf_counter()
+    while True:
+        tickets = get_json(port, cookie, "/api/journal/status").get("tickets", {})
+        pending = tickets.get("accepted", 0) + tickets.get("submitted", 0)
+        if not pending or time.perf_counter() - start > timeout:
+            return {"tickets": tickets, "pending": pending, "drain_seconds": round(time.perf_counter() - start, 3)}
+        time.sleep(0.05)
+
+
+# ===== RÉSULTATS =====
+
+def git_version() -> Dict[str, Any]:
+    """Version du code mesuré (commit et modifications non enregistrées)."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = bool(subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+def machine() -> Dict[str, Any]:
+    """Description de la machine de mesure."""
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version()
+    }
+
+def print_results(results: Dict[str, Any]) -> None:
+    """Affiche le démarrage à froid et le tableau des mesures."""
+    startup = results.get("startup")
+    if startup:
+        print(f"Démarrage : première réponse {startup['first_response']:.2f} s, premier tableau de bord "
+              f"{startup['first_dashboard']:.2f} s, prêt (/healthz) {startup['ready']:.2f} s après le lancement")
+    print(f"{'route':<14} {'clients':>7} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'erreurs':>8}")
+    for scenario in results["scenarios"]:
+        latency = {name: "-" if value is None else f"{value:.2f}" for name, value in scenario["latency_ms"].items()}
+        print(f"{scenario['route']:<14} {scenario['clients']:>7} {scenario['requests_per_second']:>9.1f} "
+              f"{latency['p50']:>9} {latency['p90']:>9} {latency['p99']:>9} {latency['max']:>9} {scenario['errors']:>8}")
+    for scenario in results["scenarios"]:
+        if "tickets_per_second" in scenario:
+            print(f"Tickets de bout en bout ({scenario['route']}, {scenario['clients']} clients) : "
+                  f"{scenario['tickets_per_second']:.1f} tickets/s")
+    journal = results.get("journal")
+    if journal:
+        if journal["pending"]:
+            print(f"Journal : {journal['pending']} tâche(s) encore en cours après {journal['drain_seconds']:.1f} s")
+        else:
+            print(f"Journal : toutes les tâches terminées {journal['drain_seconds']:.2f} s après la fin de la charge")
+
+def compare(base: Dict[str, Any], current: Dict[str, Any], threshold: float) -> int:
+    """
+    Compare deux séries de résultats (mêmes route et nombre de clients).
+
+    Args:
+        base: Résultats de référence
+        current: Nouveaux résultats
+        threshold: Dégradation tolérée en pourcentage (p99 et débit)
+
+    Returns:
+        int: Nombre de scénarios dégradés au-delà du seuil
+    """
+    reference = {(scenario["route"], scenario["clients"]): scenario for scenario in base["scenarios"]}
+    print(f"Comparaison avec {base['version'].get('commit')} ({base['date']}) :")
+    if base.get("machine") != current.get("machine"):
+        print("  Attention : machines de mesure différentes")
+    regressions = 0
+    for scenario in current["scenarios"]:
+        old = reference.get((scenario["route"], scenario["clients"]))
+        if old is None or not old["requests"] or not scenario["requests"]:
+            continue
+        p99_change = (scenario["latency_ms"]["p99"] / old["latency_ms"]["p99"] - 1) * 100
+        rate_change = (scenario["requests_per_second"] / old["requests_per_second"] - 1) * 100
+        degraded = p99_change > threshold or rate_change < -threshold
+        regressions += degraded
+        print(f"  {scenario['route']:<14} {scenario['clients']:>4} clients : p99 {p99_change:+7.1f} %, "
+              f"débit {rate_change:+7.1f} %{'  <- dégradation' if degraded else ''}")
+    old_startup, new_startup = base.get("startup"), current.get("startup")
+    if old_startup and new_startup:
+        for phase in ("first_response", "first_dashboard", "ready"):
+            if not old_startup.get(phase):
+                continue
+            change = (new_startup[phase] / old_startup[phase] - 1) * 100
+            degraded = change > threshold
+            regressions += degraded
+            print(f"  démarrage {phase:<15} : {change:+7.1f} %{'  <- dégradation' if degraded else ''}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=5.0, help="durée de mesure par scénario (s)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="échauffement non compté par scénario (s)")
+    parser.add_argument("--clients", default="1,8,32", help="nombres de clients simultanés")
+    parser.add_argument("--routes", default="stats,dashboard,wifi_setup,wifi_networks,test_print,ticket,batch")
+    parser.add_argument("--batch-size", type=int, default=50, help="tickets par requête /api/print/batch")
+    parser.add_argument("--printer", default="TSP743II", help="file CUPS (simulée, ou réelle avec --real-cups)")
+    parser.add_argument("--cups-latency-ms", type=float, default=2.0, help="latence de chaque requête IPP simulée")
+    parser.add_argument("--no-replay-delays", dest="replay_delays", action="store_false",
+                        help="rejouer les sorties enregistrées sans la durée des commandes")
+    parser.add_argument("--real-cups", action="store_true", help="utiliser pycups et le cupsd local")
+    parser.add_argument("--socket-activation", action="store_true",
+                        help="transmettre le port déjà ouvert, comme InterfaceFlask.socket")
+    parser.add_argument("--threads", type=int, default=16, help="threads du serveur (SERVER_THREADS)")
+    parser.add_argument("--output", help="fichier JSON des résultats")
+    parser.add_argument("--input", help="résultats existants à comparer (aucune mesure)")
+    parser.add_argument("--compare", help="résultats de référence")
+    parser.add_argument("--threshold", type=float, default=10.0, help="dégradation tolérée (%%)")
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input) as f:
+            results = json.load(f)
+        print_results(results)
+    else:
+        all_routes = build_routes(args.printer, args.batch_size)
+        names = [name.strip() for name in args.routes.split(",") if name.strip()]
+        unknown = [name for name in names if name not in all_routes]
+        if unknown:
+            parser.error(f"routes inconnues : {', '.join(unknown)} (disponibles : {', '.join(all_routes)})")
+        routes = {name: all_routes[name] for name in names}
+        levels = [int(level) for level in args.clients.split(",")]
+
+        work_dir = tempfile.mkdtemp(prefix="tberry-bench-")
+        port = free_port()
+        process, launched = start_app(
+            prepare_environment(work_dir, port, args), port, os.path.join(work_dir, "app.log"), args.socket_activation
+        )
+        try:
+            cookie, startup = measure_startup(port, launched)
+            prime(port, cookie, routes)
+            scenarios = []
+            for name, route in routes.items():
+                for clients in levels:
+                    scenarios.append(run_scenario(port, cookie, name, route, clients, args.duration, args.warmup))
+                    print(f"  {name} ({clients} clients) : {scenarios[-1]['requests_per_second']:.1f} req/s",
+                          file=sys.stderr)
+            journal = wait_for_journal(port, cookie) if any(route[4] for route in routes.values()) else None
+        finally:
+            stop_app(process)
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        results = {
+            "format": RESULTS_VERSION,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "version": git_version(),
+            "machine": machine(),
+            "parameters": {
+                name: value for name, value in vars(args).items()
+                if name not in ("output", "input", "compare", "threshold")
+            },
+            "startup": startup,
+            "scenarios": scenarios,
+            "journal": journal
+        }
+        print_results(results)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+                f.write("\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = json.load(f)
+        if compare(base, results, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+TBerryPrint - Banc d'essai : débit d'un groupe d'imprimantes
+
+Crée des files CUPS simulées (backend CupsInstallation/backend/tberry-sim),
+puis envoie le même lot de tâches à un groupe de 1, 2, ... N imprimantes et
+mesure le temps nécessaire pour tout imprimer.
+
+Utilisation (root pour --setup et --cleanup):
+    sudo python3 benchmarks/bench_printer_pool.py --setup --printers 3
+    python3 benchmarks/bench_printer_pool.py --printers 3 --jobs 30
+    sudo python3 benchmarks/bench_printer_pool.py --cleanup --printers 3
+"""
+
+import argparse
+import io
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "FlaskInstallation", "InterfaceFlask"))
+
+from cups_client import FORMAT_RAW, CupsClient  # noqa: E402
+from printer_pool import PrinterPool  # noqa: E402
+
+BACKEND = os.path.join(ROOT, "CupsInstallation", "backend", "tberry-sim")
+BACKEND_DIR = "/usr/lib/cups/backend"
+QUEUE_PREFIX = "tberry-sim"
+
+
+def queue_name(index: int) -> str:
+    return f"{QUEUE_PREFIX}{index}"
+
+
+def setup(count: int, rate: int, overhead: float) -> None:
+    """Installe le backend simulé et crée les files CUPS."""
+    shutil.copy(BACKEND, os.path.join(BACKEND_DIR, "tberry-sim"))
+    os.chmod(os.path.join(BACKEND_DIR, "tberry-sim"), 0o755)
+    for index in range(1, count + 1):
+        uri = f"tberry-sim://{queue_name(index)}?rate={rate}&overhead={overhead}"
+        subprocess.run(["lpadmin", "-p", queue_name(index), "-E", "-v", uri, "-m", "raw"], check=True)
+    print(f"{count} file(s) simulée(s) créée(s)")
+
+
+def cleanup(count: int) -> None:
+    """Supprime les files CUPS simulées."""
+    for index in range(1, count + 1):
+        subprocess.run(["lpadmin", "-x", queue_name(index)])
+
+
+def run(client: CupsClient, members: list, jobs: int, size: int) -> dict:
+    """Envoie un lot de tâches au groupe et attend qu'elles soient toutes imprimées."""
+    pool = PrinterPool(client, {"bench": members})
+    payload = b"\x1b@" + b"\x00" * (size - 2)
+    distribution = {member: 0 for member in members}
+
+    start = time.perf_counter()
+    for number in range(jobs):
+        printer = pool.resolve("bench")
+        client.submit_stream(printer, f"bench-{number}", io.BytesIO(payload), {}, FORMAT_RAW)
+        distribution[printer] += 1
+    while any(pool.queue_lengths().get(member, 0) for member in members):
+        time.sleep(0.1)
+    elapsed = time.perf_counter() - start
+    return {"elapsed": elapsed, "throughput": jobs / elapsed, "distribution": distribution}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--printers", type=int, default=3, help="Nombre maximal d'imprimantes simulées")
+    parser.add_argument("--jobs", type=int, default=30, help="Tâches par mesure")
+    parser.add_argument("--size", type=int, default=20000, help="Taille d'une tâche (octets)")
+    parser.add_argument("--rate", type=int, default=40000, help="Débit simulé (octets/s)")
+    parser.add_argument("--overhead", type=float, default=0.5, help="Durée fixe par tâche (s)")
+    parser.add_argument("--setup", action="store_true", help="Créer les files simulées (root)")
+    parser.add_argument("--cleanup", action="store_true", help="Supprimer les files simulées (root)")
+    args = parser.parse_args()
+
+    if args.setup:
+        setup(args.printers, args.rate, args.overhead)
+        return 0
+    if args.cleanup:
+        cleanup(args.printers)
+        return 0
+
+    client = CupsClient()
+    client.start()
+    missing = [queue_name(i) for i in range(1, args.printers + 1) if queue_name(i) not in client.printers()]
+    if missing:
+        print(f"Files simulées absentes ({', '.join(missing)}) : lancer d'abord --setup")
+        return 1
+
+    baseline = None
+    for count in range(1, args.printers + 1):
+        members = [queue_name(i) for i in range(1, count + 1)]
+        result = run(client, members, args.jobs, args.size)
+        baseline = baseline or result["throughput"]
+        print(f"{count} imprimante(s) : {result['throughput']:.2f} tâches/s "
+              f"(x{result['throughput'] / baseline:.2f}), {result['elapsed']:.1f} s, "
+              f"répartition {result['distribution']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
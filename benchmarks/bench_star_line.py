@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+TBerryPrint - Banc d'essai : rendu Star Line Mode contre la chaîne PDF
+
+Compare le temps nécessaire pour obtenir les données prêtes à envoyer à
+la TSP700II :
+- Chaîne PDF : cupsfilter (pdftoraster/ghostscript puis rastertostar) avec tsp700II.ppd
+- Rendu direct : star_line.StarLineRenderer (premier ticket, puis tickets suivants)
+
+Utilisation:
+    python3 benchmarks/bench_star_line.py [--pdf FICHIER] [--ppd FICHIER] [--runs N]
+
+La chaîne PDF nécessite cupsfilter et le filtre rastertostar installés
+(CupsInstallation/install-Cups.sh) ; sinon seul le rendu direct est mesuré.
+"""
+
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "FlaskInstallation", "InterfaceFlask"))
+
+# Ticket représentatif : logo, texte, code-barres et QR code
+SAMPLE_TICKET = {
+    "width": 80,
+    "cut": "partial",
+    "items": [
+        {"type": "logo", "name": "logo.pbm", "align": "center"},
+        {"type": "text", "text": "TBERRYPRINT", "bold": True, "size": 2, "align": "center"},
+        {"type": "text", "text": "Billet d'entrée - Adulte", "align": "center"},
+        {"type": "separator"},
+        {"type": "text", "text": "Date : 18/10/2026 14:30\nPlace : Libre\nPrix : 12,50 €"},
+        {"type": "separator"},
+        {"type": "barcode", "data": "TBP-000042-2026", "symbology": "code128", "align": "center"},
+        {"type": "qr", "data": "https://tberryprint.local/billet/000042", "align": "center"},
+        {"type": "feed", "lines": 2}
+    ]
+}
+
+
+def write_logo(directory: str, width: int = 384, height: int = 96) -> None:
+    """Crée un logo PBM de test (damier) dans le répertoire des logos."""
+    row = bytes((0xF0 if (x // 8) % 2 else 0x0F) for x in range(width // 8))
+    with open(os.path.join(directory, "logo.pbm"), "wb") as f:
+        f.write(f"P4\n{width} {height}\n".encode())
+        for line in range(height):
+            f.write(row if (line // 8) % 2 else bytes(255 - b for b in row))
+
+
+def bench_star_line(runs: int) -> dict:
+    """Mesure le rendu direct : premier ticket (import et logo compris) puis régime établi."""
+    with tempfile.TemporaryDirectory() as logo_dir:
+        write_logo(logo_dir)
+        start = time.perf_counter()
+        from star_line import StarLineRenderer
+        renderer = StarLineRenderer(logo_dir)
+        data = renderer.render(SAMPLE_TICKET)
+        first = time.perf_counter() - start
+
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            renderer.render(SAMPLE_TICKET)
+            timings.append(time.perf_counter() - start)
+    return {"first": first, "median": statistics.median(timings), "bytes": len(data)}
+
+
+def bench_pdf(pdf: str, ppd: str, runs: int) -> dict:
+    """Mesure la chaîne PDF complète avec cupsfilter (un processus par ticket)."""
+    timings = []
+    size = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(
+            ["cupsfilter", "-p", ppd, "-o", "media=Custom.80x120mm", pdf],
+            capture_output=True
+        )
+        timings.append(time.perf_counter() - start)
+        if result.returncode != 0 or not result.stdout:
+            raise RuntimeError(result.stderr.decode(errors="replace").strip() or "cupsfilter a échoué")
+        size = len(result.stdout)
+    return {"first": timings[0], "median": statistics.median(timings), "bytes": size}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pdf", default=os.path.join(ROOT, "FlaskInstallation", "testImpressionInterface.pdf"))
+    parser.add_argument("--ppd", default=os.path.join(ROOT, "CupsInstallation", "tsp700II.ppd"))
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    star = bench_star_line(max(1, args.runs * 50))
+    print(f"Star Line Mode : premier ticket {star['first'] * 1000:.2f} ms, "
+          f"ensuite {star['median'] * 1000:.3f} ms (médiane), {star['bytes']} octets")
+
+    if shutil.which("cupsfilter") is None:
+        print("Chaîne PDF : cupsfilter introuvable, mesure ignorée")
+        return 0
+    try:
+        pdf = bench_pdf(args.pdf, args.ppd, max(1, args.runs))
+    except RuntimeError as e:
+        print(f"Chaîne PDF : erreur ({e})")
+        return 1
+    print(f"Chaîne PDF     : premier ticket {pdf['first'] * 1000:.2f} ms, "
+          f"ensuite {pdf['median'] * 1000:.3f} ms (médiane), {pdf['bytes']} octets")
+    print(f"Gain sur le premier ticket : x{pdf['first'] / star['first']:.1f}, "
+          f"en régime établi : x{pdf['median'] / star['median']:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+TBerryPrint - Banc d'essai : télémétrie directe contre un fork par lecture
+
+Compare, pour chaque mesure du tableau de bord, la lecture directe du
+module telemetry (descripteurs gardés ouverts, ioctl) et l'approche
+précédente (un sous-processus par lecture):
+- Température : zone thermique sysfs contre "vcgencmd measure_temp"
+- Bridage : get_throttled contre "vcgencmd get_throttled"
+- Adresse IP : ioctl SIOCGIFADDR contre une socket UDP vers 10.254.254.254
+- SSID : ioctl SIOCGIWESSID contre "iwconfig wlan0"
+- CPU : /proc/stat contre "cat /proc/stat" (référence de coût d'un fork)
+
+Utilisation:
+    python3 benchmarks/bench_telemetry.py [--runs N] [--interface wlan0]
+
+Les commandes absentes (ex: vcgencmd hors Raspberry Pi) sont ignorées.
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "FlaskInstallation", "InterfaceFlask"))
+
+from telemetry import Telemetry  # noqa: E402
+
+
+def measure(function, runs: int) -> list:
+    """Durées (µs) de runs appels."""
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        durations.append((time.perf_counter() - start) * 1e6)
+    return durations
+
+
+def udp_ip() -> str:
+    """Méthode précédente de get_ip()."""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.settimeout(0)
+    try:
+        s.connect(("10.254.254.254", 1))
+        return s.getsockname()[0]
+    except Exception:
+        return "127.0.0.1"
+    finally:
+        s.close()
+
+
+def fork(command: list):
+    """Méthode précédente : un sous-processus par lecture (None si la commande est absente)."""
+    if shutil.which(command[0]) is None:
+        return None
+    return lambda: subprocess.run(command, capture_output=True, text=True)
+
+
+def report(name: str, direct, previous, runs: int) -> None:
+    direct_us = measure(direct, runs)
+    line = f"{name:<12} direct  médiane {statistics.median(direct_us):9.1f} µs  max {max(direct_us):9.1f} µs"
+    if previous is None:
+        print(line + "  (pas de méthode précédente disponible)")
+        return
+    # Les forks sont beaucoup plus lents : moins de répétitions suffisent
+    previous_us = measure(previous, max(5, runs // 50))
+    ratio = statistics.median(previous_us) / max(statistics.median(direct_us), 0.001)
+    print(line)
+    print(f"{'':<12} avant   médiane {statistics.median(previous_us):9.1f} µs  max {max(previous_us):9.1f} µs  (x{ratio:.0f})")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=1000, help="Lectures directes par mesure")
+    parser.add_argument("--interface", default="wlan0", help="Interface Wi-Fi")
+    args = parser.parse_args()
+
+    telemetry = Telemetry()
+    telemetry.cpu_percent_per_core()
+
+    available = {
+        "température": telemetry.temperature() is not None,
+        "bridage": telemetry.throttled() is not None,
+        "ssid": telemetry.wifi_ssid(args.interface) is not None
+    }
+    print(f"Mesures disponibles : {', '.join(name for name, ok in available.items() if ok) or 'aucune (hors Raspberry Pi ?)'}")
+
+    if available["température"]:
+        report("température", telemetry.temperature, fork(["vcgencmd", "measure_temp"]), args.runs)
+    if available["bridage"]:
+        report("bridage", telemetry.throttled, fork(["vcgencmd", "get_throttled"]), args.runs)
+    report("adresse IP", telemetry.primary_ip, udp_ip, args.runs)
+    if available["ssid"]:
+        report("ssid", lambda: telemetry.wifi_ssid(args.interface), fork(["iwconfig", args.interface]), args.runs)
+    report("cpu", telemetry.cpu_percent_per_core, fork(["cat", "/proc/stat"]), args.runs)
+    report("wifi (lien)", telemetry.wireless, fork(["cat", "/proc/net/wireless"]), args.runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+TBerryPrint - Module pycups de remplacement pour les bancs d'essai
+
+Reproduit la partie de l'API de pycups utilisée par l'interface Flask
+(cups_client.py, job_tracker.py, printer_pool.py, print_journal.py) sans
+cupsd ni imprimante :
+- Des files USB simulées (TSP743II par défaut) dont les tâches sont
+  terminées dès leur envoi et annoncées par les notifications
+- Une latence fixe ajoutée à chaque requête IPP, pour approcher le coût
+  d'un aller-retour vers cupsd sur un Raspberry Pi
+- Les données envoyées sont comptées puis jetées
+
+Réglages (variables d'environnement):
+    BENCH_CUPS_PRINTERS    Files simulées, séparées par des virgules (défaut: TSP743II)
+    BENCH_CUPS_LATENCY_MS  Latence ajoutée à chaque requête IPP (défaut: 0)
+
+Utilisé par benchmarks/bench_app.py, qui place ce répertoire en tête de PYTHONPATH.
+"""
+
+import itertools
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+HTTP_CONTINUE = 100
+IPP_NOT_FOUND = 0x0406
+
+IPP_JOB_PROCESSING = 5
+IPP_JOB_CANCELED = 7
+IPP_JOB_COMPLETED = 9
+IPP_PRINTER_IDLE = 3
+
+PRINTERS = [name.strip() for name in os.environ.get("BENCH_CUPS_PRINTERS", "TSP743II").split(",") if name.strip()]
+LATENCY = float(os.environ.get("BENCH_CUPS_LATENCY_MS", "0")) / 1000
+
+# PPD minimal : seul son contenu (clé du cache raster) compte pour l'interface
+PPD_CONTENT = b'*PPD-Adobe: "4.3"\n*ModelName: "Star TSP743II (banc d\'essai)"\n'
+
+# Nombre maximal de notifications conservées (comme le MaxEvents de cupsd)
+MAX_EVENTS = 1000
+
+
+class IPPError(Exception):
+    """Erreur IPP (args: code, message)."""
+
+
+class HTTPError(Exception):
+    """Erreur de connexion à cupsd (args: statut HTTP)."""
+
+
+class _Server:
+    """État partagé par toutes les connexions : files, tâches et notifications."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count(1)
+        self.subscription_ids = itertools.count(1)
+        self.jobs: Dict[int, Dict[str, Any]] = {}
+        self.events: List[Dict[str, Any]] = []
+        self.sequence = 0
+        # Abonnement -> dernier numéro de séquence à sa création (seuls les événements suivants lui sont remis)
+        self.subscriptions: Dict[int, int] = {}
+        self.bytes_received = 0
+        self.printers = {
+            name: {
+                "device-uri": f"usb://Star/TSP743II%20(STR_T-{index:03d})?serial=BENCH{index:03d}",
+                "printer-state": IPP_PRINTER_IDLE,
+                "printer-state-message": "",
+                "printer-state-reasons": ["none"],
+                "printer-info": name,
+                "printer-make-and-model": "Star TSP743II",
+                "printer-is-accepting-jobs": True
+            }
+            for index, name in enumerate(PRINTERS, 1)
+        }
+
+    def printer(self, name: str) -> Dict[str, Any]:
+        if name not in self.printers:
+            raise IPPError(IPP_NOT_FOUND, f"The printer or class does not exist: {name}")
+        return self.printers[name]
+
+    def create_job(self, printer: str, title: str) -> int:
+        self.printer(printer)
+        with self.lock:
+            job_id = next(self.job_ids)
+            self.jobs[job_id] = {
+                "job-id": job_id,
+                "job-name": title,
+                "job-printer-uri": f"ipp://localhost/printers/{printer}",
+                "job-state": IPP_JOB_PROCESSING,
+                "job-state-reasons": "job-printing",
+                "job-originating-user-name": "tberryprint",
+                "time-at-creation": int(time.time()),
+                "time-at-processing": int(time.time())
+            }
+        return job_id
+
+    def complete_job(self, job_id: int) -> None:
+        """Termine une tâche et publie la notification correspondante."""
+        with self.lock:
+            job = self.jobs[job_id]
+            job["job-state"] = IPP_JOB_COMPLETED
+            job["job-state-reasons"] = "job-completed-successfully"
+            job["time-at-completed"] = int(time.time())
+            self.sequence += 1
+            self.events.append({
+                "notify-subscribed-event": "job-completed",
+                "notify-sequence-number": self.sequence,
+                "notify-job-id": job_id,
+                "job-state": IPP_JOB_COMPLETED,
+                "job-state-reasons": job["job-state-reasons"],
+                "job-name": job["job-name"],
+                "printer-name": job["job-printer-uri"].rsplit("/", 1)[-1],
+                "printer-state": IPP_PRINTER_IDLE
+            })
+            del self.events[:-MAX_EVENTS]
+
+
+_server = _Server()
+
+
+def _ipp_request() -> None:
+    """Simule le coût d'un aller-retour IPP."""
+    if LATENCY > 0:
+        time.sleep(LATENCY)
+
+
+class Connection:
+    """Connexion simulée à cupsd (même état pour toutes les instances, comme un vrai serveur)."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        self._document: Optional[Dict[str, Any]] = None
+
+    # ----- Imprimantes -----
+
+    def getPrinters(self) -> Dict[str, Dict[str, Any]]:
+        _ipp_request()
+        return {name: dict(attributes) for name, attributes in _server.printers.items()}
+
+    def getPrinterAttributes(self, name: str, requested_attributes: Optional[List[str]] = None) -> Dict[str, Any]:
+        _ipp_request()
+        attributes = dict(_server.printer(name))
+        if requested_attributes:
+            attributes = {key: value for key, value in attributes.items() if key in requested_attributes}
+        return attributes
+
+    def getPPD(self, name: str) -> str:
+        _ipp_request()
+        _server.printer(name)
+        # pycups renvoie une copie temporaire que l'appelant supprime
+        fd, path = tempfile.mkstemp(prefix="tberry-bench-", suffix=".ppd")
+        with os.fdopen(fd, "wb") as f:
+            f.write(PPD_CONTENT)
+        return path
+
+    # ----- Tâches -----
+
+    def printFile(self, printer: str, filename: str, title: str, options: Dict[str, str]) -> int:
+        _ipp_request()
+        job_id = _server.create_job(printer, title)
+        with open(filename, "rb") as f:
+            size = len(f.read())
+        with _server.lock:
+            _server.bytes_received += size
+        _server.complete_job(job_id)
+        return job_id
+
+    def createJob(self, printer: str, title: str, options: Dict[str, str]) -> int:
+        _ipp_request()
+        return _server.create_job(printer, title)
+
+    def startDocument(self, printer: str, job_id: int, name: str, document_format: str, last_document: int) -> int:
+        _ipp_request()
+        if job_id not in _server.jobs:
+            raise IPPError(IPP_NOT_FOUND, f"Job #{job_id} does not exist")
+        self._document = {"job_id": job_id, "last": bool(last_document)}
+        return HTTP_CONTINUE
+
+    def writeRequestData(self, data: bytes, length: int) -> int:
+        with _server.lock:
+            _server.bytes_received += length
+        return HTTP_CONTINUE
+
+    def finishDocument(self, printer: str) -> int:
+        _ipp_request()
+        document, self._document = self._document, None
+        if document is not None and document["last"]:
+            _server.complete_job(document["job_id"])
+        return 0
+
+    def cancelJob(self, job_id: int, purge_job: bool = False) -> None:
+        _ipp_request()
+        with _server.lock:
+            job = _server.jobs.get(job_id)
+            if job is None:
+                raise IPPError(IPP_NOT_FOUND, f"Job #{job_id} does not exist")
+            job["job-state"] = IPP_JOB_CANCELED
+
+    def moveJob(self, printer_uri: Optional[str] = None, job_id: Optional[int] = None, job_printer_uri: str = "") -> None:
+        _ipp_request()
+        with _server.lock:
+            job = _server.jobs.get(job_id)
+            if job is None:
+                raise IPPError(IPP_NOT_FOUND, f"Job #{job_id} does not exist")
+            job["job-printer-uri"] = job_printer_uri
+
+    def getJobs(
+        self,
+        which_jobs: str = "not-completed",
+        my_jobs: bool = False,
+        limit: int = -1,
+        first_job_id: int = -1,
+        requested_attributes: Optional[List[str]] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        _ipp_request()
+        with _server.lock:
+            jobs = {
+                job_id: dict(job)
+                for job_id, job in _server.jobs.items()
+                if which_jobs == "all"
+                or (which_jobs == "completed") == (job["job-state"] >= IPP_JOB_CANCELED)
+            }
+        if limit > 0:
+            jobs = dict(sorted(jobs.items())[-limit:])
+        if requested_attributes:
+            jobs = {
+                job_id: {key: value for key, value in job.items() if key in requested_attributes}
+                for job_id, job in jobs.items()
+            }
+        return jobs
+
+    def getJobAttributes(self, job_id: int, requested_attributes: Optional[List[str]] = None) -> Dict[str, Any]:
+        _ipp_request()
+        with _server.lock:
+            job = _server.jobs.get(job_id)
+            if job is None:
+                raise IPPError(IPP_NOT_FOUND, f"Job #{job_id} does not exist")
+            job = dict(job)
+        if requested_attributes:
+            job = {key: value for key, value in job.items() if key in requested_attributes}
+        return job
+
+    # ----- Notifications -----
+
+    def createSubscription(self, uri: str, events: Optional[List[str]] = None, lease_duration: int = 0, **kwargs: Any) -> int:
+        _ipp_request()
+        with _server.lock:
+            subscription_id = next(_server.subscription_ids)
+            _server.subscriptions[subscription_id] = _server.sequence
+        return subscription_id
+
+    def renewSubscription(self, subscription_id: int, lease_duration: int = 0) -> None:
+        _ipp_request()
+
+    def cancelSubscription(self, subscription_id: int) -> None:
+        _ipp_request()
+        with _server.lock:
+            _server.subscriptions.pop(subscription_id, None)
+
+    def getNotifications(self, subscription_ids: List[int], sequence_numbers: Optional[List[int]] = None) -> Dict[str, Any]:
+        _ipp_request()
+        first = sequence_numbers[0] if sequence_numbers else 1
+        with _server.lock:
+            if subscription_ids[0] not in _server.subscriptions:
+                raise IPPError(IPP_NOT_FOUND, "Subscription not found")
+            first = max(first, _server.subscriptions[subscription_ids[0]] + 1)
+            events = [dict(event) for event in _server.events if event["notify-sequence-number"] >= first]
+        return {"events": events}
@@ -0,0 +1,23 @@
+#!/bin/bash
+# TBerryPrint - fonctions.sh de remplacement pour les bancs d'essai
+#
+# Rejoue les sorties enregistrées sur un Raspberry Pi (recordings/<opération>.txt)
+# au lieu d'appeler iwconfig, ip ou nmcli. Le fichier recordings/<opération>.delay,
+# s'il existe, donne la durée de la commande réelle (en secondes) ; BENCH_REPLAY_DELAYS=0
+# supprime ces attentes. Les opérations sans enregistrement réussissent sans rien afficher.
+
+RECORDINGS="${BENCH_RECORDINGS:-$(dirname "$(readlink -f "$0")")/recordings}"
+
+if [ "$#" -eq 0 ]; then
+    echo "Usage: $0 <opération> [arguments...]"
+    exit 1
+fi
+
+if [ "${BENCH_REPLAY_DELAYS:-1}" = "1" ] && [ -f "$RECORDINGS/$1.delay" ]; then
+    sleep "$(cat "$RECORDINGS/$1.delay")"
+fi
+
+if [ -f "$RECORDINGS/$1.txt" ]; then
+    cat "$RECORDINGS/$1.txt"
+fi
+exit 0
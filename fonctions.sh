@@ -191,6 +191,13 @@ wifi_scan_iwlist() {
     iwlist wlan0 scan
 }
 
+# Scanner les réseaux Wi-Fi disponibles (sortie structurée de nmcli)
+wifi_scan_nmcli() {
+    require_root
+    log_info "Scan des réseaux WiFi disponibles (nmcli)"
+    nmcli -t -f IN-USE,SSID,SIGNAL,SECURITY device wifi list --rescan yes ifname wlan0
+}
+
 # Supprimer une imprimante
 printer_remove() {
     require_root
@@ -204,6 +211,19 @@ printer_remove() {
     log_success "Imprimante supprimée: $PRINTER"
 }
 
+# Réactiver une imprimante et accepter de nouveau ses tâches (après un rebranchement)
+printer_resume() {
+    require_root
+    if [ "$#" -ne 1 ]; then
+        log_error "Usage: printer_resume <printer_name>"
+        return 1
+    fi
+    local PRINTER="$1"
+    log_info "Réactivation de l'imprimante: $PRINTER"
+    cupsenable "$PRINTER" && cupsaccept "$PRINTER" || return 1
+    log_success "Imprimante réactivée: $PRINTER"
+}
+
 # Lancer un test d'impression
 impression_test() {
     require_root
@@ -261,8 +281,10 @@ show_help() {
     echo "  wifi_iwconfig                           - Afficher la configuration WiFi via iwconfig"
     echo "  ip_info                                 - Afficher l'adresse IP de l'interface wlan0"
     echo "  wifi_scan_iwlist                        - Scanner les réseaux WiFi disponibles (iwlist)"
+    echo "  wifi_scan_nmcli                         - Scanner les réseaux WiFi disponibles (nmcli, sortie structurée)"
     echo "  measure_temp                            - Mesurer la température du CPU"
     echo "  printer_remove <printer_name>           - Supprimer une imprimante"
+    echo "  printer_resume <printer_name>           - Réactiver une imprimante"
     echo "  impression_test <file> <printer_name>   - Lancer un test d'impression"
     echo "  TBerryPrint_restart                     - Redémarrer le service TBerryPrint"
     echo "  reboot_system                           - Redémarrer le Raspberry Pi"
@@ -319,6 +341,9 @@ case "${BASH_SOURCE[0]}" in
                 wifi_scan_iwlist)
                     wifi_scan_iwlist
                     ;;
+                wifi_scan_nmcli)
+                    wifi_scan_nmcli
+                    ;;
                 measure_temp)
                     measure_temp
                     ;;
@@ -326,6 +351,10 @@ case "${BASH_SOURCE[0]}" in
                     shift
                     printer_remove "$@"
                     ;;
+                printer_resume)
+                    shift
+                    printer_resume "$@"
+                    ;;
                 impression_test)
                     shift
                     impression_test "$@"